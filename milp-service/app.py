@@ -14,13 +14,45 @@ Features:
 No AI/ML - Pure mathematical optimization using PuLP (CBC solver)
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from pulp import *
+import bisect
+import copy
 import json
 import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional dependency, speeds up the bulk endpoints
+    orjson = None
 from datetime import datetime
 
+from cache import ResultCache
+from distances import DistanceMatrix
+from freshness import FLAGS, FreshnessTracker, ReadingsTail
+from jobs import JobQueue, QueueFullError
+from ledger import CapacityConflictError, CapacityExceededError, CapacityLedger
+from metrics import METRICS, ROUTE_OUTCOMES, begin_request, current_timings, end_request, phase, track
+from network_flow import build_network, optimize_network
+from planning import build_instance, format_plan, plan_horizon
+from registry import EntityRegistry, EntityNotFoundError, PLURALS
+from roadmatrix import RoadMatrix
+from scenarios import DEFAULT_UNCERTAINTY, cvar, distribution_summary, sample_transit_scenarios
+from slots import BULK, INTERACTIVE, SOLVER_SLOTS, SolverBusyError, set_request_context
+from solvers import DEFAULT_BACKEND, HighsSession, available_backends, solve, solver_options_from_request
+from spatial import GridIndex, fraction_within
+from vrp import VRPInstance, solve_vrptw
+
 app = Flask(__name__)
 CORS(app)
 
@@ -46,7 +78,7 @@ TEMP_OPTIMAL = 5
 FRESHNESS_DECAY_RATE = 1.5  # 1.5% per hour base decay
 
 # ============================================
-# SAMPLE DATA (Would come from blockchain in production)
+# SAMPLE DATA (in production chain_ingest.py mirrors the contract into ENTITY_SNAPSHOT_PATH)
 # ============================================
 
 HARVESTERS = [
@@ -136,69 +168,204 @@ def calculate_risk_level(distance, has_cold_chain, freshness_life_hours, transit
     
     return min(100, distance_risk + cold_chain_risk + freshness_risk)
 
+def calculate_freshness_scores(initial_scores, hours_elapsed, has_cold_chain, exact=True):
+    """
+    Vectorized calculate_freshness_score over NumPy arrays
+    
+    With exact=True the exponential is evaluated with math.exp per
+    element (everything else vectorized), so every value is bit-for-bit
+    equal to the scalar function; NumPy's SIMD np.exp differs from libm
+    in the last bit for a fraction of inputs. exact=False uses np.exp.
+    """
+    decay_rate = np.where(has_cold_chain, FRESHNESS_DECAY_RATE / 100 * 0.3, FRESHNESS_DECAY_RATE / 100)
+    exponent = -decay_rate * hours_elapsed
+    if exact:
+        decay = np.fromiter(map(math.exp, exponent.tolist()), dtype=np.float64, count=exponent.size)
+    else:
+        decay = np.exp(exponent)
+    freshness = initial_scores * decay
+    return np.maximum(0, np.minimum(100, freshness))
+
+def calculate_risk_levels(distances, has_cold_chain, freshness_life_hours, transit_hours):
+    """Vectorized calculate_risk_level over NumPy arrays (same operation order)"""
+    distance_risk = np.minimum(40, (distances / 500) * 40)
+    cold_chain_risk = np.where(has_cold_chain, 0.0, 30.0)
+    remaining_life = freshness_life_hours - transit_hours
+    with np.errstate(divide='ignore', invalid='ignore'):
+        freshness_risk = np.where(
+            remaining_life <= 0,
+            30.0,
+            np.maximum(0, 30 - (remaining_life / freshness_life_hours) * 30)
+        )
+    return np.minimum(100, distance_risk + cold_chain_risk + freshness_risk)
+
+def risk_categories(risk_levels):
+    """'Low' / 'Medium' / 'High' label per risk level"""
+    codes = (risk_levels >= 30).astype(np.int8) + (risk_levels >= 60)
+    return np.array(['Low', 'Medium', 'High'], dtype=object)[codes].tolist()
+
 def get_entity_coords(entity_type, entity_id):
-    """Get coordinates for an entity"""
-    entities = {
-        'harvester': HARVESTERS,
-        'transporter': TRANSPORTERS,
-        'distributor': DISTRIBUTORS,
-        'wholesaler': WHOLESALERS,
-        'retailer': RETAILERS
-    }
+    """Get coordinates for an entity (raises EntityNotFoundError for unknown ids)"""
+    return REGISTRY.coords(entity_type, entity_id)
+
+# ============================================
+# ENTITY REGISTRY & DISTANCE MATRIX
+# ============================================
+
+# The module-level sample tables are the default data source; set
+# ENTITY_SNAPSHOT_PATH to a JSON/CSV snapshot to load (and hot reload) instead
+SAMPLE_ENTITIES = {
+    'harvester': HARVESTERS,
+    'transporter': TRANSPORTERS,
+    'distributor': DISTRIBUTORS,
+    'wholesaler': WHOLESALERS,
+    'retailer': RETAILERS
+}
+
+# Entity types with coordinates; every pair distance is precomputed
+LOCATED_ENTITY_TYPES = ('harvester', 'distributor', 'wholesaler', 'retailer')
+
+REGISTRY = EntityRegistry()
+DISTANCES = DistanceMatrix()
+
+# Grid index per located entity type, for radius / nearest-K candidate queries
+SPATIAL_CELL_KM = float(os.environ.get('SPATIAL_CELL_KM', 50))
+SPATIAL_DENSE_FRACTION = 0.6  # network legs reaching more pairs than this use the dense distance block
+SPATIAL = {}
+
+def build_distance_matrix(snapshot=None):
+    """(Re)compute the distance matrix for all located entities"""
+    snapshot = snapshot or REGISTRY.snapshot
+    DISTANCES.build(
+        ((entity_type, e['id']), e['lat'], e['lon'])
+        for entity_type in LOCATED_ENTITY_TYPES
+        for e in snapshot.table(entity_type).records()
+    )
+
+def sync_distance_matrix(old, new):
+    """Registry listener: update distances only for added or moved entities"""
+    changed = []
+    removed = False
+    for entity_type in LOCATED_ENTITY_TYPES:
+        old_table = old.table(entity_type)
+        new_table = new.table(entity_type)
+        removed = removed or any(entity_id not in new_table for entity_id in old_table.ids())
+        for e in new_table.records():
+            if e['id'] in old_table:
+                previous = old_table.record(e['id'])
+                if previous['lat'] == e['lat'] and previous['lon'] == e['lon']:
+                    continue
+            changed.append(((entity_type, e['id']), e['lat'], e['lon']))
     
-    entity_list = entities.get(entity_type, [])
-    for e in entity_list:
-        if e['id'] == entity_id:
-            return e.get('lat', 0), e.get('lon', 0)
-    return 0, 0
+    # Removals and large reloads are handled by one block-wise rebuild
+    if removed or len(DISTANCES) == 0 or len(changed) > len(DISTANCES) // 2:
+        build_distance_matrix(new)
+    else:
+        for key, lat, lon in changed:
+            DISTANCES.upsert(key, lat, lon)
+
+def sync_spatial_index(old, new):
+    """Registry listener: rebuild the grid index of every entity type whose table changed"""
+    for entity_type in LOCATED_ENTITY_TYPES:
+        table = new.table(entity_type)
+        if entity_type in SPATIAL and old.table(entity_type) is table:
+            continue
+        located = [e for e in table.records() if 'lat' in e and 'lon' in e]
+        SPATIAL[entity_type] = GridIndex(
+            [e['id'] for e in located],
+            [e['lat'] for e in located],
+            [e['lon'] for e in located],
+            cell_km=SPATIAL_CELL_KM
+        )
+
+def nearest_entities(entity_type, lat, lon, k=5, radius_km=None, exclude=None):
+    """
+    [(entity record, distance km), ...] for the k entities of a type
+    nearest to (lat, lon), nearest first, optionally within radius_km
+    """
+    if entity_type not in SPATIAL:
+        raise ValueError(f"{entity_type} entities have no location")
+    index = SPATIAL[entity_type]
+    # One extra result in case the excluded entity is among the nearest
+    positions, distances = index.nearest(lat, lon, k + (exclude is not None), radius_km)
+    results = []
+    for position, distance in zip(positions.tolist(), distances.tolist()):
+        entity_id = index.ids[position].item()
+        if entity_id == exclude:
+            continue
+        results.append((REGISTRY.get(entity_type, entity_id), distance))
+    return results[:k]
+
+def upsert_entity(entity_type, entity):
+    """Add or replace an entity record and update its distances incrementally"""
+    REGISTRY.upsert(entity_type, entity)
+
+def entity_distance(source_type, source_id, destination_type, destination_id):
+    """Great-circle distance in km between two entities (matrix lookup)"""
+    try:
+        return DISTANCES.distance((source_type, source_id), (destination_type, destination_id))
+    except KeyError:
+        # Entities outside the matrix fall back to the scalar formula
+        source_lat, source_lon = get_entity_coords(source_type, source_id)
+        dest_lat, dest_lon = get_entity_coords(destination_type, destination_id)
+        return haversine_distance(source_lat, source_lon, dest_lat, dest_lon)
+
+REGISTRY.add_listener(sync_distance_matrix)
+REGISTRY.add_listener(sync_spatial_index)
+if os.environ.get('ENTITY_SNAPSHOT_PATH'):
+    REGISTRY.load_file(os.environ['ENTITY_SNAPSHOT_PATH'])
+else:
+    REGISTRY.load_lists(SAMPLE_ENTITIES, source='sample')
+
+# Precomputed road distances / durations (memory-mapped, shared by all
+# workers); lanes missing from it use the great-circle estimate
+ROAD_MATRIX = RoadMatrix()
+if os.environ.get('ROAD_MATRIX_DIR'):
+    ROAD_MATRIX.load(os.environ['ROAD_MATRIX_DIR'])
+
+def lane_distance(source_type, source_id, destination_type, destination_id):
+    """(km, 'road' | 'great_circle') for a lane: the road matrix entry when there is one"""
+    distance = entity_distance(source_type, source_id, destination_type, destination_id)
+    road = ROAD_MATRIX.lookup((source_type, source_id), (destination_type, destination_id))
+    return (distance, 'great_circle') if road is None else (road[0], 'road')
 
 # ============================================
 # MILP OPTIMIZATION ENGINE
 # ============================================
 
-def optimize_route(
+def transporter_route_factor(transporter):
+    """Add some variation based on transporter (different routes)"""
+    return 1 + (transporter['id'] - 2) * 0.05
+
+def compute_transporter_metrics(
     source_type: str,
     source_id: int,
     destination_type: str,
     destination_id: int,
-    quantity: int,
-    freshness_life_hours: int,
-    priority: str = 'balanced',
-    require_cold_chain: bool = False
+    freshness_life_hours: int
 ):
     """
-    Main MILP optimization function
-    
-    Minimizes: w1*Cost + w2*Time + w3*(1-Quality)
+    Calculate distance, time, cost, freshness and risk for each transporter on a lane
     
-    Subject to:
-    - Capacity constraints
-    - Cold chain requirements
-    - Freshness life constraints
-    - Single transporter selection
+    With a road matrix entry for the lane every transporter drives the
+    routed distance, no faster than the routed duration; otherwise the
+    great-circle distance is scaled by transporter_route_factor.
     """
+    transporters = REGISTRY.records('transporter')
+    lane_distance = entity_distance(source_type, source_id, destination_type, destination_id)
+    road = ROAD_MATRIX.lookup((source_type, source_id), (destination_type, destination_id))
     
-    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
-    
-    # Get source and destination coordinates
-    source_lat, source_lon = get_entity_coords(source_type, source_id)
-    dest_lat, dest_lon = get_entity_coords(destination_type, destination_id)
-    
-    # Create the MILP problem
-    prob = LpProblem("FloraChain_Route_Optimization", LpMinimize)
-    
-    # Decision variables: binary selection for each transporter
-    x = LpVariable.dicts("transporter", [t['id'] for t in TRANSPORTERS], cat='Binary')
-    
-    # Calculate metrics for each transporter
     transporter_metrics = {}
-    for t in TRANSPORTERS:
-        distance = haversine_distance(source_lat, source_lon, dest_lat, dest_lon)
+    for t in transporters:
+        if road is None:
+            distance = lane_distance * transporter_route_factor(t)
+            transit_time = distance / t['speed_kmph']
+        else:
+            distance, road_hours = road
+            transit_time = distance / t['speed_kmph']
+            if road_hours is not None:
+                transit_time = max(transit_time, road_hours)
         
-        # Add some variation based on transporter (different routes)
-        distance *= (1 + (t['id'] - 2) * 0.05)
-        
-        transit_time = distance / t['speed_kmph']
         transport_cost = distance * t['cost_per_km']
         
         # Calculate expected freshness on arrival
@@ -216,71 +383,62 @@ def optimize_route(
             'risk': risk,
             'cold_chain': t['cold_chain'],
             'name': t['name'],
-            'capacity': t['capacity']
+            'capacity': t['capacity'],
+            'distance_source': 'great_circle' if road is None else 'road'
         }
     
-    # Normalize metrics for objective function
-    max_cost = max(m['transport_cost'] for m in transporter_metrics.values())
-    max_time = max(m['transit_time'] for m in transporter_metrics.values())
-    
-    # Objective function: minimize weighted sum
-    prob += lpSum([
-        weights['cost'] * (transporter_metrics[t['id']]['transport_cost'] / max_cost) * x[t['id']] +
-        weights['time'] * (transporter_metrics[t['id']]['transit_time'] / max_time) * x[t['id']] +
-        weights['quality'] * (1 - transporter_metrics[t['id']]['quality']) * x[t['id']]
-        for t in TRANSPORTERS
-    ]), "Total_Weighted_Objective"
-    
-    # Constraint: Select exactly one transporter
-    prob += lpSum([x[t['id']] for t in TRANSPORTERS]) == 1, "Select_One_Transporter"
-    
-    # Constraint: Selected transporter must have sufficient capacity
-    for t in TRANSPORTERS:
-        if t['capacity'] < quantity:
-            prob += x[t['id']] == 0, f"Capacity_Constraint_{t['id']}"
-    
-    # Constraint: Cold chain requirement
-    if require_cold_chain:
-        for t in TRANSPORTERS:
-            if not t['cold_chain']:
-                prob += x[t['id']] == 0, f"ColdChain_Constraint_{t['id']}"
+    return transporter_metrics
+
+def objective_coefficients(transporter_metrics, weights):
+    """Normalized weighted objective coefficient for each transporter"""
+    max_cost = max(m['transport_cost'] for m in transporter_metrics.values()) or 1
+    max_time = max(m['transit_time'] for m in transporter_metrics.values()) or 1
     
-    # Constraint: Freshness life must be sufficient
-    for t in TRANSPORTERS:
+    return {
+        t_id: (
+            weights['cost'] * (m['transport_cost'] / max_cost) +
+            weights['time'] * (m['transit_time'] / max_time) +
+            weights['quality'] * (1 - m['quality'])
+        )
+        for t_id, m in transporter_metrics.items()
+    }
+
+def infeasible_transporters(transporter_metrics, quantity, freshness_life_hours, require_cold_chain):
+    """
+    Transporters excluded by the model constraints, mapped to the
+    name of the constraint that excludes them
+    """
+    transporters = REGISTRY.records('transporter')
+    excluded = {}
+    for t in transporters:
         metrics = transporter_metrics[t['id']]
+        if t['capacity'] < quantity:
+            excluded.setdefault(t['id'], f"Capacity_Constraint_{t['id']}")
+        if require_cold_chain and not t['cold_chain']:
+            excluded.setdefault(t['id'], f"ColdChain_Constraint_{t['id']}")
         if metrics['transit_time'] > freshness_life_hours * 0.7:  # Leave 30% buffer
-            prob += x[t['id']] == 0, f"Freshness_Constraint_{t['id']}"
-    
-    # Solve the problem
-    prob.solve(PULP_CBC_CMD(msg=0))
-    
-    # Get results
-    if LpStatus[prob.status] != 'Optimal':
-        return {
-            'success': False,
-            'status': LpStatus[prob.status],
-            'message': 'No feasible solution found'
-        }
-    
-    # Find selected transporter
-    selected_id = None
-    for t in TRANSPORTERS:
-        if value(x[t['id']]) == 1:
-            selected_id = t['id']
-            break
-    
-    if selected_id is None:
-        return {
-            'success': False,
-            'status': 'Error',
-            'message': 'No transporter selected'
-        }
-    
+            excluded.setdefault(t['id'], f"Freshness_Constraint_{t['id']}")
+    return excluded
+
+def build_route_result(
+    source_type: str,
+    source_id: int,
+    destination_type: str,
+    destination_id: int,
+    quantity: int,
+    freshness_life_hours: int,
+    priority: str,
+    require_cold_chain: bool,
+    transporter_metrics: dict,
+    selected_id: int
+):
+    """Build the /optimize response for a selected transporter"""
+    transporters = REGISTRY.records('transporter')
+    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
     selected_metrics = transporter_metrics[selected_id]
-    selected_transporter = next(t for t in TRANSPORTERS if t['id'] == selected_id)
+    selected_transporter = REGISTRY.get('transporter', selected_id)
     
-    # Build result
-    result = {
+    return {
         'success': True,
         'status': 'Optimal',
         'optimization_timestamp': datetime.now().isoformat(),
@@ -294,7 +452,8 @@ def optimize_route(
                 'type': destination_type,
                 'id': destination_id
             },
-            'distance_km': round(selected_metrics['distance'], 2)
+            'distance_km': round(selected_metrics['distance'], 2),
+            'distance_source': selected_metrics['distance_source']
         },
         
         'selected_transporter': {
@@ -343,232 +502,3236 @@ def optimize_route(
                     'risk': round(transporter_metrics[t['id']]['risk'], 1),
                     'selected': t['id'] == selected_id
                 }
-                for t in TRANSPORTERS
+                for t in transporters
             ]
         }
     }
-    
-    return result
 
-# ============================================
-# API ENDPOINTS
-# ============================================
-
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'FloraChain MILP Optimization Service',
-        'version': '2.0.0',
-        'timestamp': datetime.now().isoformat()
-    })
-
-@app.route('/optimize', methods=['POST'])
-def optimize():
+def select_transporter_analytic(coefficients, excluded):
     """
-    Main optimization endpoint
+    Exact solver-free selection for the single-transporter model
     
-    Request body:
-    {
-        "source_type": "harvester",
-        "source_id": 1,
-        "destination_type": "distributor", 
-        "destination_id": 1,
-        "quantity": 1000,
-        "freshness_life_hours": 72,
-        "priority": "balanced",
-        "require_cold_chain": false
-    }
+    With exactly one transporter selected and every constraint fixing a
+    variable to zero, the MILP optimum is the feasible transporter with
+    the smallest objective coefficient. Ties go to the lowest id.
+    Returns None when no transporter is feasible.
     """
-    try:
-        data = request.get_json()
-        
-        result = optimize_route(
-            source_type=data.get('source_type', 'harvester'),
-            source_id=data.get('source_id', 1),
-            destination_type=data.get('destination_type', 'distributor'),
-            destination_id=data.get('destination_id', 1),
-            quantity=data.get('quantity', 1000),
-            freshness_life_hours=data.get('freshness_life_hours', 72),
-            priority=data.get('priority', 'balanced'),
-            require_cold_chain=data.get('require_cold_chain', False)
-        )
-        
-        return jsonify(result)
-    
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'status': 'Error',
-            'message': str(e)
-        }), 500
-
-@app.route('/optimize/demo', methods=['GET'])
-def optimize_demo():
-    """Demo endpoint with sample optimization"""
-    result = optimize_route(
-        source_type='harvester',
-        source_id=1,
-        destination_type='retailer',
-        destination_id=1,
-        quantity=500,
-        freshness_life_hours=72,
-        priority='balanced',
-        require_cold_chain=True
-    )
-    return jsonify(result)
-
-@app.route('/entities', methods=['GET'])
-def get_entities():
-    """Get all available entities for frontend dropdowns"""
-    return jsonify({
-        'harvesters': HARVESTERS,
-        'transporters': TRANSPORTERS,
-        'distributors': DISTRIBUTORS,
-        'wholesalers': WHOLESALERS,
-        'retailers': RETAILERS
-    })
+    best_id = None
+    best_value = None
+    for t_id, coefficient in coefficients.items():
+        if t_id in excluded:
+            continue
+        if best_value is None or coefficient < best_value or (coefficient == best_value and t_id < best_id):
+            best_id = t_id
+            best_value = coefficient
+    return best_id
 
-@app.route('/freshness/calculate', methods=['POST'])
-def calculate_freshness():
+def solve_route_milp(coefficients, excluded, extra_constraints=None, solver_options=None):
     """
-    Calculate freshness score endpoint
+    Solve the single-transporter selection model with a MILP backend
     
-    Request body:
-    {
-        "initial_score": 100,
-        "hours_elapsed": 24,
-        "has_cold_chain": true
-    }
+    extra_constraints are linear constraints over the selection variables:
+    [{"coefficients": {"1": 1, "3": 1}, "sense": "<=", "rhs": 0, "name": "..."}]
+    
+    The model comes from the fleet's pooled RouteModelTemplate, so only
+    coefficients and bounds are rewritten per call.
+    
+    Returns (status, selected_id, solver_stats)
     """
-    try:
-        data = request.get_json()
-        score = calculate_freshness_score(
-            initial_score=data.get('initial_score', 100),
-            hours_elapsed=data.get('hours_elapsed', 0),
-            has_cold_chain=data.get('has_cold_chain', False)
-        )
-        return jsonify({
-            'freshness_score': round(score, 2),
-            'decay_rate': FRESHNESS_DECAY_RATE if not data.get('has_cold_chain', False) else FRESHNESS_DECAY_RATE * 0.3
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    transporter_ids = [t['id'] for t in REGISTRY.records('transporter')]
+    
+    template = ROUTE_TEMPLATES.acquire(transporter_ids)
+    # A template whose solve raised may hold a half-applied update: it is dropped, not pooled
+    result = template.solve(coefficients, excluded, extra_constraints, solver_options)
+    ROUTE_TEMPLATES.release(template)
+    return result
 
-@app.route('/risk/calculate', methods=['POST'])
-def calculate_risk_endpoint():
-    """
-    Calculate risk level endpoint
+def build_route_problem(transporters, coefficients, excluded, extra_constraints=None):
+    """PuLP model of the single-transporter selection problem; returns (prob, x)"""
+    # Create the MILP problem
+    prob = LpProblem("FloraChain_Route_Optimization", LpMinimize)
     
-    Request body:
-    {
-        "distance_km": 150,
-        "has_cold_chain": true,
-        "freshness_life_hours": 72,
-        "transit_hours": 3
-    }
-    """
-    try:
-        data = request.get_json()
-        risk = calculate_risk_level(
-            distance=data.get('distance_km', 0),
-            has_cold_chain=data.get('has_cold_chain', False),
-            freshness_life_hours=data.get('freshness_life_hours', 72),
-            transit_hours=data.get('transit_hours', 0)
-        )
-        return jsonify({
-            'risk_level': round(risk, 2),
-            'risk_category': 'Low' if risk < 30 else ('Medium' if risk < 60 else 'High')
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Decision variables: binary selection for each transporter
+    x = LpVariable.dicts("transporter", [t['id'] for t in transporters], cat='Binary')
+    
+    # Objective function: minimize weighted sum
+    prob += lpSum([coefficients[t['id']] * x[t['id']] for t in transporters]), "Total_Weighted_Objective"
+    
+    # Constraint: Select exactly one transporter
+    prob += lpSum([x[t['id']] for t in transporters]) == 1, "Select_One_Transporter"
+    
+    # Constraints: capacity, cold chain and freshness life exclusions
+    for t_id, constraint_name in excluded.items():
+        prob += x[t_id] == 0, constraint_name
+    
+    # Constraints: request-supplied coupling constraints
+    for constraint, name in route_extra_constraints(x, extra_constraints):
+        prob += constraint, name
+    
+    return prob, x
 
-@app.route('/simulate', methods=['POST'])
-def simulate_comparison():
+def route_extra_constraints(x, extra_constraints):
+    """[(LpConstraint, name), ...] for request-supplied constraints over the selection variables"""
+    constraints = []
+    for i, constraint in enumerate(extra_constraints or []):
+        expression = lpSum([
+            float(coef) * x[int(t_id)]
+            for t_id, coef in constraint['coefficients'].items()
+        ])
+        sense = constraint.get('sense', '<=')
+        rhs = float(constraint.get('rhs', 0))
+        name = constraint.get('name', f"Extra_Constraint_{i}")
+        if sense == '<=':
+            constraints.append((expression <= rhs, name))
+        elif sense == '>=':
+            constraints.append((expression >= rhs, name))
+        elif sense == '==':
+            constraints.append((expression == rhs, name))
+        else:
+            raise ValueError(f"Unsupported constraint sense: {sense}")
+    return constraints
+
+class RouteModelTemplate:
     """
-    Simulate multiple orders and compare MILP vs simple routing
+    Compiled single-transporter selection model for one fleet
     
-    Request body:
-    {
-        "num_orders": 100
-    }
+    The variables, the selection constraint and, for HiGHS, the model
+    loaded into the solver are built once. A solve only rewrites the
+    objective coefficients and turns exclusions into upper bounds of
+    zero (same optimum as the per-exclusion constraints); request-
+    supplied constraints are added for that solve and removed after.
+    Once loaded, the HiGHS model gets every change whatever the backend
+    of the solve, so it always matches the PuLP model. The previous
+    solution is offered to the solver as a warm start.
     """
-    try:
-        data = request.get_json()
-        num_orders = data.get('num_orders', 50)
-        
-        import random
+    
+    def __init__(self, transporter_ids):
+        start = time.perf_counter()
+        self.transporter_ids = list(transporter_ids)
+        self.key = tuple(self.transporter_ids)
+        with phase('model_build'):
+            self.prob, self.x = build_route_problem(
+                [{'id': t_id} for t_id in self.transporter_ids], dict.fromkeys(self.transporter_ids, 0.0), {}
+            )
+        self.session = None  # HighsSession, loaded on the first HiGHS solve
+        self.excluded = set()
+        self.solves = 0
+        self.build_seconds = time.perf_counter() - start
+    
+    def _update(self, coefficients, excluded):
+        """Rewrite costs and bounds; returns the changed ({var: cost}, {var: bounds})"""
+        costs = {}
+        for t_id in self.transporter_ids:
+            variable = self.x[t_id]
+            coefficient = coefficients[t_id]
+            if self.prob.objective.get(variable) != coefficient:
+                self.prob.objective[variable] = coefficient
+                costs[variable] = coefficient
         
-        milp_results = {'total_cost': 0, 'total_time': 0, 'avg_freshness': 0}
-        simple_results = {'total_cost': 0, 'total_time': 0, 'avg_freshness': 0}
+        excluded = set(excluded)
+        bounds = {}
+        for t_id in self.excluded - excluded:
+            self.x[t_id].upBound = 1
+            bounds[self.x[t_id]] = (0, 1)
+        for t_id in excluded - self.excluded:
+            self.x[t_id].upBound = 0
+            bounds[self.x[t_id]] = (0, 0)
+        self.excluded = excluded
+        return costs, bounds
+    
+    def solve(self, coefficients, excluded, extra_constraints=None, solver_options=None):
+        """(status, selected_id, solver_stats), as solve_route_milp"""
+        options = dict(solver_options or {})
+        backend = options.pop('backend', None) or DEFAULT_BACKEND
+        reused = self.solves > 0
         
-        for _ in range(num_orders):
-            # Random order parameters
-            quantity = random.randint(100, 2000)
-            freshness_life = random.randint(48, 96)
-            
-            source_id = random.choice([1, 2, 3])
-            dest_id = random.choice([1, 2, 3])
-            
-            # MILP optimization
-            milp_result = optimize_route(
-                source_type='harvester',
-                source_id=source_id,
-                destination_type='retailer',
-                destination_id=dest_id,
-                quantity=quantity,
-                freshness_life_hours=freshness_life,
-                priority='balanced',
-                require_cold_chain=False
-            )
-            
-            if milp_result['success']:
-                milp_results['total_cost'] += milp_result['cost_breakdown']['transport_cost']
-                milp_results['total_time'] += milp_result['time_breakdown']['transit_time_hours']
-                milp_results['avg_freshness'] += milp_result['quality_metrics']['expected_freshness_on_arrival']
-            
-            # Simple routing (always pick first transporter)
-            simple_transport = TRANSPORTERS[0]
-            source_lat, source_lon = get_entity_coords('harvester', source_id)
-            dest_lat, dest_lon = get_entity_coords('retailer', dest_id)
-            distance = haversine_distance(source_lat, source_lon, dest_lat, dest_lon)
-            
-            simple_cost = distance * simple_transport['cost_per_km']
-            simple_time = distance / simple_transport['speed_kmph']
-            simple_freshness = calculate_freshness_score(100, simple_time, simple_transport['cold_chain'])
-            
-            simple_results['total_cost'] += simple_cost
-            simple_results['total_time'] += simple_time
-            simple_results['avg_freshness'] += simple_freshness
+        start = time.perf_counter()
+        with phase('model_build'):
+            extra = route_extra_constraints(self.x, extra_constraints)
+            names = [name for _, name in extra]
+            for name in names:
+                if name in self.prob.constraints or names.count(name) > 1:
+                    raise ValueError(f"Duplicate constraint name: {name}")
+            costs, bounds = self._update(coefficients, excluded)
+            if self.session is not None:
+                self.session.set_costs(costs)
+                self.session.set_bounds(bounds)
+            elif backend == 'highs':
+                self.session = HighsSession(self.prob)
         
-        milp_results['avg_freshness'] /= num_orders
-        simple_results['avg_freshness'] /= num_orders
+        added = []
+        extra_rows = []
+        try:
+            with phase('model_build'):
+                for constraint, name in extra:
+                    self.prob += constraint, name
+                    added.append(name)
+                if backend == 'highs':
+                    extra_rows = self.session.add_rows([constraint for constraint, _ in extra])
+            update_seconds = time.perf_counter() - start
+            if backend == 'highs':
+                stats = self.session.run(warm_start=reused, **options)
+            else:
+                stats = solve(self.prob, backend=backend, warm_start=reused, **options)
+        finally:
+            for name in added:
+                del self.prob.constraints[name]
+            if len(extra_rows):
+                self.session.delete_rows(extra_rows)
+        self.solves += 1
         
-        savings = {
-            'cost_savings_percent': round((1 - milp_results['total_cost'] / simple_results['total_cost']) * 100, 2),
-            'time_savings_percent': round((1 - milp_results['total_time'] / simple_results['total_time']) * 100, 2),
-            'freshness_improvement_percent': round((milp_results['avg_freshness'] - simple_results['avg_freshness']), 2)
-        }
+        stats['model_build_seconds'] = round(update_seconds + (0 if reused else self.build_seconds), 6)
+        stats['template'] = 'reused' if reused else 'built'
         
-        return jsonify({
-            'num_orders_simulated': num_orders,
-            'milp_results': {
-                'total_cost': round(milp_results['total_cost'], 2),
-                'total_time_hours': round(milp_results['total_time'], 2),
-                'avg_freshness': round(milp_results['avg_freshness'], 2)
-            },
-            'simple_routing_results': {
-                'total_cost': round(simple_results['total_cost'], 2),
-                'total_time_hours': round(simple_results['total_time'], 2),
-                'avg_freshness': round(simple_results['avg_freshness'], 2)
-            },
-            'savings': savings,
-            'conclusion': f"MILP optimization saves {savings['cost_savings_percent']}% cost, {savings['time_savings_percent']}% time, and improves freshness by {savings['freshness_improvement_percent']}%"
-        })
+        status = stats['status']
+        if status != 'Optimal':
+            return status, None, stats
+        for t_id in self.transporter_ids:
+            if round(value(self.x[t_id])) == 1:
+                return status, t_id, stats
+        return 'Error', None, stats
+
+class RouteTemplatePool:
+    """
+    Idle RouteModelTemplates per fleet (tuple of transporter ids)
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    Each solve takes a template out of the pool and returns it after, so
+    concurrent requests never share a model; a new template is built
+    only when every pooled one for the fleet is busy. The least recently
+    used fleets are dropped beyond max_fleets.
+    """
+    
+    def __init__(self, max_fleets=8, max_idle=4):
+        self.max_fleets = max_fleets
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()
+        self.built = 0
+        self.reused = 0
+    
+    def acquire(self, transporter_ids):
+        key = tuple(transporter_ids)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self.reused += 1
+                return idle.pop()
+            self.built += 1
+        return RouteModelTemplate(transporter_ids)
+    
+    def release(self, template):
+        with self._lock:
+            idle = self._idle.setdefault(template.key, [])
+            self._idle.move_to_end(template.key)
+            if len(idle) < self.max_idle:
+                idle.append(template)
+            while len(self._idle) > self.max_fleets:
+                self._idle.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'fleets': len(self._idle),
+                'idle_templates': sum(len(idle) for idle in self._idle.values()),
+                'built': self.built,
+                'reused': self.reused
+            }
+
+ROUTE_TEMPLATES = RouteTemplatePool()
+
+def optimize_route(
+    source_type: str,
+    source_id: int,
+    destination_type: str,
+    destination_id: int,
+    quantity: int,
+    freshness_life_hours: int,
+    priority: str = 'balanced',
+    require_cold_chain: bool = False,
+    engine: str = 'auto',
+    extra_constraints: list = None,
+    solver_options: dict = None,
+    reserve: bool = False,
+    window_start: float = None,
+    check_bookings: bool = True
+):
+    """
+    Main MILP optimization function
+    
+    Minimizes: w1*Cost + w2*Time + w3*(1-Quality)
+    
+    Subject to:
+    - Capacity constraints, net of loads booked in the capacity ledger
+      over each transporter's transit window
+    - Cold chain requirements
+    - Freshness life constraints
+    - Single transporter selection
+    
+    Engines:
+    - 'analytic': exact filtered argmin, no solver process
+    - 'milp': full model through a solver backend (see solvers.py)
+    - 'auto': analytic unless extra_constraints couple the variables
+    
+    solver_options: backend, time_limit, gap_rel, threads (milp engine)
+    
+    window_start: departure time (Unix seconds, default now). With
+    reserve the selected transporter and the destination facility are
+    booked in the ledger; CapacityConflictError when they were booked
+    concurrently since they were read (see reserve_route).
+    check_bookings=False plans as if the ledger were empty (the cached
+    result, see cached_optimize_route).
+    """
+    if engine not in ('auto', 'analytic', 'milp'):
+        raise ValueError(f"Unknown engine: {engine}")
+    if engine == 'auto':
+        engine = 'milp' if extra_constraints else 'analytic'
+    if engine == 'analytic' and extra_constraints:
+        raise ValueError("extra_constraints require the 'milp' engine")
+    
+    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
+    
+    with phase('lane_metrics'):
+        transporter_metrics = compute_transporter_metrics(
+            source_type, source_id, destination_type, destination_id, freshness_life_hours
+        )
+        coefficients = objective_coefficients(transporter_metrics, weights)
+        excluded = infeasible_transporters(transporter_metrics, quantity, freshness_life_hours, require_cold_chain)
+    
+    with phase('capacity_check'):
+        window_start = time.time() if window_start is None else float(window_start)
+        windows = route_capacity_windows(
+            transporter_metrics, destination_type, destination_id, freshness_life_hours, window_start, reserve
+        )
+        if check_bookings or reserve:
+            availability = LEDGER.availability(windows)
+        else:
+            availability = {resource: (0, None) for resource in windows}
+        exclude_booked_transporters(excluded, availability, quantity)
+        if reserve:
+            facility_capacity = REGISTRY.get(destination_type, destination_id).get('capacity')
+            facility_booked = availability[(destination_type, destination_id)][0]
+            if facility_capacity is not None and facility_capacity - facility_booked < quantity:
+                ROUTE_OUTCOMES.inc(engine=engine, status='Infeasible')
+                return {
+                    'success': False,
+                    'status': 'Infeasible',
+                    'message': (
+                        f"{destination_type} {destination_id} has "
+                        f"{max(facility_capacity - facility_booked, 0)} units of capacity left in the window"
+                    )
+                }
+    
+    if engine == 'analytic':
+        start = time.perf_counter()
+        with phase('solve'):
+            selected_id = select_transporter_analytic(coefficients, excluded)
+        status = 'Optimal' if selected_id is not None else 'Infeasible'
+        solver_stats = {
+            'backend': 'analytic',
+            'status': status,
+            'wall_seconds': round(time.perf_counter() - start, 6),
+            'nodes': 0,
+            'gap': 0.0 if selected_id is not None else None
+        }
+    else:
+        status, selected_id, solver_stats = solve_route_milp(coefficients, excluded, extra_constraints, solver_options)
+    
+    # Get results
+    if status != 'Optimal':
+        ROUTE_OUTCOMES.inc(engine=engine, status=status)
+        return {
+            'success': False,
+            'status': status,
+            'message': 'No feasible solution found',
+            'solver_stats': solver_stats
+        }
+    
+    if selected_id is None:
+        ROUTE_OUTCOMES.inc(engine=engine, status='Error')
+        return {
+            'success': False,
+            'status': 'Error',
+            'message': 'No transporter selected',
+            'solver_stats': solver_stats
+        }
+    
+    with phase('result_build'):
+        result = build_route_result(
+            source_type, source_id, destination_type, destination_id,
+            quantity, freshness_life_hours, priority, require_cold_chain,
+            transporter_metrics, selected_id
+        )
+    result['engine'] = engine
+    result['solver_stats'] = solver_stats
+    
+    transporter_key = ('transporter', selected_id)
+    booked = availability[transporter_key][0]
+    start, end = windows[transporter_key]
+    result['capacity'] = {
+        'window_start': start,
+        'window_end': end,
+        'booked': booked,
+        'remaining': result['selected_transporter']['capacity'] - booked
+    }
+    if reserve:
+        destination = REGISTRY.get(destination_type, destination_id)
+        booking = LEDGER.reserve([
+            dict(entity_type='transporter', entity_id=selected_id, quantity=quantity,
+                 start=start, end=end, capacity=result['selected_transporter']['capacity']),
+            dict(entity_type=destination_type, entity_id=destination_id, quantity=quantity,
+                 start=windows[(destination_type, destination_id)][0],
+                 end=windows[(destination_type, destination_id)][1],
+                 capacity=destination.get('capacity'))
+        ], expected_versions={
+            key: availability[key][1] for key in (transporter_key, (destination_type, destination_id))
+        })
+        result['reservation'] = booking
+    
+    ROUTE_OUTCOMES.inc(engine=engine, status=status)
+    return result
+
+# ============================================
+# CAPACITY LEDGER
+# ============================================
+
+LEDGER = CapacityLedger(path=os.environ.get('LEDGER_DB') or None)
+
+# Re-plans of a reserving optimization before it gives up with 409
+LEDGER_MAX_RETRIES = int(os.environ.get('LEDGER_MAX_RETRIES', 5))
+
+def route_capacity_windows(
+    transporter_metrics, destination_type, destination_id, freshness_life_hours, window_start, include_destination
+):
+    """
+    Ledger windows of a route departing at window_start: each
+    transporter is busy for its transit time, the destination facility
+    holds the consignment for its freshness life
+    """
+    windows = {
+        ('transporter', t_id): (window_start, window_start + m['transit_time'] * 3600)
+        for t_id, m in transporter_metrics.items()
+    }
+    if include_destination:
+        windows[(destination_type, destination_id)] = (window_start, window_start + freshness_life_hours * 3600)
+    return windows
+
+def exclude_booked_transporters(excluded, availability, quantity):
+    """Add the transporters whose booked load leaves less than quantity to excluded"""
+    for t in REGISTRY.records('transporter'):
+        booked = availability.get(('transporter', t['id']), (0, None))[0]
+        if booked and t['capacity'] - booked < quantity:
+            excluded.setdefault(t['id'], f"Booked_Capacity_Constraint_{t['id']}")
+    return excluded
+
+def reserve_route(**params):
+    """optimize_route with reserve, re-planned when a concurrent booking took the capacity it read"""
+    for _ in range(LEDGER_MAX_RETRIES):
+        try:
+            return optimize_route(**dict(params, reserve=True))
+        except (CapacityConflictError, CapacityExceededError):
+            continue
+    raise CapacityConflictError(f"Capacity kept changing; gave up after {LEDGER_MAX_RETRIES} attempts")
+
+def booking_legs_from_request(legs):
+    """Ledger legs for a direct booking, with each entity's registered capacity"""
+    now = time.time()
+    return [
+        dict(
+            entity_type=leg['entity_type'],
+            entity_id=leg['entity_id'],
+            quantity=float(leg['quantity']),
+            start=float(leg.get('start', now)),
+            end=float(leg['end']),
+            capacity=REGISTRY.get(leg['entity_type'], leg['entity_id']).get('capacity')
+        )
+        for leg in legs
+    ]
+
+# ============================================
+# RESULT CACHE
+# ============================================
+
+ROUTE_CACHE = ResultCache(
+    maxsize=int(os.environ.get('ROUTE_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('ROUTE_CACHE_TTL', 300))
+)
+
+_capacity_thresholds = (None, [])
+
+def quantity_bucket(quantity):
+    """
+    Capacity band of a quantity. Quantities in the same band exclude
+    exactly the same transporters, so they share an optimal result.
+    """
+    global _capacity_thresholds
+    version, thresholds = _capacity_thresholds
+    if version != REGISTRY.version:
+        thresholds = sorted({t['capacity'] for t in REGISTRY.records('transporter')})
+        _capacity_thresholds = (REGISTRY.version, thresholds)
+    return bisect.bisect_left(thresholds, quantity)
+
+def route_cache_key(
+    source_type, source_id, destination_type, destination_id, quantity,
+    freshness_life_hours, priority='balanced', require_cold_chain=False, engine='auto'
+):
+    """Canonical cache key; includes the registry version and the applied weights"""
+    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
+    return (
+        REGISTRY.version,
+        tuple(sorted(weights.items())),
+        str(source_type), source_id,
+        str(destination_type), destination_id,
+        quantity_bucket(quantity),
+        float(freshness_life_hours),
+        str(priority),
+        bool(require_cold_chain),
+        str(engine)
+    )
+
+def apply_route_bookings(result, quantity, window_start=None, check_bookings=True):
+    """
+    Capacity block of a cached (ledger-free) route result for this
+    request's departure time; None when bookings leave the selected
+    transporter too little room for the quantity
+    
+    Bookings only ever exclude transporters, so a cached pick that still
+    fits stays optimal and only a booked-out one needs a fresh solve.
+    """
+    capacity = result['capacity']
+    start = time.time() if window_start is None else float(window_start)
+    end = start + (capacity['window_end'] - capacity['window_start'])
+    transporter_capacity = result['selected_transporter']['capacity']
+    booked = 0
+    if check_bookings:
+        resource = ('transporter', result['selected_transporter']['id'])
+        booked = LEDGER.availability({resource: (start, end)})[resource][0]
+        if booked and transporter_capacity - booked < quantity:
+            return None
+    result['capacity'] = {
+        'window_start': start,
+        'window_end': end,
+        'booked': booked,
+        'remaining': transporter_capacity - booked
+    }
+    return result
+
+def cached_optimize_route(**params):
+    """
+    optimize_route behind the LRU+TTL result cache
+    
+    Entries are solved against an empty ledger; the departure time and
+    bookings are applied per request (apply_route_bookings), with a full
+    solve when bookings rule out the cached transporter.
+    check_bookings=False skips the ledger altogether.
+    """
+    if params.get('reserve'):
+        return reserve_route(**params)
+    # Custom constraints and solver settings are request-specific; always solve them
+    if params.get('extra_constraints') or params.get('solver_options'):
+        return optimize_route(**params)
+    
+    params = dict(params)
+    check_bookings = params.pop('check_bookings', True)
+    window_start = params.pop('window_start', None)
+    with phase('cache_lookup'):
+        key = route_cache_key(**{
+            k: v for k, v in params.items() if k not in ('extra_constraints', 'solver_options', 'reserve')
+        })
+        cached = ROUTE_CACHE.get(key)
+    if cached is None:
+        result = optimize_route(**params, check_bookings=False)
+        ROUTE_CACHE.put(key, copy.deepcopy(result))
+    else:
+        result = copy.deepcopy(cached)
+        if result['success']:
+            result['optimization_timestamp'] = datetime.now().isoformat()
+            result['solver_stats'] = {
+                'backend': 'cache',
+                'status': result['status'],
+                'wall_seconds': 0.0,
+                'nodes': 0,
+                'gap': 0.0
+            }
+    if not result['success']:
+        return result
+    
+    with phase('capacity_check'):
+        booked = apply_route_bookings(result, params['quantity'], window_start, check_bookings)
+    if booked is None:
+        return optimize_route(**params, window_start=window_start)
+    return booked
+
+def invalidate_route_cache(old, new):
+    """Registry listener: cached results refer to the previous entities"""
+    ROUTE_CACHE.clear()
+
+REGISTRY.add_listener(invalidate_route_cache)
+
+# ============================================
+# PARETO FRONTIER
+# ============================================
+
+OBJECTIVES = ('cost', 'time', 'quality')
+PARETO_MAX_GRID_STEPS = 200  # 20301 weight vectors
+
+def simplex_weight_grid(steps):
+    """All (cost, time, quality) weight vectors on a simplex grid with 1/steps spacing"""
+    i, j = np.meshgrid(np.arange(steps + 1), np.arange(steps + 1), indexing='ij')
+    keep = i + j <= steps
+    i, j = i[keep], j[keep]
+    return np.column_stack([i, j, steps - i - j]) / steps
+
+def pareto_mask(points, block_size=256):
+    """
+    Non-dominated rows of an (n, k) array of objectives to minimize
+    
+    Compared in row blocks so memory stays O(block_size * n).
+    """
+    n = len(points)
+    mask = np.ones(n, dtype=bool)
+    for start in range(0, n, block_size):
+        block = points[start:start + block_size, None, :]
+        dominated = (np.all(points[None, :, :] <= block, axis=2) & np.any(points[None, :, :] < block, axis=2)).any(axis=1)
+        mask[start:start + block_size] = ~dominated
+    return mask
+
+def optimize_pareto(
+    source_type: str,
+    source_id: int,
+    destination_type: str,
+    destination_id: int,
+    quantity: int,
+    freshness_life_hours: int,
+    require_cold_chain: bool = False,
+    weights: list = None,
+    grid_steps: int = 0,
+    include_sweep: bool = False,
+    window_start: float = None
+):
+    """
+    Trade-off analysis for one lane in a single pass
+    
+    Transporter metrics and constraint exclusions are computed once; the
+    weighted objective of every weight vector (named priorities, custom
+    weights and an optional simplex grid) is evaluated in one broadcast
+    expression with the same arithmetic as objective_coefficients, so
+    each pick matches optimize_route for those weights exactly.
+    Transporters booked out over their transit window from window_start
+    are excluded, as in optimize_route.
+    """
+    if isinstance(grid_steps, bool) or not isinstance(grid_steps, (int, np.integer)) \
+            or not 0 <= grid_steps <= PARETO_MAX_GRID_STEPS:
+        raise ValueError(f"grid_steps must be an integer between 0 and {PARETO_MAX_GRID_STEPS}")
+    if not isinstance(weights or [], list):
+        raise ValueError("weights must be a list of {cost, time, quality} objects")
+    for i, w in enumerate(weights or []):
+        if not isinstance(w, dict):
+            raise ValueError(f"weights[{i}] must be an object with {', '.join(OBJECTIVES)}")
+        for o in OBJECTIVES:
+            if o not in w:
+                raise ValueError(f"weights[{i}] is missing '{o}'")
+            if isinstance(w[o], bool) or not isinstance(w[o], (int, float)) or not 0 <= w[o] < math.inf:
+                raise ValueError(f"weights[{i}].{o} must be a non-negative number")
+    
+    with phase('lane_metrics'):
+        transporter_metrics = compute_transporter_metrics(
+            source_type, source_id, destination_type, destination_id, freshness_life_hours
+        )
+        excluded = infeasible_transporters(transporter_metrics, quantity, freshness_life_hours, require_cold_chain)
+    
+    with phase('capacity_check'):
+        window_start = time.time() if window_start is None else float(window_start)
+        windows = route_capacity_windows(
+            transporter_metrics, destination_type, destination_id, freshness_life_hours, window_start, False
+        )
+        exclude_booked_transporters(excluded, LEDGER.availability(windows), quantity)
+    
+    with phase('solve'):
+        ids = np.array(sorted(transporter_metrics))  # ascending, so ties go to the lowest id
+        cost = np.array([transporter_metrics[t]['transport_cost'] for t in ids])
+        transit = np.array([transporter_metrics[t]['transit_time'] for t in ids])
+        quality = np.array([transporter_metrics[t]['quality'] for t in ids])
+        feasible = np.array([t not in excluded for t in ids])
+        
+        named = [(name, PRIORITY_WEIGHTS[name]) for name in PRIORITY_WEIGHTS]
+        named += [(w.get('name', f'custom_{i}'), w) for i, w in enumerate(weights or [])]
+        weight_matrix = np.array([[w[o] for o in OBJECTIVES] for _, w in named], dtype=np.float64).reshape(-1, 3)
+        if grid_steps:
+            weight_matrix = np.vstack([weight_matrix, simplex_weight_grid(grid_steps)])
+        
+        # Same operation order as objective_coefficients
+        scores = (
+            weight_matrix[:, 0:1] * (cost / (cost.max() or 1)) +
+            weight_matrix[:, 1:2] * (transit / (transit.max() or 1)) +
+            weight_matrix[:, 2:3] * (1 - quality)
+        )
+        scores[:, ~feasible] = np.inf
+        picks = scores.argmin(axis=1)
+        has_pick = np.isfinite(scores[np.arange(len(picks)), picks])
+        
+        frontier = np.flatnonzero(feasible)
+        frontier = frontier[pareto_mask(np.column_stack([cost, transit, -quality])[frontier])]
+    
+    with phase('result_build'):
+        def option(k):
+            m = transporter_metrics[int(ids[k])]
+            return {
+                'transporter_id': int(ids[k]),
+                'name': m['name'],
+                'cost': round(m['transport_cost'], 2),
+                'time_hours': round(m['transit_time'], 2),
+                'quality': m['quality'],
+                'freshness': round(m['arrival_freshness'], 1),
+                'risk': round(m['risk'], 1)
+            }
+        
+        supported = set(picks[has_pick].tolist())
+        profiles = {}
+        for row, (name, w) in enumerate(named):
+            profiles[name] = {
+                'weights': {o: w[o] for o in OBJECTIVES},
+                'transporter_id': int(ids[picks[row]]) if has_pick[row] else None,
+                'objective_value': round(float(scores[row, picks[row]]), 6) if has_pick[row] else None
+            }
+        
+        distance, distance_source = lane_distance(source_type, source_id, destination_type, destination_id)
+        result = {
+            'success': bool(feasible.any()),
+            'status': 'Optimal' if feasible.any() else 'Infeasible',
+            'optimization_timestamp': datetime.now().isoformat(),
+            'route': {
+                'source': {'type': source_type, 'id': source_id},
+                'destination': {'type': destination_type, 'id': destination_id},
+                'distance_km': round(distance, 2),
+                'distance_source': distance_source
+            },
+            'frontier': [dict(option(k), supported=bool(k in supported)) for k in frontier],
+            'profiles': profiles,
+            'excluded': {str(t_id): constraint for t_id, constraint in excluded.items()},
+            'weight_vectors_evaluated': len(weight_matrix)
+        }
+        
+        if grid_steps:
+            grid_picks = picks[len(named):][has_pick[len(named):]]
+            counts = np.bincount(grid_picks, minlength=len(ids))
+            result['sweep'] = {
+                'grid_steps': int(grid_steps),
+                'points': len(weight_matrix) - len(named),
+                'pick_counts': {str(int(ids[k])): int(counts[k]) for k in np.flatnonzero(counts)}
+            }
+            if include_sweep:
+                grid = weight_matrix[len(named):]
+                grid_rows = np.arange(len(named), len(weight_matrix))
+                result['sweep']['points_detail'] = [
+                    {
+                        'weights': dict(zip(OBJECTIVES, np.round(grid[i], 6).tolist())),
+                        'transporter_id': int(ids[picks[row]]) if has_pick[row] else None
+                    }
+                    for i, row in enumerate(grid_rows)
+                ]
+    
+    return result
+
+# ============================================
+# ROBUST OPTIMIZATION (MONTE CARLO)
+# ============================================
+
+ROBUST_MAX_SCENARIOS = 100000
+RISK_MEASURES = ('expected', 'cvar')
+
+def optimize_route_robust(
+    source_type: str,
+    source_id: int,
+    destination_type: str,
+    destination_id: int,
+    quantity: int,
+    freshness_life_hours: int,
+    priority: str = 'balanced',
+    require_cold_chain: bool = False,
+    scenarios: int = 2000,
+    seed: int = 0,
+    risk_measure: str = 'expected',
+    cvar_alpha: float = 0.9,
+    max_breach_probability: float = None,
+    uncertainty: dict = None,
+    window_start: float = None
+):
+    """
+    Transporter selection under transit-time and temperature uncertainty
+    
+    Samples delay and excursion scenarios (scenarios.py) for every
+    candidate and scores each scenario with the optimize_route objective,
+    transit time taken from the scenario and the quality term scaled by
+    the freshness kept relative to the on-time arrival:
+    
+        w1*Cost + w2*Time_s + w3*(1 - Quality * Freshness_s / Freshness_planned)
+    
+    Without uncertainty this reduces to the deterministic objective. The
+    pick minimizes the expected value or the CVaR (mean of the worst
+    1 - cvar_alpha share) of that objective, among transporters that pass
+    the deterministic constraints and, with max_breach_probability, whose
+    chance of exceeding the freshness window (70% of the life) is at most
+    that. Only transporters passing the deterministic constraints are
+    sampled; their freshness and risk distributions are reported as
+    candidates. Transporters booked out over their transit window from
+    window_start are excluded beforehand, as in optimize_route.
+    """
+    if risk_measure not in RISK_MEASURES:
+        raise ValueError(f"risk_measure must be one of {list(RISK_MEASURES)}")
+    if not 0 <= cvar_alpha < 1:
+        raise ValueError("cvar_alpha must be in [0, 1)")
+    scenarios = int(scenarios)
+    if not 1 <= scenarios <= ROBUST_MAX_SCENARIOS:
+        raise ValueError(f"scenarios must be between 1 and {ROBUST_MAX_SCENARIOS}")
+    
+    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
+    
+    with phase('lane_metrics'):
+        transporter_metrics = compute_transporter_metrics(
+            source_type, source_id, destination_type, destination_id, freshness_life_hours
+        )
+        excluded = infeasible_transporters(transporter_metrics, quantity, freshness_life_hours, require_cold_chain)
+    
+    with phase('capacity_check'):
+        window_start = time.time() if window_start is None else float(window_start)
+        windows = route_capacity_windows(
+            transporter_metrics, destination_type, destination_id, freshness_life_hours, window_start, False
+        )
+        availability = LEDGER.availability(windows)
+        exclude_booked_transporters(excluded, availability, quantity)
+    
+    with phase('lane_metrics'):
+        # Normalized like objective_coefficients, over the whole fleet
+        max_cost = max(m['transport_cost'] for m in transporter_metrics.values()) or 1
+        max_time = max(m['transit_time'] for m in transporter_metrics.values()) or 1
+        # Only transporters passing the deterministic constraints are sampled,
+        # in ascending id order so ties go to the lowest id
+        ids = np.array(sorted(t for t in transporter_metrics if t not in excluded), dtype=np.int64)
+        metrics = [transporter_metrics[t] for t in ids.tolist()]
+        cost = np.array([m['transport_cost'] for m in metrics], dtype=np.float64)
+        transit = np.array([m['transit_time'] for m in metrics], dtype=np.float64)
+        distance = np.array([m['distance'] for m in metrics], dtype=np.float64)
+        quality = np.array([m['quality'] for m in metrics], dtype=np.float64)
+        cold_chain = np.array([m['cold_chain'] for m in metrics], dtype=bool)
+        planned_freshness = np.array([m['arrival_freshness'] for m in metrics], dtype=np.float64)
+    
+    with phase('scenarios'):
+        transit_s, cold_hours, ambient_hours, excursion = sample_transit_scenarios(
+            transit, distance, cold_chain, scenarios, seed, uncertainty
+        )
+        freshness_s = calculate_freshness_scores(
+            calculate_freshness_scores(100.0, cold_hours, True, exact=False), ambient_hours, False, exact=False
+        )
+        risk_s = calculate_risk_levels(distance[:, None], cold_chain[:, None] & ~excursion, freshness_life_hours, transit_s)
+        breach = transit_s > freshness_life_hours * 0.7
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            kept = np.where(planned_freshness[:, None] > 0, freshness_s / planned_freshness[:, None], 0.0)
+        objective_s = (
+            weights['cost'] * (cost / max_cost)[:, None] +
+            weights['time'] * (transit_s / max_time) +
+            weights['quality'] * (1 - quality[:, None] * kept)
+        )
+        expected = objective_s.mean(axis=1)
+        tail = cvar(objective_s, cvar_alpha) if len(ids) else expected
+        breach_probability = breach.mean(axis=1)
+        score = expected if risk_measure == 'expected' else tail
+    
+    robust_excluded = dict(excluded)
+    if max_breach_probability is not None:
+        for k, t_id in enumerate(ids.tolist()):
+            if breach_probability[k] > max_breach_probability:
+                robust_excluded[t_id] = f"Freshness_Chance_Constraint_{t_id}"
+    feasible = np.array([t not in robust_excluded for t in ids.tolist()], dtype=bool)
+    deterministic = select_transporter_analytic(objective_coefficients(transporter_metrics, weights), excluded)
+    
+    pick = int(np.argmin(np.where(feasible, score, np.inf))) if feasible.any() else None
+    
+    with phase('result_build'):
+        transit_summary = distribution_summary(transit_s)
+        freshness_summary = distribution_summary(freshness_s)
+        risk_summary = distribution_summary(risk_s)
+        
+        def summary(stats, k, digits):
+            return {name: round(float(values[k]), digits) for name, values in stats.items()}
+        
+        robust = {
+            'risk_measure': risk_measure,
+            'cvar_alpha': cvar_alpha,
+            'scenarios': scenarios,
+            'seed': seed,
+            'uncertainty': dict(DEFAULT_UNCERTAINTY, **(uncertainty or {})),
+            'max_breach_probability': max_breach_probability,
+            'deterministic_transporter_id': deterministic,
+            'candidates': [
+                {
+                    'transporter_id': int(ids[k]),
+                    'feasible': bool(feasible[k]),
+                    'expected_objective': round(float(expected[k]), 6),
+                    'cvar_objective': round(float(tail[k]), 6),
+                    'breach_probability': round(float(breach_probability[k]), 4),
+                    'excursion_probability': round(float(excursion[k].mean()), 4),
+                    'transit_hours': summary(transit_summary, k, 2),
+                    'arrival_freshness': summary(freshness_summary, k, 1),
+                    'risk': summary(risk_summary, k, 1),
+                    'selected': k == pick
+                }
+                for k in range(len(ids))
+            ],
+            'excluded': {str(t_id): constraint for t_id, constraint in robust_excluded.items()}
+        }
+        if pick is None:
+            return {
+                'success': False,
+                'status': 'Infeasible',
+                'message': 'No feasible solution found',
+                'robust': robust
+            }
+        
+        selected_id = int(ids[pick])
+        robust['changed_by_uncertainty'] = deterministic != selected_id
+        result = build_route_result(
+            source_type, source_id, destination_type, destination_id,
+            quantity, freshness_life_hours, priority, require_cold_chain,
+            transporter_metrics, selected_id
+        )
+        result['engine'] = 'robust'
+        result['robust'] = robust
+        booked = availability[('transporter', selected_id)][0]
+        start, end = windows[('transporter', selected_id)]
+        result['capacity'] = {
+            'window_start': start,
+            'window_end': end,
+            'booked': booked,
+            'remaining': result['selected_transporter']['capacity'] - booked
+        }
+    return result
+
+# ============================================
+# BATCH OPTIMIZATION
+# ============================================
+
+# Objective penalty for leaving an order unassigned. Per-order objective
+# values are normalized to at most 1, so any larger value makes the solver
+# prefer assigning every order that fits.
+UNASSIGNED_PENALTY = 10
+
+def optimize_batch(
+    orders,
+    enforce_shared_capacity: bool = True,
+    solver_options: dict = None,
+    reserve: bool = False,
+    window_start: float = None
+):
+    """
+    Jointly assign many orders to transporters in a single MILP
+    
+    Minimizes: sum over orders of w1*Cost + w2*Time + w3*(1-Quality)
+               + penalty * unassigned orders
+    
+    Subject to:
+    - Each order assigned to at most one transporter
+    - Per-order cold chain, capacity and freshness constraints
+    - Shared fleet capacity: total quantity per transporter <= capacity
+      net of loads booked in the capacity ledger
+    
+    Every order departs at window_start (Unix seconds, default now); a
+    transporter's ledger window runs to the longest transit time of the
+    orders it can serve. With reserve each used transporter is booked
+    for its total assigned quantity over that window
+    (CapacityConflictError when it was booked concurrently, see
+    reserve_batch).
+    
+    Returns one /optimize-shaped result per order (in request order)
+    plus solver statistics for the whole batch.
+    """
+    if reserve and not enforce_shared_capacity:
+        raise ValueError("reserve requires enforce_shared_capacity")
+    transporters = REGISTRY.records('transporter')
+    order_params = []
+    for order in orders:
+        order_params.append({
+            'source_type': order.get('source_type', 'harvester'),
+            'source_id': order.get('source_id', 1),
+            'destination_type': order.get('destination_type', 'distributor'),
+            'destination_id': order.get('destination_id', 1),
+            'quantity': order.get('quantity', 1000),
+            'freshness_life_hours': order.get('freshness_life_hours', 72),
+            'priority': order.get('priority', 'balanced'),
+            'require_cold_chain': order.get('require_cold_chain', False)
+        })
+    
+    with phase('lane_metrics'):
+        order_metrics = []
+        order_excluded = []
+        for params in order_params:
+            transporter_metrics = compute_transporter_metrics(
+                params['source_type'], params['source_id'],
+                params['destination_type'], params['destination_id'],
+                params['freshness_life_hours']
+            )
+            order_metrics.append(transporter_metrics)
+            order_excluded.append(infeasible_transporters(
+                transporter_metrics, params['quantity'],
+                params['freshness_life_hours'], params['require_cold_chain']
+            ))
+    
+    with phase('capacity_check'):
+        window_start = time.time() if window_start is None else float(window_start)
+        transit_hours = {}
+        for transporter_metrics, excluded in zip(order_metrics, order_excluded):
+            for t_id, m in transporter_metrics.items():
+                if t_id not in excluded:
+                    transit_hours[t_id] = max(transit_hours.get(t_id, 0), m['transit_time'])
+        windows = {
+            ('transporter', t_id): (window_start, window_start + hours * 3600)
+            for t_id, hours in transit_hours.items()
+        }
+        availability = LEDGER.availability(windows)
+        booked = {t_id: availability[('transporter', t_id)][0] for _, t_id in windows}
+        for params, excluded in zip(order_params, order_excluded):
+            exclude_booked_transporters(excluded, availability, params['quantity'])
+    
+    with phase('model_build'):
+        prob = LpProblem("FloraChain_Batch_Optimization", LpMinimize)
+        
+        assign = {}          # (order index, transporter id) -> LpVariable
+        unassigned = {}      # order index -> LpVariable
+        objective_terms = []
+        
+        for i, params in enumerate(order_params):
+            weights = PRIORITY_WEIGHTS.get(params['priority'], PRIORITY_WEIGHTS['balanced'])
+            coefficients = objective_coefficients(order_metrics[i], weights)
+            excluded = order_excluded[i]
+            
+            # Only feasible (order, transporter) pairs get a variable
+            order_vars = []
+            for t in transporters:
+                if t['id'] in excluded:
+                    continue
+                var = LpVariable(f"assign_{i}_{t['id']}", cat='Binary')
+                assign[(i, t['id'])] = var
+                order_vars.append((var, 1))
+                objective_terms.append((var, coefficients[t['id']]))
+            
+            unassigned[i] = LpVariable(f"unassigned_{i}", cat='Binary')
+            order_vars.append((unassigned[i], 1))
+            objective_terms.append((unassigned[i], UNASSIGNED_PENALTY))
+            
+            prob += LpAffineExpression(order_vars) == 1, f"Assign_Order_{i}"
+        
+        prob += LpAffineExpression(objective_terms), "Total_Weighted_Objective"
+        
+        # Constraint: shared transporter capacity across the whole batch
+        if enforce_shared_capacity:
+            for t in transporters:
+                load = [
+                    (assign[(i, t['id'])], order_params[i]['quantity'])
+                    for i in range(len(order_params))
+                    if (i, t['id']) in assign
+                ]
+                if load:
+                    prob += (
+                        LpAffineExpression(load) <= t['capacity'] - booked.get(t['id'], 0),
+                        f"Fleet_Capacity_{t['id']}"
+                    )
+    
+    solver_stats = solve(prob, **(solver_options or {}))
+    status = solver_stats['status']
+    
+    results = []
+    for i, params in enumerate(order_params):
+        if status != 'Optimal':
+            results.append({
+                'success': False,
+                'status': status,
+                'message': 'No feasible solution found'
+            })
+            continue
+        
+        selected_id = None
+        for t in transporters:
+            var = assign.get((i, t['id']))
+            if var is not None and round(value(var)) == 1:
+                selected_id = t['id']
+                break
+        
+        if selected_id is None:
+            has_options = any((i, t['id']) in assign for t in transporters)
+            results.append({
+                'success': False,
+                'status': 'Infeasible',
+                'message': 'Shared fleet capacity exhausted' if has_options else 'No feasible solution found'
+            })
+            continue
+        
+        results.append(build_route_result(
+            transporter_metrics=order_metrics[i], selected_id=selected_id, **params
+        ))
+    
+    fleet_load = {t['id']: 0 for t in transporters}
+    for params, result in zip(order_params, results):
+        if result['success']:
+            fleet_load[result['selected_transporter']['id']] += params['quantity']
+    
+    batch = {
+        'status': status,
+        'results': results,
+        'fleet_utilization': [
+            {
+                'transporter_id': t['id'],
+                'name': t['name'],
+                'assigned_quantity': fleet_load[t['id']],
+                'booked': booked.get(t['id'], 0),
+                'capacity': t['capacity']
+            }
+            for t in transporters
+        ],
+        'shared_capacity_enforced': enforce_shared_capacity,
+        'solver_stats': solver_stats
+    }
+    
+    used = [t for t in transporters if fleet_load[t['id']]]
+    if reserve and used:
+        batch['reservation'] = LEDGER.reserve([
+            dict(entity_type='transporter', entity_id=t['id'], quantity=fleet_load[t['id']],
+                 start=window_start, end=windows[('transporter', t['id'])][1], capacity=t['capacity'])
+            for t in used
+        ], expected_versions={('transporter', t['id']): availability[('transporter', t['id'])][1] for t in used})
+    return batch
+
+def reserve_batch(orders, enforce_shared_capacity=True, solver_options=None, window_start=None):
+    """optimize_batch with reserve, re-planned when a concurrent booking took the capacity it read"""
+    for _ in range(LEDGER_MAX_RETRIES):
+        try:
+            return optimize_batch(orders, enforce_shared_capacity, solver_options, True, window_start)
+        except (CapacityConflictError, CapacityExceededError):
+            continue
+    raise CapacityConflictError(f"Capacity kept changing; gave up after {LEDGER_MAX_RETRIES} attempts")
+
+# ============================================
+# NETWORK FLOW OPTIMIZATION
+# ============================================
+
+def network_distance_block(source_type, source_ids, destination_type, destination_ids):
+    """Distance sub-matrix between two entity groups (km)"""
+    return DISTANCES.block(
+        [(source_type, i) for i in source_ids],
+        [(destination_type, i) for i in destination_ids]
+    )
+
+def network_nearby_pairs(source_type, source_ids, destination_type, destination_ids, radius_km):
+    """
+    Entity pairs between two groups lying within radius_km, found with
+    the grid index; (source rows, destination rows, km from the matrix),
+    or None when the radius covers most pairs and the dense block is cheaper
+    """
+    index = SPATIAL[source_type]
+    positions = {entity_id: position for position, entity_id in enumerate(index.ids.tolist())}
+    source_positions = np.array([positions[i] for i in source_ids], dtype=np.int64)
+    coords = np.array([get_entity_coords(destination_type, i) for i in destination_ids])
+    
+    if fraction_within(
+        index.lat[source_positions], index.lon[source_positions], coords[:, 0], coords[:, 1], radius_km
+    ) > SPATIAL_DENSE_FRACTION:
+        return None
+    
+    source_rows = np.full(len(index), -1, dtype=np.int64)
+    source_rows[source_positions] = np.arange(len(source_ids))
+    dest_rows, points, _ = index.pairs_within(coords[:, 0], coords[:, 1], radius_km)
+    src_rows = source_rows[points]
+    keep = src_rows >= 0
+    src_rows, dest_rows = src_rows[keep], dest_rows[keep]
+    order = np.lexsort((dest_rows, src_rows))
+    src_rows, dest_rows = src_rows[order], dest_rows[order]
+    
+    distance = DISTANCES.gather(
+        [(source_type, i) for i in source_ids],
+        [(destination_type, i) for i in destination_ids],
+        src_rows, dest_rows
+    )
+    return src_rows, dest_rows, distance
+
+def optimize_supply_network(
+    demands,
+    freshness_life_hours: int = 72,
+    priority: str = 'balanced',
+    require_cold_chain: bool = False,
+    allow_bypass: bool = False,
+    dwell_hours: float = 6.0,
+    min_arrival_freshness: float = None,
+    max_inbound_arcs: int = None,
+    spatial_pruning: bool = True,
+    solver_options: dict = None
+):
+    """
+    Multi-echelon network-flow MILP: harvester -> distributor ->
+    wholesaler -> retailer, optionally with echelon-skipping arcs
+    
+    demands: {retailer_id: quantity}
+    spatial_pruning: generate only node pairs close enough to be
+    reachable within the time / freshness budgets (exact; the optimum
+    is unchanged)
+    """
+    weights = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS['balanced'])
+    check_freshness_floor('min_arrival_freshness', min_arrival_freshness)
+    
+    for retailer_id in demands:
+        REGISTRY.get('retailer', retailer_id)
+    
+    transporters = [
+        dict(t, route_factor=transporter_route_factor(t))
+        for t in REGISTRY.records('transporter')
+    ]
+    
+    start = time.perf_counter()
+    with phase('arc_generation'):
+        network = build_network(
+            nodes={entity_type: REGISTRY.records(entity_type) for entity_type in LOCATED_ENTITY_TYPES},
+            transporters=transporters,
+            distance_block=network_distance_block,
+            demands=demands,
+            freshness_life_hours=freshness_life_hours,
+            require_cold_chain=require_cold_chain,
+            allow_bypass=allow_bypass,
+            dwell_hours=dwell_hours,
+            min_arrival_freshness=min_arrival_freshness,
+            decay_rate=FRESHNESS_DECAY_RATE / 100,
+            cold_chain_factor=0.3,
+            max_inbound_arcs=max_inbound_arcs,
+            nearby_pairs=network_nearby_pairs if spatial_pruning else None
+        )
+    arc_seconds = time.perf_counter() - start
+    
+    result = optimize_network(network, weights, solver_options)
+    result['model']['arc_generation_seconds'] = round(arc_seconds, 4)
+    result['optimization_timestamp'] = datetime.now().isoformat()
+    result['priority_used'] = priority
+    result['weights_applied'] = weights
+    result['constraints'] = {
+        'cold_chain_required': require_cold_chain,
+        'allow_bypass': allow_bypass,
+        'max_elapsed_hours': round(freshness_life_hours * 0.7, 2),
+        'min_arrival_freshness': min_arrival_freshness,
+        'heuristic_arc_limit': max_inbound_arcs,
+        'spatial_pruning': spatial_pruning
+    }
+    return result
+
+# ============================================
+# VEHICLE ROUTING (MULTI-STOP, TIME WINDOWS)
+# ============================================
+
+VRP_DEFAULT_SERVICE_HOURS = 0.25
+
+def check_freshness_floor(name, value):
+    """A minimum-freshness parameter: None (no floor) or a score in (0, 100]; ValueError otherwise"""
+    if value is not None and not 0 < float(value) <= 100:
+        raise ValueError(f"{name} must be greater than 0 and at most 100")
+    return value
+
+def freshness_deadline_hours(freshness_life_hours, min_arrival_freshness, has_cold_chain):
+    """Longest time after departure at which a delivery still meets the freshness limits"""
+    check_freshness_floor('min_arrival_freshness', min_arrival_freshness)
+    deadline = freshness_life_hours * 0.7  # Leave 30% buffer, as for single routes
+    if min_arrival_freshness is not None:
+        decay_rate = FRESHNESS_DECAY_RATE / 100
+        if has_cold_chain:
+            decay_rate *= 0.3
+        # Invert F(t) = 100 * e^(-λt) >= min_arrival_freshness
+        deadline = min(deadline, max(0.0, math.log(100 / min_arrival_freshness) / decay_rate))
+    return deadline
+
+def build_vrp_fleet(fleet, freshness_life_hours, min_arrival_freshness):
+    """
+    Expand [{"transporter_id": 1, "count": 2}, ...] into individual vehicles
+    (default: one vehicle per registered transporter)
+    """
+    if not fleet:
+        fleet = [{'transporter_id': t['id'], 'count': 1} for t in REGISTRY.records('transporter')]
+    if not isinstance(fleet, list):
+        raise ValueError('fleet must be a list of {"transporter_id", "count"} objects')
+    
+    vehicles = []
+    for i, entry in enumerate(fleet):
+        if not isinstance(entry, dict) or 'transporter_id' not in entry:
+            raise ValueError(f'fleet[{i}] must be an object with a "transporter_id"')
+        count = entry.get('count', 1)
+        if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+            raise ValueError(f'fleet[{i}].count must be an integer of at least 1')
+        t = REGISTRY.get('transporter', entry['transporter_id'])
+        for unit in range(1, count + 1):
+            vehicles.append(dict(
+                t,
+                unit=unit,
+                route_factor=transporter_route_factor(t),
+                max_elapsed_hours=freshness_deadline_hours(freshness_life_hours, min_arrival_freshness, t['cold_chain'])
+            ))
+    if not vehicles:
+        raise ValueError('The fleet has no vehicles: no transporters are registered')
+    return vehicles
+
+def optimize_vrp(
+    depot_type: str,
+    depot_id: int,
+    stops: list,
+    fleet: list = None,
+    freshness_life_hours: int = 72,
+    min_arrival_freshness: float = None,
+    time_budget_seconds: float = 2.0,
+    seed: int = 0
+):
+    """
+    Multi-stop routes from one depot to retailer stops (VRP with time windows)
+    
+    Minimizes: total transport cost over all vehicle tours
+    
+    Subject to:
+    - Vehicle capacity
+    - Cold chain requirements per stop
+    - Delivery time windows (hours after departure)
+    - Freshness on delivery (calculate_freshness_score decay limits)
+    """
+    with phase('model_build'):
+        REGISTRY.get(depot_type, depot_id)
+        retailers = [REGISTRY.get('retailer', stop['retailer_id']) for stop in stops]
+        vehicles = build_vrp_fleet(fleet, freshness_life_hours, min_arrival_freshness)
+        
+        keys = [(depot_type, depot_id)] + [('retailer', r['id']) for r in retailers]
+        window_end = [stop.get('window_end_hours') for stop in stops]
+        instance = VRPInstance(
+            distance=DISTANCES.block(keys, keys),
+            demand=[stop['quantity'] for stop in stops],
+            window_start=[stop.get('window_start_hours', 0) for stop in stops],
+            window_end=[math.inf if end is None else end for end in window_end],
+            service_hours=[stop.get('service_hours', VRP_DEFAULT_SERVICE_HOURS) for stop in stops],
+            require_cold=[stop.get('require_cold_chain', False) for stop in stops],
+            vehicles=vehicles
+        )
+    
+    with SOLVER_SLOTS.slot(), phase('solve'):
+        solution = solve_vrptw(instance, time_budget=time_budget_seconds, seed=seed)
+    
+    with phase('result_build'):
+        routes = []
+        for route in solution['routes']:
+            v = vehicles[route['vehicle']]
+            route_stops = []
+            for sequence, (i, arrival, start) in enumerate(zip(route['stops'], route['arrival_hours'], route['start_hours']), 1):
+                stop = stops[i]
+                route_stops.append({
+                    'sequence': sequence,
+                    'stop_index': i,
+                    'retailer_id': retailers[i]['id'],
+                    'name': retailers[i]['name'],
+                    'quantity': stop['quantity'],
+                    'arrival_hours': round(arrival, 2),
+                    'service_start_hours': round(start, 2),
+                    'wait_hours': round(start - arrival, 2),
+                    'window_hours': [stop.get('window_start_hours', 0), window_end[i]],
+                    'freshness_on_delivery': round(calculate_freshness_score(100, start, v['cold_chain']), 1)
+                })
+            routes.append({
+                'vehicle': {
+                    'transporter_id': v['id'],
+                    'unit': v['unit'],
+                    'name': v['name'],
+                    'vehicle': v['vehicle'],
+                    'cold_chain': v['cold_chain'],
+                    'capacity': v['capacity']
+                },
+                'stops': route_stops,
+                'load': route['load'],
+                'capacity_utilization': round(route['load'] / v['capacity'], 3),
+                'distance_km': round(route['distance_km'], 2),
+                'transport_cost': round(route['cost'], 2),
+                'return_to_depot_hours': round(route['return_hours'], 2)
+            })
+        
+        unserved = [
+            {
+                'stop_index': u['stop'],
+                'retailer_id': retailers[u['stop']]['id'],
+                'quantity': stops[u['stop']]['quantity'],
+                'reason': u['reason']
+            }
+            for u in solution['unserved']
+        ]
+    
+    stats = solution['stats']
+    stats['construction_cost'] = round(stats['construction_cost'], 2)
+    return {
+        'success': True,
+        'status': 'Complete' if not unserved else 'Partial',
+        'optimization_timestamp': datetime.now().isoformat(),
+        'depot': {'type': depot_type, 'id': depot_id},
+        'routes': routes,
+        'unserved': unserved,
+        'summary': {
+            'stops_served': len(stops) - len(unserved),
+            'stops_unserved': len(unserved),
+            'vehicles_used': len(routes),
+            'total_distance_km': round(solution['total_distance_km'], 2),
+            'total_transport_cost': round(solution['total_cost'], 2),
+            'currency': 'INR'
+        },
+        'constraints': {
+            'max_elapsed_hours': round(freshness_life_hours * 0.7, 2),
+            'min_arrival_freshness': min_arrival_freshness
+        },
+        'search': stats
+    }
+
+# ============================================
+# MULTI-PERIOD PLANNING
+# ============================================
+
+PLANNING_TIME_BUDGET = float(os.environ.get('PLANNING_TIME_BUDGET', 60))
+PLANNING_MAX_HORIZON_DAYS = 28
+PLANNING_GAP_REL = 0.01
+PLANNING_COSTS = {
+    'holding': 0.5,    # per unit kept overnight
+    'shortage': 100,   # per unit of demand left unmet
+    'waste': 0         # per unit past its sell-by age, on top of its purchase cost
+}
+
+def planning_vehicle(transporter_id, require_cold_chain):
+    """Transporter for planned trips: the given one, or the cheapest per unit-km in the fleet"""
+    if transporter_id is not None:
+        t = REGISTRY.get('transporter', transporter_id)
+        if require_cold_chain and not t['cold_chain']:
+            raise ValueError(f"Transporter {transporter_id} has no cold chain")
+        return dict(t, route_factor=transporter_route_factor(t))
+
+    fleet = [t for t in REGISTRY.records('transporter') if t['cold_chain'] or not require_cold_chain]
+    if not fleet:
+        raise ValueError('No transporter can carry the plan')
+    t = min(fleet, key=lambda t: t['cost_per_km'] * transporter_route_factor(t) / t['capacity'])
+    return dict(t, route_factor=transporter_route_factor(t))
+
+def planning_demand(demands, horizon_days):
+    """
+    {retailer_id: daily quantities} from [{"retailer_id", "quantity"}]
+    (the same every day) or [{"retailer_id", "daily": [...]}] entries
+    """
+    daily = {}
+    for d in demands:
+        if 'daily' in d:
+            quantities = [float(q) for q in d['daily']]
+            if len(quantities) != horizon_days:
+                raise ValueError(f"daily demand of retailer {d['retailer_id']} must list {horizon_days} days")
+        else:
+            quantities = [float(d['quantity'])] * horizon_days
+        if any(q < 0 for q in quantities):
+            raise ValueError('demand quantities must be non-negative')
+        current = daily.setdefault(d['retailer_id'], [0.0] * horizon_days)
+        daily[d['retailer_id']] = [a + b for a, b in zip(current, quantities)]
+    return daily
+
+def optimize_multiperiod_plan(
+    demands,
+    horizon_days: int = 7,
+    freshness_life_hours: int = 72,
+    min_sell_freshness: float = None,
+    initial_inventory: list = None,
+    harvester_ids: list = None,
+    transporter_id: int = None,
+    require_cold_chain: bool = False,
+    window_days: int = 7,
+    commit_days: int = 4,
+    region_size: int = 100,
+    lanes_per_retailer: int = 3,
+    costs: dict = None,
+    time_budget_seconds: float = PLANNING_TIME_BUDGET,
+    solver_options: dict = None,
+    progress=None
+):
+    """
+    Daily harvest, shipment and retailer stock plan over a horizon of days
+
+    demands: {retailer_id: [quantity per day]}
+    initial_inventory: [{"retailer_id", "age_days", "quantity"}] on hand at day 0
+
+    Product is sellable until freshness_deadline_hours (with the retailer's
+    cold storage) after harvest, in whole days. Solved by rolling horizon
+    and regional decomposition within time_budget_seconds (see planning.py).
+    """
+    if not 1 <= horizon_days <= PLANNING_MAX_HORIZON_DAYS:
+        raise ValueError(f'horizon_days must be between 1 and {PLANNING_MAX_HORIZON_DAYS}')
+    if window_days < 1 or commit_days < 1 or region_size < 1 or lanes_per_retailer < 1:
+        raise ValueError('window_days, commit_days, region_size and lanes_per_retailer must be positive')
+    check_freshness_floor('min_sell_freshness', min_sell_freshness)
+    costs = dict(PLANNING_COSTS, **(costs or {}))
+
+    with phase('model_build'):
+        retailers = [REGISTRY.get('retailer', retailer_id) for retailer_id in demands]
+        farms = (
+            [REGISTRY.get('harvester', i) for i in harvester_ids]
+            if harvester_ids else REGISTRY.records('harvester')
+        )
+        vehicle = planning_vehicle(transporter_id, require_cold_chain)
+        max_age = [
+            int(freshness_deadline_hours(freshness_life_hours, min_sell_freshness, bool(r.get('cold_storage'))) // 24)
+            for r in retailers
+        ]
+
+        start = time.perf_counter()
+        instance = build_instance(
+            farms=farms,
+            retailers=retailers,
+            vehicle=vehicle,
+            distance_block=network_distance_block,
+            demand=[demands[r['id']] for r in retailers],
+            max_age_days=max_age,
+            lanes_per_retailer=lanes_per_retailer,
+            region_size=region_size
+        )
+
+        initial_stock = np.zeros((len(retailers), max(max_age) + 1))
+        rows = {r['id']: i for i, r in enumerate(retailers)}
+        for item in initial_inventory or []:
+            if item['retailer_id'] not in rows:
+                raise ValueError(f"initial inventory for retailer {item['retailer_id']} without demand")
+            row, age = rows[item['retailer_id']], int(item.get('age_days', 0))
+            if age < 0:
+                raise ValueError('age_days must be non-negative')
+            if age <= max_age[row]:  # older stock can no longer be sold
+                initial_stock[row, age] += float(item['quantity'])
+        instance_seconds = time.perf_counter() - start
+
+    options = dict(solver_options or {})
+    if options.get('gap_rel') is None:
+        options['gap_rel'] = PLANNING_GAP_REL
+
+    plan = plan_horizon(
+        instance,
+        window_days=window_days,
+        commit_days=commit_days,
+        time_budget_seconds=time_budget_seconds,
+        costs=costs,
+        initial_stock=initial_stock,
+        solver_options=options,
+        progress=progress
+    )
+
+    with phase('result_build'):
+        result = format_plan(instance, plan, costs)
+
+    regions = [region for window in plan['windows'] for region in window['regions']]
+    optimal = sum(region['optimal'] for region in regions)
+    total_seconds = instance_seconds + plan['seconds']
+    result.update({
+        'success': True,
+        'status': 'Optimal' if optimal == len(regions) else 'Feasible',
+        'vehicle': {
+            'transporter_id': vehicle['id'],
+            'name': vehicle['name'],
+            'capacity': vehicle['capacity'],
+            'cold_chain': vehicle['cold_chain']
+        },
+        'decomposition': {
+            'farms': len(farms),
+            'retailers': len(retailers),
+            'lanes': int(len(instance['lane_farm'])),
+            'regions': instance['num_regions'],
+            'window_days': window_days,
+            'commit_days': commit_days,
+            'subproblems_optimal': optimal,
+            'subproblems_relaxed': sum(region['relaxed'] for region in regions),
+            'subproblems_greedy': sum(region['method'] == 'greedy' for region in regions),
+            'windows': plan['windows']
+        },
+        'timing': {
+            'time_budget_seconds': time_budget_seconds,
+            'instance_seconds': round(instance_seconds, 4),
+            'solve_seconds': round(plan['seconds'], 4),
+            'total_seconds': round(total_seconds, 4),
+            'seconds_per_day': round(total_seconds / horizon_days, 4),
+            'within_budget': total_seconds <= time_budget_seconds
+        },
+        'constraints': {
+            'freshness_life_hours': freshness_life_hours,
+            'min_sell_freshness': min_sell_freshness,
+            'require_cold_chain': require_cold_chain
+        },
+        'costs_applied': costs,
+        'optimization_timestamp': datetime.now().isoformat()
+    })
+    return result
+
+# ============================================
+# SIMULATION ENGINE
+# ============================================
+
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', os.cpu_count() or 1))
+SIMULATION_CHUNK_SIZE = 250
+SIMULATION_PARALLEL_THRESHOLD = 1000  # smaller runs are faster serially
+
+_simulation_pool = None
+_simulation_pool_key = None
+_simulation_pool_lock = threading.Lock()
+
+def generate_simulation_orders(num_orders, seed):
+    """Random (quantity, freshness_life, source_id, dest_id) orders from a seeded generator"""
+    rng = random.Random(seed)
+    harvester_ids = REGISTRY.ids('harvester')
+    retailer_ids = REGISTRY.ids('retailer')
+    
+    orders = []
+    for _ in range(num_orders):
+        quantity = rng.randint(100, 2000)
+        freshness_life = rng.randint(48, 96)
+        source_id = rng.choice(harvester_ids)
+        dest_id = rng.choice(retailer_ids)
+        orders.append((quantity, freshness_life, source_id, dest_id))
+    return orders
+
+def simulate_order(order):
+    """
+    MILP vs simple routing for one order
+    
+    The MILP route is planned against an empty capacity ledger: the
+    simulation compares routing policies on synthetic orders, and pool
+    workers would otherwise see a snapshot of the ledger taken when they
+    were forked.
+    
+    Returns (milp_cost, milp_time, milp_freshness, simple_cost, simple_time,
+    simple_freshness); the MILP values are None when no route was found.
+    """
+    quantity, freshness_life, source_id, dest_id = order
+    
+    # MILP optimization
+    milp_result = cached_optimize_route(
+        source_type='harvester',
+        source_id=source_id,
+        destination_type='retailer',
+        destination_id=dest_id,
+        quantity=quantity,
+        freshness_life_hours=freshness_life,
+        priority='balanced',
+        require_cold_chain=False,
+        check_bookings=False
+    )
+    
+    if milp_result['success']:
+        milp_values = (
+            milp_result['cost_breakdown']['transport_cost'],
+            milp_result['time_breakdown']['transit_time_hours'],
+            milp_result['quality_metrics']['expected_freshness_on_arrival']
+        )
+    else:
+        milp_values = (None, None, None)
+    
+    # Simple routing (always pick first transporter)
+    simple_transport = REGISTRY.records('transporter')[0]
+    distance, _ = lane_distance('harvester', source_id, 'retailer', dest_id)
+    
+    simple_cost = distance * simple_transport['cost_per_km']
+    simple_time = distance / simple_transport['speed_kmph']
+    simple_freshness = calculate_freshness_score(100, simple_time, simple_transport['cold_chain'])
+    
+    return milp_values + (simple_cost, simple_time, simple_freshness)
+
+def simulate_chunk(orders):
+    """Process pool task: outcomes for a contiguous chunk of orders, in a bulk solver slot"""
+    with SOLVER_SLOTS.slot(lane=BULK):
+        return [simulate_order(order) for order in orders]
+
+def simulation_worker_init(entity_lists, source):
+    """Process pool initializer: load the parent's registry snapshot"""
+    REGISTRY.load_lists(entity_lists, source=source)
+
+def get_simulation_pool(workers):
+    """
+    Shared process pool, recreated when the worker count or the entity
+    registry changes (children hold a copy of the registry)
+    
+    Workers start from a forkserver (spawn where there is none), never
+    by forking this multithreaded process: a lock held by another
+    request thread at fork time would stay locked in the child forever.
+    Each worker imports the service and loads the registry it was
+    created for.
+    """
+    global _simulation_pool, _simulation_pool_key
+    key = (workers, REGISTRY.version)
+    with _simulation_pool_lock:
+        if _simulation_pool_key != key:
+            if _simulation_pool is not None:
+                _simulation_pool.shutdown(wait=False, cancel_futures=True)
+            snapshot = REGISTRY.snapshot
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _simulation_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=simulation_worker_init,
+                initargs=({t: snapshot.table(t).records() for t in SAMPLE_ENTITIES}, snapshot.source)
+            )
+            _simulation_pool_key = (workers, snapshot.version)
+        return _simulation_pool
+
+def summarize_simulation(totals, num_orders):
+    """Build the /simulate result block from running totals"""
+    milp_avg_freshness = totals['milp_freshness'] / num_orders
+    simple_avg_freshness = totals['simple_freshness'] / num_orders
+    
+    savings = {
+        'cost_savings_percent': round((1 - totals['milp_cost'] / totals['simple_cost']) * 100, 2),
+        'time_savings_percent': round((1 - totals['milp_time'] / totals['simple_time']) * 100, 2),
+        'freshness_improvement_percent': round((milp_avg_freshness - simple_avg_freshness), 2)
+    }
+    
+    return {
+        'num_orders_simulated': num_orders,
+        'milp_results': {
+            'total_cost': round(totals['milp_cost'], 2),
+            'total_time_hours': round(totals['milp_time'], 2),
+            'avg_freshness': round(milp_avg_freshness, 2)
+        },
+        'simple_routing_results': {
+            'total_cost': round(totals['simple_cost'], 2),
+            'total_time_hours': round(totals['simple_time'], 2),
+            'avg_freshness': round(simple_avg_freshness, 2)
+        },
+        'savings': savings,
+        'conclusion': f"MILP optimization saves {savings['cost_savings_percent']}% cost, {savings['time_savings_percent']}% time, and improves freshness by {savings['freshness_improvement_percent']}%"
+    }
+
+def run_simulation(num_orders, seed, workers=1, chunk_size=SIMULATION_CHUNK_SIZE):
+    """
+    Simulate orders and yield progress events, then the final result
+    
+    Orders are generated up front from `seed` and evaluated in chunks,
+    either serially or across a process pool. Outcomes are accumulated in
+    order index order, so the totals are bit-for-bit identical to a serial
+    run with the same seed regardless of worker count.
+    
+    Yields {'type': 'progress', ...} after every chunk and finally
+    {'type': 'result', ...}.
+    """
+    orders = generate_simulation_orders(num_orders, seed)
+    chunks = [orders[i:i + chunk_size] for i in range(0, num_orders, chunk_size)]
+    
+    if workers > 1 and num_orders >= SIMULATION_PARALLEL_THRESHOLD:
+        chunk_outcomes = get_simulation_pool(workers).map(simulate_chunk, chunks)
+    else:
+        chunk_outcomes = map(simulate_chunk, chunks)
+    
+    totals = {
+        'milp_cost': 0, 'milp_time': 0, 'milp_freshness': 0,
+        'simple_cost': 0, 'simple_time': 0, 'simple_freshness': 0
+    }
+    completed = 0
+    for outcomes in chunk_outcomes:
+        for milp_cost, milp_time, milp_freshness, simple_cost, simple_time, simple_freshness in outcomes:
+            if milp_cost is not None:
+                totals['milp_cost'] += milp_cost
+                totals['milp_time'] += milp_time
+                totals['milp_freshness'] += milp_freshness
+            totals['simple_cost'] += simple_cost
+            totals['simple_time'] += simple_time
+            totals['simple_freshness'] += simple_freshness
+        completed += len(outcomes)
+        
+        if completed < num_orders:
+            yield {
+                'type': 'progress',
+                'completed': completed,
+                'total': num_orders,
+                'partial': summarize_simulation(totals, completed)
+            }
+    
+    result = summarize_simulation(totals, num_orders)
+    result['seed'] = seed
+    result['workers'] = workers if num_orders >= SIMULATION_PARALLEL_THRESHOLD else 1
+    yield dict(type='result', **result)
+
+# ============================================
+# LIVE FRESHNESS TRACKING
+# ============================================
+
+# In-transit batches decay by their recorded temperatures (recordTemperature
+# readings from chain_ingest.py's readings log, or posted directly)
+FRESHNESS_ALERT_THRESHOLD = float(os.environ.get('FRESHNESS_ALERT_THRESHOLD', 70))
+FRESHNESS_QUERY_LIMIT = 10000
+
+FRESHNESS_TRACKER = FreshnessTracker(
+    decay_rate=FRESHNESS_DECAY_RATE / 100,
+    cold_chain_factor=0.3,
+    temp_min=TEMP_MIN,
+    temp_max=TEMP_MAX,
+    temp_optimal=TEMP_OPTIMAL,
+    threshold=FRESHNESS_ALERT_THRESHOLD
+)
+READINGS_TAIL = ReadingsTail(os.environ['FRESHNESS_READINGS_LOG']) if os.environ.get('FRESHNESS_READINGS_LOG') else None
+_readings_lock = threading.Lock()
+
+def sync_freshness_readings():
+    """Apply readings appended to the readings log since the last call; returns how many"""
+    if READINGS_TAIL is None:
+        return 0
+    with _readings_lock, phase('readings_sync'):
+        records, restarted = READINGS_TAIL.poll()
+        if restarted:
+            FRESHNESS_TRACKER.restart()
+        if len(records):
+            FRESHNESS_TRACKER.ingest(records['batch_id'], records['temperature_c'], records['timestamp'])
+        return len(records)
+
+def freshness_flag_mask(names):
+    """Flag bitmask from names (list or comma-separated); ValueError for unknown names"""
+    if isinstance(names, str):
+        names = [name for name in names.split(',') if name]
+    unknown = [name for name in names if name not in FLAGS]
+    if unknown:
+        raise ValueError(f"Unknown flags: {unknown}; expected some of {list(FLAGS)}")
+    mask = 0
+    for name in names:
+        mask |= FLAGS[name]
+    return mask
+
+def query_tracked_batches(batch_ids=None, flags=(), limit=1000, offset=0, at=None):
+    """Columnar tracker state for the dashboard endpoints (validated paging)"""
+    limit = int(limit)
+    offset = int(offset)
+    if not 0 < limit <= FRESHNESS_QUERY_LIMIT or offset < 0:
+        raise ValueError(f"limit must be 1-{FRESHNESS_QUERY_LIMIT} and offset non-negative")
+    mask = freshness_flag_mask(flags)
+    sync_freshness_readings()
+    with phase('solve'):
+        result = FRESHNESS_TRACKER.query(
+            batch_ids=batch_ids, now=None if at is None else float(at), flags=mask, limit=limit, offset=offset
+        )
+    result['flag_bits'] = FLAGS
+    result['threshold_default'] = FRESHNESS_TRACKER.threshold
+    return result
+
+# ============================================
+# ASYNC JOB QUEUE
+# ============================================
+
+JOBS = JobQueue(
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_queued=int(os.environ.get('JOB_QUEUE_SIZE', 100)),
+    retention=float(os.environ.get('JOB_RETENTION_SECONDS', 600))
+)
+
+def optimize_route_job(job, **params):
+    """Job function for async /optimize requests"""
+    with track('job_optimize') as timings:
+        timings.priority = metric_priority(params['priority'])
+        return cached_optimize_route(**params)
+
+def simulation_job(job, num_orders, seed, workers, chunk_size):
+    """Job function for async /simulate requests; cancellable between chunks"""
+    with track('job_simulate'):
+        for event in run_simulation(num_orders, seed, workers, chunk_size):
+            job.check_cancelled()
+            if event['type'] == 'progress':
+                job.progress = {'completed': event['completed'], 'total': event['total']}
+    job.progress = {'completed': num_orders, 'total': num_orders}
+    result = dict(event)
+    del result['type']
+    return result
+
+def plan_job(job, **params):
+    """Job function for async /optimize/plan requests; cancellable between subproblems"""
+    def progress(completed, total):
+        job.check_cancelled()
+        job.progress = {'completed': completed, 'total': total}
+    
+    with track('job_plan'):
+        return optimize_multiperiod_plan(progress=progress, **params)
+
+def submit_job(kind, fn, **params):
+    """Queue a job and build the 202 response (503 when the queue is full)"""
+    try:
+        job = JOBS.submit(kind, fn, **params)
+    except QueueFullError as e:
+        response = jsonify({'success': False, 'status': 'Error', 'message': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    body = job.to_dict()
+    body['status_url'] = f'/jobs/{job.id}'
+    body['result_url'] = f'/jobs/{job.id}/result'
+    response = jsonify(body)
+    response.headers['Location'] = body['status_url']
+    return response, 202
+
+# ============================================
+# SOLVER ADMISSION
+# ============================================
+
+# Remaining time budget of a request, in milliseconds from its arrival
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+# Endpoints whose solves queue behind interactive ones
+BULK_ENDPOINTS = {'/simulate'}
+
+def request_deadline():
+    """time.monotonic() deadline from the deadline header, or None; ValueError when malformed"""
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    budget_ms = float(value)
+    if not math.isfinite(budget_ms):
+        raise ValueError(value)
+    return time.monotonic() + budget_ms / 1000
+
+def solver_busy_response(error):
+    """429 / 503 with Retry-After when no solver slot could be had in time"""
+    response = jsonify({'success': False, 'status': 'Error', 'message': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+# ============================================
+# METRICS
+# ============================================
+
+def metric_priority(priority):
+    """Priority label value; unknown priorities share one series"""
+    return priority if priority in PRIORITY_WEIGHTS else 'other'
+
+def label_request_priority(priority):
+    """Attach the request's priority to its latency and phase histograms"""
+    timings = current_timings()
+    if timings is not None:
+        timings.priority = metric_priority(priority)
+
+def timings_requested():
+    """Per-request timings block: ?timings=1 or "timings": true in the body"""
+    if request.args.get('timings') in ('1', 'true'):
+        return True
+    data = g.json_body if 'json_body' in g else (request.get_json(silent=True) if request.is_json else None)
+    return isinstance(data, dict) and data.get('timings') is True
+
+def collect_service_metrics():
+    """Scrape-time gauges and counters from the cache, job queue, registry, solver slots, ledger and tracker"""
+    cache = ROUTE_CACHE.stats()
+    jobs = JOBS.stats()
+    templates = ROUTE_TEMPLATES.stats()
+    slots = SOLVER_SLOTS.stats()
+    ledger = LEDGER.stats()
+    tracker = FRESHNESS_TRACKER.stats()
+    return [
+        ('milp_route_cache_entries', 'gauge', 'Route results currently cached', [({}, cache['size'])]),
+        ('milp_route_cache_hits_total', 'counter', 'Route cache hits', [({}, cache['hits'])]),
+        ('milp_route_cache_misses_total', 'counter', 'Route cache misses', [({}, cache['misses'])]),
+        ('milp_route_cache_evictions_total', 'counter', 'Route cache LRU evictions', [({}, cache['evictions'])]),
+        ('milp_jobs_queued', 'gauge', 'Async jobs waiting for a worker', [({}, jobs['queued'])]),
+        ('milp_jobs_running', 'gauge', 'Async jobs currently running', [({}, jobs['running'])]),
+        ('milp_jobs_total', 'counter', 'Async jobs by outcome', [
+            ({'outcome': outcome}, count) for outcome, count in sorted(jobs['counts'].items())
+        ]),
+        ('milp_job_wait_seconds', 'gauge', 'Recent async job queue wait', [
+            ({'quantile': q}, jobs['wait_seconds'][key]) for q, key in (('0.5', 'p50'), ('0.95', 'p95'))
+        ]),
+        ('milp_job_run_seconds', 'gauge', 'Recent async job run time', [
+            ({'quantile': q}, jobs['run_seconds'][key]) for q, key in (('0.5', 'p50'), ('0.95', 'p95'))
+        ]),
+        ('milp_registry_entities', 'gauge', 'Registered entities by type', [
+            ({'entity_type': t}, len(REGISTRY.table(t))) for t in SAMPLE_ENTITIES
+        ]),
+        ('milp_registry_version', 'gauge', 'Entity registry snapshot version', [({}, REGISTRY.version)]),
+        ('milp_route_templates_idle', 'gauge', 'Pooled route model templates', [({}, templates['idle_templates'])]),
+        ('milp_route_template_solves_total', 'counter', 'Route MILP solves by template use', [
+            ({'template': 'built'}, templates['built']), ({'template': 'reused'}, templates['reused'])
+        ]),
+        ('milp_solver_slots', 'gauge', 'Host-wide solver slots', [({}, slots['slots'])]),
+        ('milp_solver_slots_busy', 'gauge', 'Solver slots held by this process', [({}, slots['busy_in_process'])]),
+        ('milp_solver_slot_waiting', 'gauge', 'Solves waiting for a slot by lane', [
+            ({'lane': lane}, count) for lane, count in slots['waiting'].items()
+        ]),
+        ('milp_solver_slot_grants_total', 'counter', 'Solver slots granted by lane', [
+            ({'lane': lane}, count) for lane, count in slots['granted'].items()
+        ]),
+        ('milp_solver_slot_rejections_total', 'counter', 'Solves turned away by lane and reason', [
+            (dict(zip(('lane', 'reason'), key.split(':'))), count) for key, count in slots['rejected'].items()
+        ]),
+        ('milp_ledger_active_bookings', 'gauge', 'Capacity bookings in the ledger', [({}, ledger['active_bookings'])]),
+        ('milp_ledger_events_total', 'counter', 'Capacity ledger events by outcome', [
+            ({'outcome': outcome}, ledger[outcome]) for outcome in ('booked', 'released', 'expired', 'conflicts', 'rejected')
+        ]),
+        ('milp_freshness_tracked_batches', 'gauge', 'Batches in the live freshness tracker', [
+            ({}, tracker['tracked_batches'])
+        ]),
+        ('milp_freshness_readings_total', 'counter', 'Temperature readings by outcome', [
+            ({'outcome': 'accepted'}, tracker['readings_accepted']),
+            ({'outcome': 'ignored'}, tracker['readings_ignored'])
+        ])
+    ]
+
+METRICS.add_collector(collect_service_metrics)
+
+# ============================================
+# BULK REQUEST HELPERS
+# ============================================
+
+def read_json_body():
+    """Request JSON, parsed with orjson when available (large columnar bodies)"""
+    if orjson is None:
+        data = request.get_json()
+    else:
+        data = orjson.loads(request.get_data())
+    g.json_body = data
+    return data
+
+def bulk_columns(data, spec):
+    """
+    Columnar request fields as equal-length NumPy arrays
+    
+    spec: {field: (dtype, default)}. A scalar (or a missing field, which
+    takes the default) is broadcast to the length of the array fields.
+    Returns (columns, row count); ValueError when lengths disagree.
+    """
+    columns = {field: np.asarray(data.get(field, default), dtype=dtype) for field, (dtype, default) in spec.items()}
+    lengths = {field: column.size for field, column in columns.items() if column.ndim == 1}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"Column lengths differ: {lengths}")
+    if any(column.ndim > 1 for column in columns.values()):
+        raise ValueError("Columns must be flat arrays or scalars")
+    n = next(iter(lengths.values()), 1)
+    return {field: np.broadcast_to(column, (n,)) for field, column in columns.items()}, n
+
+def bulk_response(payload):
+    """JSON response for payloads holding NumPy arrays (orjson when available)"""
+    if orjson is not None:
+        return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
+    return jsonify({k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in payload.items()})
+
+# ============================================
+# API ENDPOINTS
+# ============================================
+
+@app.before_request
+def start_request_timer():
+    begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe latency and phases; add a timings block when requested"""
+    timings = end_request(response.status_code)
+    if timings is not None and response.is_json and not response.is_streamed and timings_requested():
+        body = response.get_json()
+        if isinstance(body, dict):
+            body['timings'] = timings.to_dict()
+            response.set_data(app.json.dumps(body))
+    return response
+
+@app.before_request
+def bind_solver_lane():
+    """Priority lane and deadline for the solves of this request"""
+    try:
+        deadline = request_deadline()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': f'{DEADLINE_HEADER} must be a number of milliseconds'
+        }), 400
+    lane = BULK if request.url_rule is not None and request.url_rule.rule in BULK_ENDPOINTS else INTERACTIVE
+    set_request_context(lane, deadline)
+
+@app.before_request
+def reload_registry_if_changed():
+    """Pick up a changed entity snapshot file or rebuilt road matrix without restarting workers"""
+    REGISTRY.maybe_reload()
+    if ROAD_MATRIX.maybe_reload():
+        ROUTE_CACHE.clear()
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'service': 'FloraChain MILP Optimization Service',
+        'version': '2.0.0',
+        'solver_backends': available_backends(),
+        'road_matrix': ROAD_MATRIX.info(),
+        'solver_slots': SOLVER_SLOTS.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/optimize', methods=['POST'])
+def optimize():
+    """
+    Main optimization endpoint
+    
+    Request body:
+    {
+        "source_type": "harvester",
+        "source_id": 1,
+        "destination_type": "distributor", 
+        "destination_id": 1,
+        "quantity": 1000,
+        "freshness_life_hours": 72,
+        "priority": "balanced",
+        "require_cold_chain": false,
+        "engine": "auto",
+        "extra_constraints": [],
+        "solver": {"backend": "highs", "time_limit_seconds": 5,
+                   "gap_rel": 0.0, "threads": 1},
+        "reserve": false,
+        "window_start": 1767225600,
+        "async": false,
+        "timings": false
+    }
+    
+    engine: "auto" (default) uses the exact analytic selection and falls
+    back to a MILP solve when extra_constraints are given; "milp" forces
+    the MILP. "solver" tunes the MILP backend; solve statistics are
+    returned in solver_stats.
+    
+    Transporter capacity is net of ledger bookings overlapping the
+    transit window from window_start (Unix seconds, default now). With
+    "reserve": true the transporter and destination are booked and the
+    booking is returned in "reservation" (409 if capacity kept changing).
+    
+    With "async": true the request is queued and answered with 202 and a
+    job id; poll /jobs/<job_id> and fetch /jobs/<job_id>/result.
+    """
+    try:
+        data = request.get_json()
+        
+        params = dict(
+            source_type=data.get('source_type', 'harvester'),
+            source_id=data.get('source_id', 1),
+            destination_type=data.get('destination_type', 'distributor'),
+            destination_id=data.get('destination_id', 1),
+            quantity=data.get('quantity', 1000),
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            priority=data.get('priority', 'balanced'),
+            require_cold_chain=data.get('require_cold_chain', False),
+            engine=data.get('engine', 'auto'),
+            extra_constraints=data.get('extra_constraints'),
+            solver_options=solver_options_from_request(data.get('solver')) if data.get('solver') else None,
+            reserve=bool(data.get('reserve', False)),
+            window_start=data.get('window_start')
+        )
+        
+        label_request_priority(params['priority'])
+        
+        if data.get('async', False):
+            return submit_job('optimize', optimize_route_job, **params)
+        
+        result = cached_optimize_route(**params)
+        
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except CapacityConflictError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Conflict',
+            'message': str(e)
+        }), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/batch', methods=['POST'])
+def optimize_batch_endpoint():
+    """
+    Batch optimization endpoint - assigns all orders in one MILP solve
+    
+    Request body:
+    {
+        "orders": [
+            {"source_type": "harvester", "source_id": 1,
+             "destination_type": "retailer", "destination_id": 1,
+             "quantity": 500, "freshness_life_hours": 72,
+             "priority": "balanced", "require_cold_chain": false},
+            ...
+        ],
+        "enforce_shared_capacity": true,
+        "compare_sequential": false,
+        "reserve": false,
+        "window_start": 1767225600
+    }
+    
+    Fleet capacity is net of ledger bookings overlapping each
+    transporter's transit window from window_start (Unix seconds,
+    default now). With "reserve": true every used transporter is booked
+    for its assigned quantity and the booking is returned in
+    "reservation" (409 if capacity kept changing).
+    """
+    try:
+        data = request.get_json()
+        orders = data.get('orders', [])
+        if not orders:
+            return jsonify({
+                'success': False,
+                'status': 'Error',
+                'message': 'orders must be a non-empty list'
+            }), 400
+        
+        start = time.perf_counter()
+        batch_params = dict(
+            orders=orders,
+            enforce_shared_capacity=data.get('enforce_shared_capacity', True),
+            solver_options=solver_options_from_request(data.get('solver')),
+            window_start=data.get('window_start')
+        )
+        if data.get('reserve', False):
+            batch = reserve_batch(**batch_params)
+        else:
+            batch = optimize_batch(**batch_params)
+        batch_seconds = time.perf_counter() - start
+        
+        performance = {
+            'num_orders': len(orders),
+            'batch_seconds': round(batch_seconds, 4),
+            'batch_orders_per_second': round(len(orders) / batch_seconds, 2) if batch_seconds > 0 else None
+        }
+        
+        # Baseline: one optimize_route call (one CBC solve) per order
+        if data.get('compare_sequential', False):
+            start = time.perf_counter()
+            for order in orders:
+                optimize_route(
+                    source_type=order.get('source_type', 'harvester'),
+                    source_id=order.get('source_id', 1),
+                    destination_type=order.get('destination_type', 'distributor'),
+                    destination_id=order.get('destination_id', 1),
+                    quantity=order.get('quantity', 1000),
+                    freshness_life_hours=order.get('freshness_life_hours', 72),
+                    priority=order.get('priority', 'balanced'),
+                    require_cold_chain=order.get('require_cold_chain', False),
+                    engine='milp'
+                )
+            sequential_seconds = time.perf_counter() - start
+            performance['sequential_seconds'] = round(sequential_seconds, 4)
+            performance['sequential_orders_per_second'] = round(len(orders) / sequential_seconds, 2) if sequential_seconds > 0 else None
+            performance['speedup'] = round(sequential_seconds / batch_seconds, 2) if batch_seconds > 0 else None
+        
+        with phase('serialize'):
+            return jsonify({
+                'success': batch['status'] == 'Optimal',
+                'status': batch['status'],
+                'num_assigned': sum(1 for r in batch['results'] if r['success']),
+                'results': batch['results'],
+                'fleet_utilization': batch['fleet_utilization'],
+                'shared_capacity_enforced': batch['shared_capacity_enforced'],
+                'reservation': batch.get('reservation'),
+                'solver_stats': batch['solver_stats'],
+                'performance': performance
+            })
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except CapacityConflictError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Conflict',
+            'message': str(e)
+        }), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/network', methods=['POST'])
+def optimize_network_endpoint():
+    """
+    Multi-echelon network-flow optimization endpoint
+    
+    Request body:
+    {
+        "demands": [{"retailer_id": 1, "quantity": 300},
+                    {"retailer_id": 2, "quantity": 250}],
+        "freshness_life_hours": 72,
+        "priority": "balanced",
+        "require_cold_chain": false,
+        "allow_bypass": false,
+        "dwell_hours": 6,
+        "min_arrival_freshness": null,
+        "max_inbound_arcs": null,
+        "spatial_pruning": true,
+        "solver": {"backend": "cbc", "time_limit_seconds": 30,
+                   "gap_rel": 0.01, "threads": 1}
+    }
+    """
+    try:
+        data = request.get_json()
+        demands = {}
+        for d in data.get('demands', []):
+            demands[d['retailer_id']] = demands.get(d['retailer_id'], 0) + d['quantity']
+        if not demands:
+            return jsonify({
+                'success': False,
+                'status': 'Error',
+                'message': 'demands must be a non-empty list'
+            }), 400
+        
+        label_request_priority(data.get('priority', 'balanced'))
+        
+        result = optimize_supply_network(
+            demands=demands,
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            priority=data.get('priority', 'balanced'),
+            require_cold_chain=data.get('require_cold_chain', False),
+            allow_bypass=data.get('allow_bypass', False),
+            dwell_hours=data.get('dwell_hours', 6.0),
+            min_arrival_freshness=data.get('min_arrival_freshness'),
+            max_inbound_arcs=data.get('max_inbound_arcs'),
+            spatial_pruning=data.get('spatial_pruning', True),
+            solver_options=solver_options_from_request(data.get('solver'))
+        )
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/vrp', methods=['POST'])
+def optimize_vrp_endpoint():
+    """
+    Multi-stop vehicle routing with time windows
+    
+    Request body:
+    {
+        "depot_type": "distributor",
+        "depot_id": 1,
+        "stops": [{"retailer_id": 1, "quantity": 200,
+                   "window_start_hours": 0, "window_end_hours": 8,
+                   "service_hours": 0.25, "require_cold_chain": false}],
+        "fleet": [{"transporter_id": 1, "count": 2}],
+        "freshness_life_hours": 72,
+        "min_arrival_freshness": null,
+        "time_budget_seconds": 2,
+        "seed": 0
+    }
+    
+    Times are hours after the vehicles leave the depot. Without a fleet,
+    each registered transporter contributes one vehicle.
+    min_arrival_freshness is a score in (0, 100] (400 otherwise). Stops that no
+    vehicle can take are listed under "unserved" with a reason.
+    """
+    try:
+        data = request.get_json()
+        stops = data.get('stops', [])
+        if not stops:
+            return jsonify({
+                'success': False,
+                'status': 'Error',
+                'message': 'stops must be a non-empty list'
+            }), 400
+        
+        result = optimize_vrp(
+            depot_type=data.get('depot_type', 'distributor'),
+            depot_id=data.get('depot_id', 1),
+            stops=stops,
+            fleet=data.get('fleet'),
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            min_arrival_freshness=data.get('min_arrival_freshness'),
+            time_budget_seconds=float(data.get('time_budget_seconds', 2.0)),
+            seed=data.get('seed', 0)
+        )
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/plan', methods=['POST'])
+def optimize_plan_endpoint():
+    """
+    Multi-period harvest, shipment and retailer stock plan
+    
+    Request body:
+    {
+        "horizon_days": 14,
+        "demands": [{"retailer_id": 1, "quantity": 120},
+                    {"retailer_id": 2, "daily": [80, 80, 90, ...]}],
+        "initial_inventory": [{"retailer_id": 1, "age_days": 1, "quantity": 40}],
+        "freshness_life_hours": 72,
+        "min_sell_freshness": null,
+        "harvester_ids": null,
+        "transporter_id": null,
+        "require_cold_chain": false,
+        "window_days": 7,
+        "commit_days": 4,
+        "region_size": 100,
+        "lanes_per_retailer": 3,
+        "costs": {"holding": 0.5, "shortage": 100, "waste": 0},
+        "time_budget_seconds": 60,
+        "solver": {"backend": "cbc", "gap_rel": 0.01, "threads": 1},
+        "async": false
+    }
+    
+    "quantity" is demanded every day; "daily" lists one quantity per day.
+    Without harvester_ids every registered harvester can supply. The
+    response has daily totals, the harvest schedule per farm, shipments,
+    per-retailer service and a "timing" block with the solve time for the
+    horizon. With "async": true the plan is queued as a job (see /jobs).
+    """
+    try:
+        data = request.get_json()
+        horizon_days = int(data.get('horizon_days', 7))
+        demands = planning_demand(data.get('demands', []), horizon_days)
+        if not demands:
+            return jsonify({
+                'success': False,
+                'status': 'Error',
+                'message': 'demands must be a non-empty list'
+            }), 400
+        
+        params = dict(
+            demands=demands,
+            horizon_days=horizon_days,
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            min_sell_freshness=data.get('min_sell_freshness'),
+            initial_inventory=data.get('initial_inventory'),
+            harvester_ids=data.get('harvester_ids'),
+            transporter_id=data.get('transporter_id'),
+            require_cold_chain=data.get('require_cold_chain', False),
+            window_days=int(data.get('window_days', 7)),
+            commit_days=int(data.get('commit_days', 4)),
+            region_size=int(data.get('region_size', 100)),
+            lanes_per_retailer=int(data.get('lanes_per_retailer', 3)),
+            costs=data.get('costs'),
+            time_budget_seconds=float(data.get('time_budget_seconds', PLANNING_TIME_BUDGET)),
+            solver_options=solver_options_from_request(data.get('solver'))
+        )
+        if data.get('async', False):
+            return submit_job('plan', plan_job, **params)
+        
+        result = optimize_multiperiod_plan(**params)
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/pareto', methods=['POST'])
+def optimize_pareto_endpoint():
+    """
+    Cost / time / quality trade-offs for one lane in a single request
+    
+    Request body:
+    {
+        "source_type": "harvester",
+        "source_id": 1,
+        "destination_type": "distributor",
+        "destination_id": 1,
+        "quantity": 1000,
+        "freshness_life_hours": 72,
+        "require_cold_chain": false,
+        "weights": [{"name": "ops", "cost": 0.5, "time": 0.5, "quality": 0.0}],
+        "grid_steps": 44,
+        "include_sweep": false,
+        "window_start": 1767225600
+    }
+    
+    Returns the non-dominated transporters (lower cost, lower time, higher
+    quality), the pick of every PRIORITY_WEIGHTS profile and custom weight
+    vector, and, with grid_steps, how often each transporter wins over a
+    simplex grid of weights (grid_steps=44 evaluates 1035 vectors).
+    Transporters booked out from window_start are excluded, as in /optimize.
+    """
+    try:
+        data = request.get_json()
+        result = optimize_pareto(
+            source_type=data.get('source_type', 'harvester'),
+            source_id=data.get('source_id', 1),
+            destination_type=data.get('destination_type', 'distributor'),
+            destination_id=data.get('destination_id', 1),
+            quantity=data.get('quantity', 1000),
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            require_cold_chain=data.get('require_cold_chain', False),
+            weights=data.get('weights'),
+            grid_steps=data.get('grid_steps', 0),
+            include_sweep=data.get('include_sweep', False),
+            window_start=data.get('window_start')
+        )
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/robust', methods=['POST'])
+def optimize_robust_endpoint():
+    """
+    Transporter selection under transit-time and temperature uncertainty
+    
+    Request body:
+    {
+        "source_type": "harvester",
+        "source_id": 1,
+        "destination_type": "retailer",
+        "destination_id": 2,
+        "quantity": 500,
+        "freshness_life_hours": 72,
+        "priority": "freshness",
+        "require_cold_chain": false,
+        "scenarios": 2000,
+        "seed": 0,
+        "risk_measure": "cvar",
+        "cvar_alpha": 0.9,
+        "max_breach_probability": 0.05,
+        "uncertainty": {"congestion_sigma": 0.15, "incident_rate_per_1000km": 0.8,
+                        "incident_mean_hours": 2.0, "excursion_rate_per_hour": 0.01},
+        "window_start": 1767225600
+    }
+    
+    Responds like /optimize plus a "robust" block with each candidate's
+    expected and CVaR objective, freshness-window breach probability and
+    transit / freshness / risk distributions. The same seed gives the
+    same result.
+    """
+    try:
+        data = request.get_json()
+        label_request_priority(data.get('priority', 'balanced'))
+        result = optimize_route_robust(
+            source_type=data.get('source_type', 'harvester'),
+            source_id=data.get('source_id', 1),
+            destination_type=data.get('destination_type', 'distributor'),
+            destination_id=data.get('destination_id', 1),
+            quantity=data.get('quantity', 1000),
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            priority=data.get('priority', 'balanced'),
+            require_cold_chain=data.get('require_cold_chain', False),
+            scenarios=data.get('scenarios', 2000),
+            seed=data.get('seed', 0),
+            risk_measure=data.get('risk_measure', 'expected'),
+            cvar_alpha=float(data.get('cvar_alpha', 0.9)),
+            max_breach_probability=data.get('max_breach_probability'),
+            uncertainty=data.get('uncertainty'),
+            window_start=data.get('window_start')
+        )
+        with phase('serialize'):
+            return jsonify(result)
+    
+    except EntityNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'Error',
+            'message': str(e)
+        }), 500
+
+@app.route('/optimize/demo', methods=['GET'])
+def optimize_demo():
+    """Demo endpoint with sample optimization"""
+    result = cached_optimize_route(
+        source_type='harvester',
+        source_id=1,
+        destination_type='retailer',
+        destination_id=1,
+        quantity=500,
+        freshness_life_hours=72,
+        priority='balanced',
+        require_cold_chain=True
+    )
+    return jsonify(result)
+
+@app.route('/entities', methods=['GET'])
+def get_entities():
+    """Get all available entities for frontend dropdowns"""
+    return jsonify({
+        PLURALS[entity_type]: REGISTRY.records(entity_type)
+        for entity_type in SAMPLE_ENTITIES
+    })
+
+@app.route('/entities/nearest', methods=['GET'])
+def nearest_entities_endpoint():
+    """
+    Nearest entities of a type to a point or to another entity
+    
+    Query parameters:
+        entity_type=distributor      type to search (required)
+        lat=19.07&lon=72.87          origin point, or
+        from_type=retailer&from_id=1 origin entity
+        k=5                          number of results
+        radius_km=250                optional search radius
+    """
+    try:
+        entity_type = request.args.get('entity_type')
+        k = request.args.get('k', 5, type=int)
+        radius_km = request.args.get('radius_km', type=float)
+        if entity_type not in LOCATED_ENTITY_TYPES:
+            return jsonify({
+                'success': False,
+                'message': f"entity_type must be one of {list(LOCATED_ENTITY_TYPES)}"
+            }), 400
+        
+        exclude = None
+        if 'from_type' in request.args:
+            from_type = request.args['from_type']
+            from_id = request.args.get('from_id', type=int)
+            lat, lon = get_entity_coords(from_type, from_id)
+            if from_type == entity_type:
+                exclude = from_id
+            origin = {'entity_type': from_type, 'entity_id': from_id, 'lat': lat, 'lon': lon}
+        else:
+            lat = request.args.get('lat', type=float)
+            lon = request.args.get('lon', type=float)
+            if lat is None or lon is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Provide lat and lon, or from_type and from_id'
+                }), 400
+            origin = {'lat': lat, 'lon': lon}
+        
+        results = nearest_entities(entity_type, lat, lon, k=k, radius_km=radius_km, exclude=exclude)
+        return jsonify({
+            'success': True,
+            'entity_type': entity_type,
+            'origin': origin,
+            'radius_km': radius_km,
+            'count': len(results),
+            'results': [dict(entity, distance_km=round(distance, 2)) for entity, distance in results]
+        })
+    
+    except EntityNotFoundError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/entities/reload', methods=['POST'])
+def reload_entities():
+    """
+    Reload the entity registry from a JSON/CSV snapshot
+    
+    Request body (optional):
+    {
+        "path": "/data/entities.json"
+    }
+    
+    Without a path the currently watched snapshot file is reloaded. Other
+    gunicorn workers pick up file changes on their next request.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        path = data.get('path', REGISTRY.path)
+        if not path:
+            return jsonify({'success': False, 'message': 'No snapshot path configured'}), 400
+        
+        snapshot = REGISTRY.load_file(path)
+        return jsonify({
+            'success': True,
+            'source': snapshot.source,
+            'version': snapshot.version,
+            'counts': {PLURALS[t]: len(snapshot.table(t)) for t in snapshot.tables}
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Route result cache counters (per worker process)"""
+    return jsonify(ROUTE_CACHE.stats())
+
+@app.route('/cache/clear', methods=['POST'])
+def cache_clear():
+    """Drop all cached route results"""
+    ROUTE_CACHE.clear()
+    return jsonify({'success': True, 'cache': ROUTE_CACHE.stats()})
+
+@app.route('/reservations', methods=['GET'])
+def list_reservations():
+    """Active bookings, optionally filtered by entity_type and entity_id"""
+    entity_type = request.args.get('entity_type')
+    entity_id = request.args.get('entity_id', type=int)
+    bookings = LEDGER.bookings(entity_type, entity_id)
+    return jsonify({'success': True, 'count': len(bookings), 'reservations': bookings, 'ledger': LEDGER.stats()})
+
+@app.route('/reservations', methods=['POST'])
+def create_reservation():
+    """
+    Book capacity directly, all legs or none
+    
+    Request body:
+    {
+        "legs": [
+            {"entity_type": "transporter", "entity_id": 1, "quantity": 500,
+             "start": 1767225600, "end": 1767240000}
+        ],
+        "expected_versions": [{"entity_type": "transporter", "entity_id": 1, "version": 3}]
+    }
+    
+    start defaults to now. Capacity is the entity's registered capacity.
+    409 when a leg does not fit or an expected version has moved on.
+    """
+    try:
+        data = request.get_json()
+        legs = booking_legs_from_request(data.get('legs') or [])
+        expected = {
+            (v['entity_type'], v['entity_id']): v['version'] for v in data.get('expected_versions') or []
+        }
+        booking = LEDGER.reserve(legs, expected_versions=expected)
+        return jsonify({'success': True, 'reservation': booking}), 201
+    
+    except EntityNotFoundError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except (CapacityConflictError, CapacityExceededError) as e:
+        return jsonify({'success': False, 'status': 'Conflict', 'message': str(e)}), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid legs: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/reservations/<booking_id>', methods=['GET'])
+def get_reservation(booking_id):
+    """One active booking"""
+    booking = LEDGER.get(booking_id)
+    if booking is None:
+        return jsonify({'success': False, 'message': f'Unknown or expired reservation: {booking_id}'}), 404
+    return jsonify({'success': True, 'reservation': booking})
+
+@app.route('/reservations/<booking_id>', methods=['DELETE'])
+def release_reservation(booking_id):
+    """Release a booking's capacity"""
+    booking = LEDGER.release(booking_id)
+    if booking is None:
+        return jsonify({'success': False, 'message': f'Unknown or expired reservation: {booking_id}'}), 404
+    return jsonify({'success': True, 'released': booking})
+
+@app.route('/capacity', methods=['GET'])
+def capacity_endpoint():
+    """
+    Registered, booked (peak) and remaining capacity of an entity
+    
+    Query parameters: entity_type, entity_id, start and end (Unix
+    seconds; default now to now + 24 hours). version is the value to
+    pass as expected_versions when booking.
+    """
+    try:
+        entity_type = request.args.get('entity_type', 'transporter')
+        entity_id = request.args.get('entity_id', type=int)
+        start = request.args.get('start', time.time(), type=float)
+        end = request.args.get('end', start + 24 * 3600, type=float)
+        capacity = REGISTRY.get(entity_type, entity_id).get('capacity')
+        booked, version = LEDGER.availability({(entity_type, entity_id): (start, end)})[(entity_type, entity_id)]
+        return jsonify({
+            'success': True,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'window_start': start,
+            'window_end': end,
+            'capacity': capacity,
+            'booked': booked,
+            'remaining': None if capacity is None else capacity - booked,
+            'version': version
+        })
+    
+    except EntityNotFoundError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/freshness/calculate', methods=['POST'])
+def calculate_freshness():
+    """
+    Calculate freshness score endpoint
+    
+    Request body:
+    {
+        "initial_score": 100,
+        "hours_elapsed": 24,
+        "has_cold_chain": true
+    }
+    """
+    try:
+        data = request.get_json()
+        score = calculate_freshness_score(
+            initial_score=data.get('initial_score', 100),
+            hours_elapsed=data.get('hours_elapsed', 0),
+            has_cold_chain=data.get('has_cold_chain', False)
+        )
+        return jsonify({
+            'freshness_score': round(score, 2),
+            'decay_rate': FRESHNESS_DECAY_RATE if not data.get('has_cold_chain', False) else FRESHNESS_DECAY_RATE * 0.3
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/risk/calculate', methods=['POST'])
+def calculate_risk_endpoint():
+    """
+    Calculate risk level endpoint
+    
+    Request body:
+    {
+        "distance_km": 150,
+        "has_cold_chain": true,
+        "freshness_life_hours": 72,
+        "transit_hours": 3
+    }
+    """
+    try:
+        data = request.get_json()
+        risk = calculate_risk_level(
+            distance=data.get('distance_km', 0),
+            has_cold_chain=data.get('has_cold_chain', False),
+            freshness_life_hours=data.get('freshness_life_hours', 72),
+            transit_hours=data.get('transit_hours', 0)
+        )
+        return jsonify({
+            'risk_level': round(risk, 2),
+            'risk_category': 'Low' if risk < 30 else ('Medium' if risk < 60 else 'High')
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/freshness/calculate/bulk', methods=['POST'])
+def calculate_freshness_bulk():
+    """
+    Freshness scores for many consignments in one call
+    
+    Request body (columnar; scalars are broadcast):
+    {
+        "initial_score": [100, 95, 100],
+        "hours_elapsed": [24, 6.5, 48],
+        "has_cold_chain": [true, false, true],
+        "exact": true
+    }
+    
+    Values equal calculate_freshness_score bit for bit; "exact": false
+    trades that for NumPy's SIMD exponential (last-bit differences).
+    """
+    try:
+        data = read_json_body()
+        columns, n = bulk_columns(data, {
+            'initial_score': (np.float64, 100),
+            'hours_elapsed': (np.float64, 0),
+            'has_cold_chain': (bool, False)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with phase('solve'):
+            scores = calculate_freshness_scores(
+                columns['initial_score'], columns['hours_elapsed'], columns['has_cold_chain'],
+                exact=data.get('exact', True)
+            )
+        with phase('serialize'):
+            return bulk_response({
+                'count': n,
+                'freshness_score': scores,
+                'decay_rate': {
+                    'cold_chain': FRESHNESS_DECAY_RATE * 0.3,
+                    'ambient': FRESHNESS_DECAY_RATE
+                }
+            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/risk/calculate/bulk', methods=['POST'])
+def calculate_risk_bulk():
+    """
+    Risk levels for many consignments in one call
+    
+    Request body (columnar; scalars are broadcast):
+    {
+        "distance_km": [150, 420],
+        "has_cold_chain": [true, false],
+        "freshness_life_hours": 72,
+        "transit_hours": [3, 9.5]
+    }
+    
+    Values equal calculate_risk_level bit for bit.
+    """
+    try:
+        data = read_json_body()
+        columns, n = bulk_columns(data, {
+            'distance_km': (np.float64, 0),
+            'has_cold_chain': (bool, False),
+            'freshness_life_hours': (np.float64, 72),
+            'transit_hours': (np.float64, 0)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with phase('solve'):
+            risk = calculate_risk_levels(
+                columns['distance_km'], columns['has_cold_chain'],
+                columns['freshness_life_hours'], columns['transit_hours']
+            )
+            categories = risk_categories(risk)
+        with phase('serialize'):
+            return bulk_response({
+                'count': n,
+                'risk_level': risk,
+                'risk_category': categories
+            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/freshness/batches', methods=['POST'])
+def track_batches():
+    """
+    Start (or update) live freshness tracking for in-transit batches
+    
+    Request body (columnar; scalars are broadcast; times in Unix seconds):
+    {
+        "batch_id": [17, 18],
+        "start": 1767225600,
+        "eta": [1767261600, null],
+        "initial_freshness": 100,
+        "threshold": 70,
+        "cold_chain": true
+    }
+    
+    Batches seen in readings are tracked automatically (starting at
+    their first reading); registering them adds the arrival time used for
+    projections. start defaults to now; a null eta means unknown.
+    """
+    try:
+        data = read_json_body()
+        columns, n = bulk_columns(data, {
+            'batch_id': (np.int64, []),
+            'start': (np.float64, time.time()),
+            'eta': (np.float64, np.nan),
+            'initial_freshness': (np.float64, 100),
+            'threshold': (np.float64, FRESHNESS_TRACKER.threshold),
+            'cold_chain': (bool, True)
+        })
+        if n == 0:
+            raise ValueError("batch_id must be a non-empty list")
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        sync_freshness_readings()
+        added = FRESHNESS_TRACKER.track(
+            columns['batch_id'], columns['start'], eta_ts=columns['eta'],
+            initial=columns['initial_freshness'], threshold=columns['threshold'],
+            cold_chain=columns['cold_chain']
+        )
+        return jsonify({'success': True, 'added': added, 'updated': n - added, 'tracked': len(FRESHNESS_TRACKER)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/freshness/readings', methods=['POST'])
+def post_freshness_readings():
+    """
+    Apply temperature readings to the live tracker
+    
+    Request body (columnar; scalars are broadcast):
+    {
+        "batch_id": [17, 17, 18],
+        "temperature_c": [4.5, 9.1, 5.0],
+        "timestamp": [1767229200, 1767232800, 1767229200]
+    }
+    
+    Readings older than a batch's latest one are ignored. With
+    FRESHNESS_READINGS_LOG set, on-chain readings arrive on their own.
+    """
+    try:
+        data = read_json_body()
+        columns, n = bulk_columns(data, {
+            'batch_id': (np.int64, []),
+            'temperature_c': (np.float64, np.nan),
+            'timestamp': (np.float64, time.time())
+        })
+        if n == 0:
+            raise ValueError("batch_id must be a non-empty list")
+        if np.isnan(columns['temperature_c']).any():
+            raise ValueError("temperature_c is required")
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        sync_freshness_readings()
+        with phase('solve'):
+            accepted, ignored = FRESHNESS_TRACKER.ingest(
+                columns['batch_id'], columns['temperature_c'], columns['timestamp']
+            )
+        return jsonify({'success': True, 'accepted': accepted, 'ignored': ignored, 'tracked': len(FRESHNESS_TRACKER)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/freshness/batches', methods=['GET'])
+def list_tracked_batches():
+    """
+    Live freshness of tracked batches for dashboards (columnar)
+    
+    Query parameters: flags=at_risk,spoiled (any of breach, excursion,
+    at_risk, spoiled, stale), ids=17,18, limit (default 1000), offset,
+    at (Unix seconds, default now). Batches are ordered by hours to
+    threshold, soonest first; summary counts flags over all selected ids.
+    """
+    try:
+        ids = request.args.get('ids')
+        batch_ids = [int(b) for b in ids.split(',') if b] if ids else None
+        result = query_tracked_batches(
+            batch_ids=batch_ids,
+            flags=request.args.get('flags', ''),
+            limit=request.args.get('limit', 1000),
+            offset=request.args.get('offset', 0),
+            at=request.args.get('at')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    with phase('serialize'):
+        return bulk_response(result)
+
+@app.route('/freshness/batches/query', methods=['POST'])
+def query_tracked_batches_endpoint():
+    """
+    Same as GET /freshness/batches for long id lists
+    
+    Request body:
+    {
+        "batch_ids": [17, 18, 19],
+        "flags": ["at_risk"],
+        "limit": 1000,
+        "offset": 0,
+        "at": 1767240000
+    }
+    """
+    try:
+        data = read_json_body() or {}
+        batch_ids = data.get('batch_ids')
+        result = query_tracked_batches(
+            batch_ids=None if batch_ids is None else [int(b) for b in batch_ids],
+            flags=data.get('flags', []),
+            limit=data.get('limit', 1000),
+            offset=data.get('offset', 0),
+            at=data.get('at')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    with phase('serialize'):
+        return bulk_response(result)
+
+@app.route('/freshness/batches/<int:batch_id>', methods=['DELETE'])
+def finish_tracked_batch(batch_id):
+    """Stop tracking a delivered batch"""
+    sync_freshness_readings()
+    if not FRESHNESS_TRACKER.finish(batch_id):
+        return jsonify({'success': False, 'message': f'Batch {batch_id} is not tracked'}), 404
+    return jsonify({'success': True, 'tracked': len(FRESHNESS_TRACKER)})
+
+@app.route('/simulate', methods=['POST'])
+def simulate_comparison():
+    """
+    Simulate multiple orders and compare MILP vs simple routing
+    
+    Request body:
+    {
+        "num_orders": 100,
+        "seed": 42,
+        "workers": 4,
+        "stream": false,
+        "async": false
+    }
+    
+    Runs with the same seed return identical numbers for any worker
+    count. Without a seed one is drawn and returned in the response.
+    With "stream": true the response is NDJSON: one progress line per
+    chunk (with partial aggregates) followed by the result line.
+    With "async": true the run is queued as a job (see /jobs).
+    """
+    try:
+        data = request.get_json()
+        num_orders = data.get('num_orders', 50)
+        seed = data.get('seed')
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        workers = max(1, min(int(data.get('workers', SIMULATION_WORKERS)), SIMULATION_WORKERS))
+        chunk_size = max(1, int(data.get('chunk_size', SIMULATION_CHUNK_SIZE)))
+        
+        if data.get('async', False):
+            return submit_job(
+                'simulate', simulation_job,
+                num_orders=num_orders, seed=seed, workers=workers, chunk_size=chunk_size
+            )
+        
+        events = run_simulation(num_orders, seed, workers, chunk_size)
+        
+        if data.get('stream', False):
+            def generate():
+                try:
+                    for event in events:
+                        yield json.dumps(event) + '\n'
+                except Exception as e:
+                    yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        for event in events:
+            pass
+        result = dict(event)
+        del result['type']
+        return jsonify(result)
+    
+    except SolverBusyError as e:
+        return solver_busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of latency histograms, solver and cache/queue stats"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    """Job queue depth, counts and wait / run time distributions (per worker process)"""
+    return jsonify(JOBS.stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status and progress of an async job"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Unknown job id: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    Result of an async job
+    
+    200 with the endpoint's usual response once the job succeeded,
+    202 with the job status while it is queued or running,
+    409 if it was cancelled and 500 with the error if it failed.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Unknown job id: {job_id}'}), 404
+    if job.status == 'succeeded':
+        return jsonify(job.result)
+    if job.status == 'cancelled':
+        return jsonify(job.to_dict()), 409
+    if job.status == 'failed':
+        return jsonify(dict(job.to_dict(), success=False, message=job.error)), 500
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    """Cancel a queued or running job"""
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Unknown job id: {job_id}'}), 404
+    return jsonify(job.to_dict())
 
 # ============================================
 # MAIN
@@ -580,10 +3743,29 @@ if __name__ == '__main__':
     print("Endpoints:")
     print("  GET  /health           - Health check")
     print("  POST /optimize         - Run MILP optimization")
+    print("  POST /optimize/batch   - Jointly optimize many orders in one MILP")
+    print("  POST /optimize/network - Multi-echelon network-flow MILP")
+    print("  POST /optimize/vrp     - Multi-stop routing with time windows")
+    print("  POST /optimize/plan    - Multi-day harvest, shipment and stock plan")
+    print("  POST /optimize/pareto  - Trade-off frontier and picks per priority")
+    print("  POST /optimize/robust  - Monte Carlo selection under delay uncertainty")
     print("  GET  /optimize/demo    - Demo with sample data")
     print("  GET  /entities         - Get all entities")
+    print("  GET  /entities/nearest - Nearest entities to a point or entity")
+    print("  POST /entities/reload  - Hot reload entity snapshot")
+    print("  GET  /cache/stats      - Route result cache counters")
+    print("  POST /cache/clear      - Clear route result cache")
+    print("  GET  /reservations     - Capacity bookings (POST to book, DELETE /<id> to release)")
+    print("  GET  /capacity         - Booked and remaining capacity in a window")
     print("  POST /freshness/calculate - Calculate freshness score")
     print("  POST /risk/calculate   - Calculate risk level")
+    print("  GET  /freshness/batches - Live freshness of in-transit batches (POST to track)")
+    print("  POST /freshness/readings - Apply temperature readings to tracked batches")
+    print("  POST /freshness/calculate/bulk - Columnar freshness scores")
+    print("  POST /risk/calculate/bulk      - Columnar risk levels")
     print("  POST /simulate         - Simulate MILP vs simple routing")
+    print("  GET  /jobs/<id>        - Async job status (/result, DELETE to cancel)")
+    print("  GET  /jobs/stats       - Job queue depth and wait/run times")
+    print("  GET  /metrics          - Prometheus metrics")
     print("=" * 50)
     app.run(host='0.0.0.0', port=5000, debug=True)
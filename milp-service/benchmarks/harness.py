@@ -0,0 +1,279 @@
+"""
+Service benchmark harness
+=========================
+Reproducible timings for the route optimizer and the HTTP layer on
+synthetic entity registries (3 to 10k+ transporters).
+
+Measured per fleet size:
+- optimize_route phases: build (lane metrics, coefficients, constraint
+  filtering and, for the MILP engine, the PuLP model), solve, and
+  serialization (response dict + JSON encoding)
+- distance primitives: haversine_distance and the matrix lookup
+- end-to-end POST /optimize (cache cold and warm) and POST /simulate
+  latency, through the Flask test client or a live server (--url)
+
+Every metric is summarized as min / mean / p50 / p90 / p99 seconds and
+written as JSON. With --baseline the run is compared against an earlier
+result file and exits with status 1 when any metric's p50 regressed by
+more than --threshold (relative) and --min-delta (absolute seconds).
+
+Usage:
+    python benchmarks/harness.py --output bench.json
+    python benchmarks/harness.py --sizes 3 1000 --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from synthetic import random_orders, synthetic_entities
+
+import app as service
+
+DEFAULT_SIZES = [3, 100, 1000, 10000]
+
+
+def summarize(samples):
+    """min / mean / p50 / p90 / p99 of a list of durations (seconds)"""
+    values = np.asarray(samples, dtype=np.float64)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        'n': len(values),
+        'min': float(values.min()),
+        'mean': float(values.mean()),
+        'p50': float(p50),
+        'p90': float(p90),
+        'p99': float(p99)
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """(result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_route_phases(order, engine, repeat):
+    """Build / solve / serialize timings of optimize_route's pipeline for one order"""
+    phases = {'build': [], 'solve': [], 'serialize': [], 'total': []}
+    weights = service.PRIORITY_WEIGHTS[order['priority']]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        metrics = service.compute_transporter_metrics(
+            order['source_type'], order['source_id'],
+            order['destination_type'], order['destination_id'],
+            order['freshness_life_hours']
+        )
+        coefficients = service.objective_coefficients(metrics, weights)
+        excluded = service.infeasible_transporters(
+            metrics, order['quantity'], order['freshness_life_hours'], order['require_cold_chain']
+        )
+        prepared = time.perf_counter()
+
+        if engine == 'analytic':
+            selected_id = service.select_transporter_analytic(coefficients, excluded)
+            solved = time.perf_counter()
+            build = prepared - start
+            solve = solved - prepared
+        else:
+            _, selected_id, stats = service.solve_route_milp(coefficients, excluded)
+            solved = time.perf_counter()
+            # Model construction and solution extraction count as build time
+            build = solved - start - stats['wall_seconds']
+            solve = stats['wall_seconds']
+
+        if selected_id is not None:
+            result = service.build_route_result(
+                order['source_type'], order['source_id'],
+                order['destination_type'], order['destination_id'],
+                order['quantity'], order['freshness_life_hours'],
+                order['priority'], order['require_cold_chain'],
+                metrics, selected_id
+            )
+            json.dumps(result)
+        serialized = time.perf_counter()
+
+        phases['build'].append(build)
+        phases['solve'].append(solve)
+        phases['serialize'].append(serialized - solved)
+        phases['total'].append(serialized - start)
+    return phases
+
+
+def bench_distances(orders, repeat):
+    """Scalar haversine vs. precomputed matrix lookup, per call"""
+    pairs = []
+    for order in orders:
+        lat1, lon1 = service.REGISTRY.coords(order['source_type'], order['source_id'])
+        lat2, lon2 = service.REGISTRY.coords(order['destination_type'], order['destination_id'])
+        pairs.append((order, lat1, lon1, lat2, lon2))
+
+    haversine, lookup = [], []
+    for _ in range(repeat):
+        _, elapsed = timed(lambda: [service.haversine_distance(a, b, c, d) for _, a, b, c, d in pairs])
+        haversine.append(elapsed / len(pairs))
+        _, elapsed = timed(lambda: [
+            service.entity_distance(o['source_type'], o['source_id'], o['destination_type'], o['destination_id'])
+            for o, *_ in pairs
+        ])
+        lookup.append(elapsed / len(pairs))
+    return {'haversine_distance': haversine, 'entity_distance': lookup}
+
+
+class Client:
+    """POST JSON through the Flask test client, or to a live server"""
+
+    def __init__(self, url=None):
+        self.url = url.rstrip('/') if url else None
+        self.test_client = None if url else service.app.test_client()
+
+    def post(self, path, body):
+        if self.test_client is not None:
+            response = self.test_client.post(path, json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)}")
+            return response.get_data()
+        request = urllib.request.Request(
+            self.url + path, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+
+
+def bench_endpoints(client, orders, repeat, simulate_orders):
+    """End-to-end latencies of /optimize (cache cold and warm) and /simulate"""
+    cold, warm, simulate = [], [], []
+    for i in range(repeat):
+        order = orders[i % len(orders)]
+        client.post('/cache/clear', {})
+        _, elapsed = timed(client.post, '/optimize', order)
+        cold.append(elapsed)
+        _, elapsed = timed(client.post, '/optimize', order)
+        warm.append(elapsed)
+    for i in range(max(1, repeat // 4)):
+        client.post('/cache/clear', {})
+        _, elapsed = timed(client.post, '/simulate', {'num_orders': simulate_orders, 'seed': i, 'workers': 1})
+        simulate.append(elapsed)
+    return {'optimize_cold': cold, 'optimize_warm': warm, f'simulate_{simulate_orders}': simulate}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    client = Client(args.url)
+    metrics = {}
+    sample = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+
+    for size in args.sizes:
+        if args.url is None:
+            entities = synthetic_entities(
+                num_transporters=size, num_harvesters=50, num_distributors=20,
+                num_wholesalers=20, num_retailers=200, seed=args.seed
+            ) if size != 3 else sample
+            service.REGISTRY.load_lists(entities)
+        else:
+            entities = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+        orders = random_orders(entities, 32, seed=args.seed)
+
+        if args.url is None:
+            for engine in ('analytic', 'milp'):
+                repeat = args.repeat if engine == 'analytic' else args.milp_repeat
+                for phase, samples in bench_route_phases(orders[0], engine, repeat).items():
+                    metrics[f'optimize_route/{engine}/transporters={size}/{phase}'] = summarize(samples)
+            for name, samples in bench_distances(orders, args.repeat).items():
+                metrics[f'{name}/transporters={size}'] = summarize(samples)
+
+        for name, samples in bench_endpoints(client, orders, args.repeat, args.simulate_orders).items():
+            metrics[f'http/{name}/transporters={size}'] = summarize(samples)
+        print(f"  {size} transporters done", file=sys.stderr)
+
+        if args.url is not None:
+            break  # a live server's registry is fixed
+
+    if args.url is None:
+        service.REGISTRY.load_lists(sample)
+
+    return {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or 'flask-test-client',
+            'args': vars(args)
+        },
+        'metrics': metrics
+    }
+
+
+def compare(current, baseline, threshold, min_delta):
+    """Metrics whose p50 got slower than the baseline by both margins"""
+    regressions = []
+    for name, summary in current['metrics'].items():
+        before = baseline['metrics'].get(name)
+        if before is None:
+            continue
+        delta = summary['p50'] - before['p50']
+        if delta > min_delta and delta > threshold * before['p50']:
+            regressions.append((name, before['p50'], summary['p50']))
+    return regressions
+
+
+def print_table(result):
+    print(f"{'metric':70} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+    for name, summary in result['metrics'].items():
+        print(f"{name:70} {summary['p50'] * 1e3:10.3f} {summary['p90'] * 1e3:10.3f} {summary['p99'] * 1e3:10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='transporter counts')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--milp-repeat', type=int, default=5)
+    parser.add_argument('--simulate-orders', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative p50 slowdown')
+    parser.add_argument('--min-delta', type=float, default=0.0005, help='ignore p50 slowdowns below this many seconds')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_table(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold, args.min_delta)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p50 {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (baseline {baseline['meta'].get('git_revision')})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
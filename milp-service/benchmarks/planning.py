@@ -0,0 +1,109 @@
+"""
+Multi-period planning benchmark
+===============================
+Solve time of the rolling-horizon / regional planning mode
+(optimize_multiperiod_plan) against horizon length, on a synthetic
+registry with hundreds of farms and thousands of retailers.
+
+Each retailer demands a seeded, weekly-seasonal fraction of its storage
+capacity per day. Reported per horizon: windows, subproblems (and how
+many fell back to the LP relaxation or the greedy plan), instance build and solve seconds,
+seconds per planned day, fill rate, waste and total cost.
+
+Usage:
+    python benchmarks/planning.py [--farms 300] [--retailers 3000] [--horizons 7 10 14]
+                                  [--time-budget 120] [--json out.json]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from synthetic import synthetic_entities
+
+import app as service
+
+
+def synthetic_demand(retailers, horizon_days, seed):
+    """{retailer_id: daily quantities}: 30-60% of capacity, busier towards the weekend"""
+    rng = np.random.default_rng(seed)
+    weekly = np.array([0.8, 0.85, 0.9, 1.0, 1.2, 1.4, 0.85])
+    base = rng.uniform(0.3, 0.6, len(retailers))
+    noise = rng.uniform(0.9, 1.1, (len(retailers), horizon_days))
+    days = weekly[np.arange(horizon_days) % 7]
+    quantities = np.round(np.array([r['capacity'] for r in retailers])[:, None] * base[:, None] * days * noise)
+    return {r['id']: row.tolist() for r, row in zip(retailers, quantities)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--farms', type=int, default=300)
+    parser.add_argument('--retailers', type=int, default=3000)
+    parser.add_argument('--horizons', type=int, nargs='+', default=[7, 10, 14])
+    parser.add_argument('--time-budget', type=float, default=120)
+    parser.add_argument('--window-days', type=int, default=7)
+    parser.add_argument('--commit-days', type=int, default=4)
+    parser.add_argument('--region-size', type=int, default=100)
+    parser.add_argument('--backend', help='solver backend (default: the service default)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    sample = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+    service.REGISTRY.load_lists(synthetic_entities(
+        num_transporters=20, num_harvesters=args.farms, num_retailers=args.retailers,
+        num_distributors=2, num_wholesalers=2, seed=args.seed
+    ))
+    retailers = service.REGISTRY.records('retailer')
+
+    rows = []
+    print(f"{args.farms} farms, {args.retailers} retailers, time budget {args.time_budget:g} s")
+    print(f"{'days':>4} {'windows':>7} {'subproblems':>11} {'relaxed':>7} {'greedy':>6} {'build s':>8} {'solve s':>8} "
+          f"{'total s':>8} {'s/day':>7} {'fill':>7} {'waste':>9} {'cost':>14} status")
+    for horizon_days in args.horizons:
+        result = service.optimize_multiperiod_plan(
+            demands=synthetic_demand(retailers, horizon_days, args.seed),
+            horizon_days=horizon_days,
+            window_days=args.window_days,
+            commit_days=args.commit_days,
+            region_size=args.region_size,
+            time_budget_seconds=args.time_budget,
+            solver_options={'backend': args.backend}
+        )
+        decomposition, timing, summary = result['decomposition'], result['timing'], result['summary']
+        subproblems = sum(len(w['regions']) + 1 for w in decomposition['windows'])
+        print(f"{horizon_days:4d} {len(decomposition['windows']):7d} {subproblems:11d} "
+              f"{decomposition['subproblems_relaxed']:7d} {decomposition['subproblems_greedy']:6d} "
+              f"{timing['instance_seconds']:8.2f} {timing['solve_seconds']:8.2f} {timing['total_seconds']:8.2f} "
+              f"{timing['seconds_per_day']:7.2f} "
+              f"{summary['fill_rate']:7.4f} {summary['waste']:9.0f} {result['costs']['total']:14.0f} {result['status']}")
+        rows.append({
+            'horizon_days': horizon_days,
+            'windows': len(decomposition['windows']),
+            'regions': decomposition['regions'],
+            'lanes': decomposition['lanes'],
+            'subproblems': subproblems,
+            'subproblems_relaxed': decomposition['subproblems_relaxed'],
+            'subproblems_greedy': decomposition['subproblems_greedy'],
+            'timing': timing,
+            'summary': summary,
+            'costs': result['costs'],
+            'status': result['status']
+        })
+    service.REGISTRY.load_lists(sample)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'generated_at': time.time(),
+                'farms': args.farms,
+                'retailers': args.retailers,
+                'time_budget_seconds': args.time_budget,
+                'results': rows
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
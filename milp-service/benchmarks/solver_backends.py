@@ -0,0 +1,90 @@
+"""
+Solver backend benchmark
+========================
+Solves the service's models at several sizes with every available
+backend (CBC subprocess, HiGHS in-process) and reports wall time,
+branch-and-bound nodes, final gap and objective.
+
+Usage:
+    python benchmarks/solver_backends.py [--repeat 3] [--time-limit 30] [--json out.json]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from synthetic import random_orders, synthetic_entities
+
+import app as service
+from solvers import available_backends
+
+SCENARIOS = [
+    # name, entity sizes, kind, kind-specific size
+    ('route / 3 transporters', dict(num_transporters=3), 'route', None),
+    ('route / 500 transporters', dict(num_transporters=500), 'route', None),
+    ('batch / 100 orders x 10 transporters', dict(num_transporters=10, num_harvesters=20, num_retailers=50), 'batch', 100),
+    ('batch / 500 orders x 20 transporters', dict(num_transporters=20, num_harvesters=50, num_retailers=200), 'batch', 500),
+    ('network / sample data', None, 'network', 3),
+    ('network / 200 nodes', dict(num_transporters=4, num_harvesters=40, num_distributors=20, num_wholesalers=40, num_retailers=100), 'network', 60),
+    ('network / 1200 nodes', dict(num_transporters=4, num_harvesters=200, num_distributors=100, num_wholesalers=200, num_retailers=700), 'network', 300)
+]
+
+
+def run_scenario(kind, size, backend, time_limit, seed):
+    """Run one scenario once; returns the solver stats dict"""
+    options = {'backend': backend, 'time_limit': time_limit}
+    if kind == 'route':
+        order = random_orders({t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}, 1, seed)[0]
+        result = service.optimize_route(engine='milp', solver_options=options, **order)
+        return result['solver_stats']
+    if kind == 'batch':
+        orders = random_orders({t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}, size, seed)
+        return service.optimize_batch(orders, True, options)['solver_stats']
+    retailer_ids = service.REGISTRY.ids('retailer')[:size]
+    demands = {retailer_id: 100 + 10 * (i % 20) for i, retailer_id in enumerate(retailer_ids)}
+    result = service.optimize_supply_network(
+        demands, freshness_life_hours=96, allow_bypass=True, max_inbound_arcs=8, solver_options=options
+    )
+    return result['model']['solver']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    sample = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+    rows = []
+    print(f"{'scenario':40} {'backend':8} {'median s':>10} {'nodes':>7} {'gap':>8} {'objective':>12} status")
+    for name, sizes, kind, size in SCENARIOS:
+        service.REGISTRY.load_lists(synthetic_entities(seed=args.seed, **sizes) if sizes else sample)
+        for backend in available_backends():
+            runs = [run_scenario(kind, size, backend, args.time_limit, args.seed) for _ in range(args.repeat)]
+            wall = statistics.median(r['wall_seconds'] for r in runs)
+            last = runs[-1]
+            gap = '-' if last['gap'] is None else f"{last['gap']:.4f}"
+            objective = '-' if last['objective'] is None else f"{last['objective']:.6f}"
+            print(f"{name:40} {backend:8} {wall:10.4f} {last['nodes']:7d} {gap:>8} {objective:>12} {last['status']}")
+            rows.append({
+                'scenario': name,
+                'backend': backend,
+                'median_wall_seconds': wall,
+                'runs': args.repeat,
+                'nodes': last['nodes'],
+                'gap': last['gap'],
+                'objective': last['objective'],
+                'status': last['status']
+            })
+    service.REGISTRY.load_lists(sample)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generated_at': time.time(), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
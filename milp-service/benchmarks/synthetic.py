@@ -0,0 +1,94 @@
+"""
+Synthetic entity registries for benchmarks
+==========================================
+Deterministic (seeded) harvester / transporter / distributor /
+wholesaler / retailer tables in the same shape as the sample data in
+app.py, spread over India's bounding box.
+"""
+
+import os
+import random
+import sys
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+LAT_RANGE = (8.0, 30.0)
+LON_RANGE = (70.0, 88.0)
+
+VEHICLES = [
+    ('Refrigerated Truck', True),
+    ('Van', False),
+    ('Climate-Controlled Van', True),
+    ('Truck', False)
+]
+
+
+def synthetic_entities(
+    num_transporters=3,
+    num_harvesters=3,
+    num_distributors=2,
+    num_wholesalers=2,
+    num_retailers=3,
+    seed=0
+):
+    """Entity lists keyed by entity type, ready for EntityRegistry.load_lists"""
+    rng = random.Random(seed)
+
+    def located(i, capacity_range, cost_range, cold_probability):
+        entity = {
+            'id': i,
+            'name': f'Entity {i}',
+            'location': 'Synthetic',
+            'lat': round(rng.uniform(*LAT_RANGE), 4),
+            'lon': round(rng.uniform(*LON_RANGE), 4),
+            'capacity': rng.randint(*capacity_range),
+            'cost_per_unit': rng.randint(*cost_range),
+            'quality': round(rng.uniform(0.8, 0.99), 2)
+        }
+        if cold_probability is not None:
+            entity['cold_storage'] = rng.random() < cold_probability
+        return entity
+
+    transporters = []
+    for i in range(1, num_transporters + 1):
+        vehicle, cold_chain = rng.choice(VEHICLES)
+        transporters.append({
+            'id': i,
+            'name': f'Transporter {i}',
+            'vehicle': vehicle,
+            'cold_chain': cold_chain,
+            'capacity': rng.choice([500, 1000, 1500, 2000, 3000]),
+            'cost_per_km': rng.randint(6, 18),
+            'speed_kmph': rng.randint(40, 65),
+            'quality': round(rng.uniform(0.75, 0.98), 2)
+        })
+
+    return {
+        'harvester': [located(i, (3000, 10000), (6, 14), None) for i in range(1, num_harvesters + 1)],
+        'transporter': transporters,
+        'distributor': [located(i, (8000, 20000), (3, 6), 0.8) for i in range(1, num_distributors + 1)],
+        'wholesaler': [located(i, (15000, 30000), (2, 4), 0.3) for i in range(1, num_wholesalers + 1)],
+        'retailer': [located(i, (300, 800), (5, 12), 0.6) for i in range(1, num_retailers + 1)]
+    }
+
+
+def random_orders(entities, num_orders, seed=0, destination_type='retailer'):
+    """Random /optimize request bodies over the given entity tables"""
+    rng = random.Random(seed)
+    harvester_ids = [e['id'] for e in entities['harvester']]
+    destination_ids = [e['id'] for e in entities[destination_type]]
+    return [
+        {
+            'source_type': 'harvester',
+            'source_id': rng.choice(harvester_ids),
+            'destination_type': destination_type,
+            'destination_id': rng.choice(destination_ids),
+            'quantity': rng.randint(100, 2000),
+            'freshness_life_hours': rng.randint(48, 96),
+            'priority': rng.choice(['balanced', 'cost', 'time', 'quality', 'freshness']),
+            'require_cold_chain': rng.random() < 0.3
+        }
+        for _ in range(num_orders)
+    ]
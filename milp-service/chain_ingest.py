@@ -0,0 +1,712 @@
+"""
+FloraChain Ingestion
+====================
+Incremental sync of supply chain entities and cold-chain readings from
+the FloraChain contract into a local entity snapshot, so the optimizer
+never calls the chain on the request path: the service loads the
+snapshot through ENTITY_SNAPSHOT_PATH and hot reloads it when this
+process rewrites it.
+
+- Bulk log fetch: RoleRegistered, ReputationUpdated and
+  TemperatureRecorded logs of the contract in one eth_getLogs query per
+  block range; the range doubles while responses are sparse and halves
+  when a node rejects or overfills a query, and the next range is
+  fetched while the current one is applied
+- Entities: a registration triggers one eth_call to the contract's
+  public struct getter (batched JSON-RPC, at the range's last block);
+  reputation updates adjust quality in place. Freezing an account emits
+  no event, so `run` re-reads all entities every `refresh_seconds`
+- Off-chain fields the contract does not hold (cost per km or unit,
+  speed, facility capacity) come from OFFCHAIN_DEFAULTS, overridable
+  per entity type and per address with a defaults file
+- Checkpoint: last block and its hash, entity state and per-batch
+  temperature aggregates, written atomically at most every
+  `checkpoint_seconds`; a restart resumes from it. A
+  different block hash at the checkpointed height (a restarted Hardhat
+  node, a reorg) or a different chain / contract resyncs from
+  `start_block`
+- Snapshot: active entities in the registry format, rewritten
+  atomically (temp file + rename) only when entities changed
+- Readings log (optional): every TemperatureRecorded reading appended
+  to a binary log that the service's live freshness tracker tails
+
+CLI:
+    python chain_ingest.py sync --contract 0x... --snapshot data/entities.json
+    python chain_ingest.py run --snapshot data/entities.json --poll-seconds 0.5
+
+Without --contract the address is read from the client's
+deployments.json for the node's chain id.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # optional dependency, speeds up parsing of large log batches
+    orjson = None
+
+from freshness import ReadingsLog
+from registry import ENTITY_TYPES, PLURALS
+
+# keccak256 of the event signatures (topic 0)
+ROLE_REGISTERED = '0xe4da0867e76888bd809773338629bb69b808dd8d6d9f436182aa2db3831ec7a0'     # RoleRegistered(address,uint8,uint256,uint256)
+REPUTATION_UPDATED = '0x8c7c5e89600470a73904d7c2579587cd21c1d54193069485cb0b75f584488642'  # ReputationUpdated(address,uint8,uint256,uint256)
+TEMPERATURE_RECORDED = '0x88c2d7b9bcac306ffc79353bd82ad3b18420488846b1c0377e8c6375111219d2'  # TemperatureRecorded(uint256,int256,bool,uint256)
+EVENT_TOPICS = (ROLE_REGISTERED, REPUTATION_UPDATED, TEMPERATURE_RECORDED)
+
+# FloraChain.Role enum values of the entity types the optimizer knows
+ROLE_ENTITY_TYPES = {1: 'harvester', 2: 'transporter', 3: 'distributor', 4: 'wholesaler', 5: 'retailer'}
+
+# Selectors of the public mapping getters, e.g. keccak256("harvesters(uint256)")[:4]
+GETTER_SELECTORS = {
+    'harvester': '0xea02cea4',
+    'transporter': '0x29c2a877',
+    'distributor': '0x50b492ba',
+    'wholesaler': '0xfc23328c',
+    'retailer': '0x897ec7df'
+}
+
+# Struct members in declaration order, as returned by the getters
+_FACILITY_FIELDS = (
+    ('addr', 'address'), ('id', 'uint'), ('shopName', 'string'), ('shopAddress', 'string'),
+    ('geoLocation', 'string'), ('storageType', 'string'), ('hasColdStorage', 'bool'), ('contact', 'string'),
+    ('reputationScore', 'uint'), ('isActive', 'bool'), ('registeredAt', 'uint')
+)
+STRUCT_FIELDS = {
+    'harvester': (
+        ('addr', 'address'), ('id', 'uint'), ('farmerName', 'string'), ('farmName', 'string'),
+        ('geoLocation', 'string'), ('flowerTypes', 'string'), ('dailyCapacity', 'uint'),
+        ('seasonalFlowers', 'string'), ('contact', 'string'), ('reputationScore', 'uint'),
+        ('isActive', 'bool'), ('registeredAt', 'uint')
+    ),
+    'transporter': (
+        ('addr', 'address'), ('id', 'uint'), ('vehicleType', 'string'), ('coldChainSupport', 'bool'),
+        ('capacity', 'uint'), ('serviceRegion', 'string'), ('availability', 'string'), ('contact', 'string'),
+        ('reputationScore', 'uint'), ('isActive', 'bool'), ('registeredAt', 'uint')
+    ),
+    'distributor': _FACILITY_FIELDS,
+    'wholesaler': _FACILITY_FIELDS,
+    'retailer': (
+        ('addr', 'address'), ('id', 'uint'), ('shopName', 'string'), ('shopPhotos', 'string'),
+        ('shopAddress', 'string'), ('geoLocation', 'string'), ('storageType', 'string'),
+        ('hasColdStorage', 'bool'), ('inventory', 'string'), ('seasonalAvailable', 'string'),
+        ('contact', 'string'), ('reputationScore', 'uint'), ('isActive', 'bool'), ('registeredAt', 'uint')
+    )
+}
+
+# Fields the optimizer needs that are not stored on chain
+OFFCHAIN_DEFAULTS = {
+    'harvester': {'cost_per_unit': 10},
+    'transporter': {'cost_per_km': 12, 'speed_kmph': 50},
+    'distributor': {'capacity': 10000, 'cost_per_unit': 5},
+    'wholesaler': {'capacity': 20000, 'cost_per_unit': 3},
+    'retailer': {'capacity': 500, 'cost_per_unit': 8}
+}
+
+# Entity types placed by coordinates; records without a parseable geoLocation are left out
+LOCATED_ENTITY_TYPES = ('harvester', 'distributor', 'wholesaler', 'retailer')
+
+CHECKPOINT_FORMAT = 1
+
+
+class RpcError(RuntimeError):
+    """JSON-RPC error reply or transport failure"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def _dumps(payload):
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS) if orjson is not None else json.dumps(payload).encode()
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class JsonRpcClient:
+    """Minimal JSON-RPC 2.0 client over keep-alive HTTP, one connection per thread"""
+
+    def __init__(self, url, timeout=60):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.timeout = timeout
+        self._https = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or '/'
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self._host, self._port, timeout=self.timeout)
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _post(self, payload):
+        body = _dumps(payload)
+        # One retry on a fresh connection: the node may have dropped an idle keep-alive socket
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.request('POST', self._path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._close()
+                if attempt:
+                    raise RpcError(f"{self.url}: {e}") from e
+                continue
+            if response.status != 200:
+                raise RpcError(f"{self.url}: HTTP {response.status} {data[:200]!r}")
+            return _loads(data)
+
+    @staticmethod
+    def _result(reply):
+        if 'error' in reply:
+            error = reply['error']
+            raise RpcError(error.get('message', str(error)), error.get('code'))
+        return reply['result']
+
+    def call(self, method, params=()):
+        return self._result(self._post({'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': list(params)}))
+
+    def batch(self, calls):
+        """Results of [(method, params), ...] sent as one batch request, in call order"""
+        if not calls:
+            return []
+        replies = self._post([
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': list(params)}
+            for i, (method, params) in enumerate(calls)
+        ])
+        if isinstance(replies, dict):
+            return [self._result(replies)]
+        by_id = {reply.get('id'): reply for reply in replies}
+        return [self._result(by_id[i]) for i in range(len(calls))]
+
+
+# --------------------------------------------
+# ABI decoding
+# --------------------------------------------
+
+_WORD_MASK = (1 << 256) - 1
+
+
+def _word(data, index):
+    """index-th 32-byte word of a 0x-prefixed hex string, as an unsigned int"""
+    return int(data[2 + 64 * index:66 + 64 * index], 16)
+
+
+def _signed(value):
+    return value - (1 << 256) if value >> 255 else value
+
+
+def _address(topic):
+    return '0x' + topic[-40:].lower()
+
+
+def decode_tuple(data, kinds):
+    """Decode ABI-encoded return values of the given kinds ('address', 'uint', 'int', 'bool', 'string')"""
+    raw = bytes.fromhex(data[2:])
+    values = []
+    for index, kind in enumerate(kinds):
+        word = raw[32 * index:32 * index + 32]
+        if kind == 'string':
+            offset = int.from_bytes(word, 'big')
+            length = int.from_bytes(raw[offset:offset + 32], 'big')
+            values.append(raw[offset + 32:offset + 32 + length].decode('utf-8', errors='replace'))
+        elif kind == 'address':
+            values.append('0x' + word[12:].hex())
+        elif kind == 'bool':
+            values.append(word[-1] != 0)
+        elif kind == 'int':
+            values.append(int.from_bytes(word, 'big', signed=True))
+        else:
+            values.append(int.from_bytes(word, 'big'))
+    return values
+
+
+def parse_geolocation(text):
+    """(lat, lon) from a "lat,lon" string, or None when it does not hold valid coordinates"""
+    try:
+        lat, lon = (float(part) for part in text.split(','))
+    except (ValueError, AttributeError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def entity_record(entity_type, fields, defaults):
+    """Registry record for one decoded on-chain struct; 'active' marks frozen accounts"""
+    record = {'id': fields['id']}
+    if entity_type == 'harvester':
+        record.update(
+            name=fields['farmName'] or fields['farmerName'],
+            location=fields['geoLocation'],
+            capacity=fields['dailyCapacity'],
+            flower_types=fields['flowerTypes']
+        )
+    elif entity_type == 'transporter':
+        record.update(
+            name=f"Transporter {fields['id']}",
+            vehicle=fields['vehicleType'],
+            cold_chain=fields['coldChainSupport'],
+            capacity=fields['capacity'],
+            service_region=fields['serviceRegion']
+        )
+    else:
+        record.update(
+            name=fields['shopName'],
+            location=fields['shopAddress'],
+            cold_storage=fields['hasColdStorage']
+        )
+    if entity_type in LOCATED_ENTITY_TYPES:
+        coords = parse_geolocation(fields['geoLocation'])
+        if coords is not None:
+            record['lat'], record['lon'] = coords
+    for field, value in defaults.get(entity_type, {}).items():
+        record.setdefault(field, value)
+    record.update(defaults.get('addresses', {}).get(fields['addr'], {}))
+    record.update(
+        quality=fields['reputationScore'] / 100,
+        reputation=fields['reputationScore'],
+        address=fields['addr'],
+        active=fields['isActive']
+    )
+    return record
+
+
+def _write_atomic(path, payload):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp = f'{path}.tmp{os.getpid()}'
+    with open(temp, 'wb') as f:
+        f.write(_dumps(payload))
+    os.replace(temp, path)
+
+
+class ChainIngestor:
+    """
+    Event-driven mirror of the FloraChain entity tables
+
+    reading_listeners: callables fn(readings) receiving each applied
+    range's temperature readings as [(batch_id, temperature_c,
+    is_breach, timestamp, block_number), ...] in chain order.
+    readings_log: path of a freshness.ReadingsLog to append them to; it is
+    cut back to the checkpointed block on start and emptied on a resync,
+    so its readers see every reading exactly once.
+    """
+
+    def __init__(self, client, contract, snapshot_path, checkpoint_path, start_block=0, confirmations=0,
+                 defaults=None, initial_span=2000, max_span=1_000_000, target_logs=20000,
+                 call_batch_size=500, checkpoint_seconds=5.0, readings_log=None):
+        self.client = client
+        self.contract = contract.lower()
+        self.snapshot_path = snapshot_path
+        self.checkpoint_path = checkpoint_path
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.defaults = {t: dict(OFFCHAIN_DEFAULTS[t]) for t in ENTITY_TYPES}
+        for key, values in (defaults or {}).items():
+            if key == 'addresses':
+                self.defaults['addresses'] = {address.lower(): dict(v) for address, v in values.items()}
+            elif key in self.defaults:
+                self.defaults[key].update(values)
+            else:
+                raise ValueError(f"Unknown entity type in defaults: {key}")
+        self.span = initial_span
+        self.max_span = max_span
+        self.target_logs = target_logs
+        self.call_batch_size = call_batch_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.reading_listeners = []
+        self.chain_id = None
+        self.head = None
+        self.resyncs = 0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chain-logs')
+        self._reset()
+        self._load_checkpoint()
+        self.readings_log = None
+        if readings_log:
+            self.readings_log = ReadingsLog(readings_log)
+            self.readings_log.truncate_after(self.last_block)
+            self.reading_listeners.append(self.readings_log.append)
+
+    # --------------------------------------------
+    # State
+    # --------------------------------------------
+
+    def _reset(self):
+        self.last_block = self.start_block - 1
+        self.last_hash = None
+        self._hash_block = None
+        self.entities = {t: {} for t in ENTITY_TYPES}
+        self.addresses = {}  # address -> [entity_type, entity_id]
+        self.batches = {}  # batch id -> temperature aggregates
+        self.events = dict.fromkeys(('role_registered', 'reputation_updated', 'temperature_recorded'), 0)
+        self._entities_dirty = True
+        self._saved_at = time.monotonic()
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'rb') as f:
+            state = _loads(f.read())
+        if state.get('format') != CHECKPOINT_FORMAT or state.get('contract') != self.contract:
+            return
+        self.chain_id = state['chain_id']
+        self.last_block = state['last_block']
+        self.last_hash = state['last_block_hash']
+        self._hash_block = self.last_block
+        for entity_type in ENTITY_TYPES:
+            self.entities[entity_type] = {r['id']: r for r in state['entities'].get(PLURALS[entity_type], [])}
+        self.addresses = state['addresses']
+        self.batches = {int(batch_id): stats for batch_id, stats in state['batches'].items()}
+        self.events.update(state.get('events', {}))
+        self._entities_dirty = False
+
+    def _write_snapshot(self):
+        snapshot = {
+            PLURALS[entity_type]: [
+                {field: value for field, value in record.items() if field != 'active'}
+                for record in self.entities[entity_type].values()
+                if record['active'] and (entity_type not in LOCATED_ENTITY_TYPES or 'lat' in record)
+            ]
+            for entity_type in ENTITY_TYPES
+        }
+        snapshot['source'] = {'contract': self.contract, 'chain_id': self.chain_id, 'block': self.last_block}
+        _write_atomic(self.snapshot_path, snapshot)
+        self._entities_dirty = False
+
+    def _block_hash(self):
+        """Hash of last_block, fetched once per block"""
+        if self.last_block >= 0 and self._hash_block != self.last_block:
+            block = self.client.call('eth_getBlockByNumber', [hex(self.last_block), False])
+            self.last_hash = block['hash'] if block else None
+            self._hash_block = self.last_block
+        return self.last_hash
+
+    def save(self, force=True):
+        """
+        Write the snapshot when entities changed, then the checkpoint
+        (unless force is False and the last one is recent)
+        """
+        # The snapshot goes first: a checkpoint never claims entities the snapshot lacks
+        if self._entities_dirty:
+            self._write_snapshot()
+        if not force and time.monotonic() - self._saved_at < self.checkpoint_seconds:
+            return
+        _write_atomic(self.checkpoint_path, {
+            'format': CHECKPOINT_FORMAT,
+            'contract': self.contract,
+            'chain_id': self.chain_id,
+            'last_block': self.last_block,
+            'last_block_hash': self._block_hash(),
+            'entities': {PLURALS[t]: list(self.entities[t].values()) for t in ENTITY_TYPES},
+            'addresses': self.addresses,
+            'batches': self.batches,
+            'events': self.events,
+            'saved_at': time.time()
+        })
+        self._saved_at = time.monotonic()
+
+    # --------------------------------------------
+    # Applying logs
+    # --------------------------------------------
+
+    @staticmethod
+    def _registrations(logs):
+        """(entity_type, entity_id) of the entities registered in a range's logs"""
+        registered = []
+        for log in logs:
+            if log['topics'][0] == ROLE_REGISTERED:
+                entity_type = ROLE_ENTITY_TYPES.get(_word(log['data'], 0))
+                if entity_type is not None:
+                    registered.append((entity_type, _word(log['data'], 1)))
+        return registered
+
+    def _apply(self, logs, records=None):
+        """
+        Apply one range's logs in chain order, then the entity records
+        read for it (see _read_entities); makes no RPC calls, so a range
+        is applied whole or not at all
+        """
+        readings = []
+        for log in logs:
+            topics = log['topics']
+            data = log['data']
+            topic = topics[0]
+            if topic == TEMPERATURE_RECORDED:
+                batch_id = int(topics[1], 16)
+                # (temperature, isBreach, timestamp) in one hex parse; temperature is Celsius x 100
+                value = int(data, 16)
+                timestamp = value & _WORD_MASK
+                breach = (value >> 256) & _WORD_MASK != 0
+                temperature = _signed(value >> 512) / 100
+                stats = self.batches.get(batch_id)
+                if stats is None:
+                    stats = self.batches[batch_id] = {
+                        'readings': 0, 'breaches': 0, 'first_timestamp': timestamp,
+                        'min_temperature_c': temperature, 'max_temperature_c': temperature
+                    }
+                stats['readings'] += 1
+                stats['breaches'] += breach
+                stats['last_temperature_c'] = temperature
+                stats['last_timestamp'] = timestamp
+                if temperature < stats['min_temperature_c']:
+                    stats['min_temperature_c'] = temperature
+                elif temperature > stats['max_temperature_c']:
+                    stats['max_temperature_c'] = temperature
+                readings.append((batch_id, temperature, breach, timestamp, int(log['blockNumber'], 16)))
+            elif topic == ROLE_REGISTERED:
+                self.events['role_registered'] += 1
+                entity_type = ROLE_ENTITY_TYPES.get(_word(data, 0))
+                if entity_type is not None:
+                    self.addresses[_address(topics[1])] = [entity_type, _word(data, 1)]
+            elif topic == REPUTATION_UPDATED:
+                self.events['reputation_updated'] += 1
+                entity = self.addresses.get(_address(topics[1]))
+                # Entities registered in this range are read after it, with their latest score
+                record = self.entities[entity[0]].get(entity[1]) if entity else None
+                if record is not None:
+                    score = _word(data, 1)
+                    record['reputation'] = score
+                    record['quality'] = score / 100
+                    self._entities_dirty = True
+        self.events['temperature_recorded'] += len(readings)
+        changed = self._store_entities(records or {})
+        if readings:
+            for listener in self.reading_listeners:
+                listener(readings)
+        return changed
+
+    def _read_entities(self, keys, block):
+        """Structs of (entity_type, entity_id) keys at a block as {key: record}; changes no state"""
+        records = {}
+        tag = hex(block)
+        for start in range(0, len(keys), self.call_batch_size):
+            chunk = keys[start:start + self.call_batch_size]
+            results = self.client.batch([
+                ('eth_call', [{'to': self.contract, 'data': GETTER_SELECTORS[t] + format(i, '064x')}, tag])
+                for t, i in chunk
+            ])
+            for (entity_type, entity_id), result in zip(chunk, results):
+                spec = STRUCT_FIELDS[entity_type]
+                fields = dict(zip((name for name, _ in spec), decode_tuple(result, [kind for _, kind in spec])))
+                records[(entity_type, entity_id)] = entity_record(entity_type, fields, self.defaults)
+        return records
+
+    def _store_entities(self, records):
+        """Store read entity records; returns how many changed"""
+        changed = 0
+        for (entity_type, entity_id), record in records.items():
+            if self.entities[entity_type].get(entity_id) != record:
+                self.entities[entity_type][entity_id] = record
+                changed += 1
+        if changed:
+            self._entities_dirty = True
+        return changed
+
+    def refresh(self):
+        """Re-read every known entity at the last synced block (picks up frozen accounts)"""
+        if self.last_block < 0:
+            return 0
+        keys = [(t, i) for t in ENTITY_TYPES for i in self.entities[t]]
+        changed = self._store_entities(self._read_entities(keys, self.last_block))
+        if changed:
+            self.save(force=False)
+        return changed
+
+    # --------------------------------------------
+    # Syncing
+    # --------------------------------------------
+
+    def _get_logs(self, first, last):
+        return self.client.call('eth_getLogs', [{
+            'address': self.contract,
+            'fromBlock': hex(first),
+            'toBlock': hex(last),
+            'topics': [list(EVENT_TOPICS)]
+        }])
+
+    def _check_chain(self):
+        """Chain head; resets the state when the chain no longer holds the checkpointed block"""
+        calls = [('eth_chainId', []), ('eth_blockNumber', [])]
+        if self.last_block >= 0 and self._hash_block == self.last_block and self.last_hash is not None:
+            calls.append(('eth_getBlockByNumber', [hex(self.last_block), False]))
+        results = self.client.batch(calls)
+        chain_id = int(results[0], 16)
+        head = int(results[1], 16)
+        same_chain = self.chain_id in (None, chain_id)
+        if len(results) > 2:
+            same_chain = same_chain and results[2] is not None and results[2]['hash'] == self.last_hash
+        if not same_chain:
+            self._reset()
+            self.resyncs += 1
+            if self.readings_log is not None:
+                self.readings_log.truncate_after(self.last_block)
+        self.chain_id = chain_id
+        self.head = head
+        return head
+
+    def sync(self):
+        """
+        Catch up to the chain head minus `confirmations` blocks; returns
+        the number of blocks processed
+        """
+        target = self._check_chain() - self.confirmations
+        first = start = self.last_block + 1
+        if first > target:
+            return 0
+
+        last = min(first + self.span - 1, target)
+        pending = self._pool.submit(self._get_logs, first, last)
+        while pending is not None:
+            try:
+                logs = pending.result()
+            except RpcError:
+                # Too many results or a query timeout: retry a smaller range
+                if last == first:
+                    raise
+                self.span = max(1, (last - first + 1) // 2)
+                last = first + self.span - 1
+                pending = self._pool.submit(self._get_logs, first, last)
+                continue
+
+            if len(logs) > self.target_logs:
+                self.span = max(1, self.span // 2)
+            elif len(logs) < self.target_logs // 4:
+                self.span = min(self.span * 2, self.max_span)
+
+            # Fetch the next range while this one is applied
+            next_first = last + 1
+            next_last = min(next_first + self.span - 1, target)
+            pending = self._pool.submit(self._get_logs, next_first, next_last) if next_first <= target else None
+
+            # Every RPC call of the range happens before any state changes: a
+            # failure leaves the range unapplied and the next sync retries it
+            records = self._read_entities(self._registrations(logs), last)
+            self._apply(logs, records)
+            self.last_block = last
+            first, last = next_first, next_last
+            if time.monotonic() - self._saved_at >= self.checkpoint_seconds:
+                self.save()
+
+        # Following the head, small ranges only rewrite the checkpoint every
+        # checkpoint_seconds; new or changed entities reach the snapshot at once
+        self._block_hash()
+        self.save(force=False)
+        return target - start + 1
+
+    def run(self, poll_seconds=0.5, refresh_seconds=300.0, on_sync=None):
+        """Follow the chain head forever, polling every poll_seconds"""
+        refreshed = time.monotonic()
+        while True:
+            started = time.monotonic()
+            try:
+                blocks = self.sync()
+                if started - refreshed >= refresh_seconds:
+                    self.refresh()
+                    refreshed = started
+            except RpcError as e:
+                print(f"chain_ingest: {e}", file=sys.stderr)
+                blocks = 0
+            if blocks and on_sync is not None:
+                on_sync(self.stats())
+            time.sleep(max(0.0, poll_seconds - (time.monotonic() - started)))
+
+    def stats(self):
+        return {
+            'contract': self.contract,
+            'chain_id': self.chain_id,
+            'last_block': self.last_block,
+            'head': self.head,
+            'lag_blocks': None if self.head is None else max(0, self.head - self.last_block),
+            'entities': {
+                PLURALS[t]: sum(1 for r in self.entities[t].values() if r['active']) for t in ENTITY_TYPES
+            },
+            'batches': len(self.batches),
+            'events': dict(self.events),
+            'span_blocks': self.span,
+            'resyncs': self.resyncs
+        }
+
+
+def resolve_contract(client, deployments_path):
+    """FloraChain address for the node's chain id from the client's deployments.json"""
+    chain_id = str(int(client.call('eth_chainId'), 16))
+    with open(deployments_path) as f:
+        deployments = json.load(f)
+    try:
+        return deployments['networks'][chain_id]['FloraChain']['address']
+    except KeyError:
+        raise ValueError(f"No FloraChain deployment for chain {chain_id} in {deployments_path}") from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    default_deployments = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client', 'src', 'deployments.json')
+    for name, help_text in (('sync', 'catch up to the chain head once'), ('run', 'catch up, then follow the chain head')):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument('--rpc-url', default=os.environ.get('FLORACHAIN_RPC_URL', 'http://127.0.0.1:8545'))
+        sub.add_argument('--contract', default=os.environ.get('FLORACHAIN_CONTRACT'),
+                         help='contract address (default: from --deployments)')
+        sub.add_argument('--deployments', default=default_deployments)
+        sub.add_argument('--snapshot', default=os.environ.get('ENTITY_SNAPSHOT_PATH'), required=not os.environ.get('ENTITY_SNAPSHOT_PATH'),
+                         help='entity snapshot to write (the service reads it via ENTITY_SNAPSHOT_PATH)')
+        sub.add_argument('--checkpoint', help='checkpoint file (default: <snapshot>.chain.json)')
+        sub.add_argument('--defaults', help='JSON file overriding OFFCHAIN_DEFAULTS per entity type and per address')
+        sub.add_argument('--readings-log', default=os.environ.get('FRESHNESS_READINGS_LOG'),
+                         help='append temperature readings here for the live freshness tracker')
+        sub.add_argument('--start-block', type=int, default=0)
+        sub.add_argument('--confirmations', type=int, default=0)
+        if name == 'run':
+            sub.add_argument('--poll-seconds', type=float, default=0.5)
+            sub.add_argument('--refresh-seconds', type=float, default=300.0)
+
+    args = parser.parse_args()
+    client = JsonRpcClient(args.rpc_url)
+    contract = args.contract or resolve_contract(client, args.deployments)
+    defaults = None
+    if args.defaults:
+        with open(args.defaults) as f:
+            defaults = json.load(f)
+    ingestor = ChainIngestor(
+        client, contract, args.snapshot,
+        args.checkpoint or os.path.splitext(args.snapshot)[0] + '.chain.json',
+        start_block=args.start_block, confirmations=args.confirmations, defaults=defaults,
+        readings_log=args.readings_log
+    )
+
+    start = time.perf_counter()
+    ingestor.sync()
+    ingestor.save()
+    summary = ingestor.stats()
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+    if args.command == 'run':
+        ingestor.run(args.poll_seconds, args.refresh_seconds, on_sync=lambda stats: print(json.dumps(stats)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Entity Distance Matrix
+======================
+Precomputed great-circle distances between every pair of located
+supply chain entities (harvesters, distributors, wholesalers, retailers).
+
+Distances are computed with NumPy in row blocks so the temporary arrays
+stay bounded for large registries, and stored as float32 to halve the
+memory of the full N x N table. Entities can be added or moved
+incrementally: only the affected row and column are recomputed.
+"""
+
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_block(lat1, lon1, lat2, lon2):
+    """
+    Vectorized Haversine distance (km) between every point in
+    (lat1, lon1) and every point in (lat2, lon2). Inputs in radians.
+    Returns a len(lat1) x len(lat2) float64 array.
+    """
+    lat1 = lat1[:, None]
+    lon1 = lon1[:, None]
+    delta_lat = lat2[None, :] - lat1
+    delta_lon = lon2[None, :] - lon1
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2[None, :]) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+class _DistanceState:
+    """One published version of the table: readers take a single reference to it"""
+
+    __slots__ = ('index', 'lat', 'lon', 'matrix', 'size')
+
+    def __init__(self, index, lat, lon, matrix, size):
+        self.index = index
+        self.lat = lat
+        self.lon = lon
+        self.matrix = matrix
+        self.size = size
+
+
+class DistanceMatrix:
+    """
+    Symmetric entity-pair distance table keyed by (entity_type, entity_id)
+
+    The index, coordinates and matrix are published together as one
+    state object, so a reader never pairs an index with another version's
+    matrix. Reads are lock-free lookups on a single reference to it;
+    writes (build/upsert) are serialized and publish a new state whenever
+    the index changes. Moving a known entity rewrites its row and column
+    in place.
+    """
+
+    def __init__(self, dtype=np.float32, block_size=1024):
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._state = _DistanceState({}, np.zeros(0), np.zeros(0), np.zeros((0, 0), dtype=self.dtype), 0)
+
+    def __len__(self):
+        return self._state.size
+
+    def __contains__(self, key):
+        return key in self._state.index
+
+    @property
+    def nbytes(self):
+        return self._state.matrix.nbytes
+
+    def build(self, points):
+        """
+        Replace the table with the given points
+
+        points: iterable of ((entity_type, entity_id), lat, lon) in degrees
+        """
+        points = list(points)
+        index = {}
+        for key, _, _ in points:
+            index.setdefault(key, len(index))
+
+        lat = np.zeros(len(index))
+        lon = np.zeros(len(index))
+        for key, p_lat, p_lon in points:
+            lat[index[key]] = p_lat
+            lon[index[key]] = p_lon
+        lat = np.radians(lat)
+        lon = np.radians(lon)
+
+        matrix = np.empty((len(index), len(index)), dtype=self.dtype)
+        for start in range(0, len(index), self.block_size):
+            stop = min(start + self.block_size, len(index))
+            matrix[start:stop] = haversine_block(lat[start:stop], lon[start:stop], lat, lon)
+
+        with self._lock:
+            self._state = _DistanceState(index, lat, lon, matrix, len(index))
+
+    def upsert(self, key, lat, lon):
+        """Add a new entity or move an existing one, updating only its row and column"""
+        with self._lock:
+            state = self._state
+            idx = state.index.get(key)
+            lat_rad, lon_rad, matrix, n = state.lat, state.lon, state.matrix, state.size
+            if idx is None:
+                idx = n
+                n += 1
+                if idx >= len(lat_rad):
+                    # Grow by 25% so the N x N table never over-allocates by much
+                    lat_rad, lon_rad, matrix = self._grow(state, max(16, len(lat_rad) + len(lat_rad) // 4))
+
+            lat_rad[idx] = np.radians(lat)
+            lon_rad[idx] = np.radians(lon)
+            row = haversine_block(lat_rad[idx:idx + 1], lon_rad[idx:idx + 1], lat_rad[:n], lon_rad[:n])[0]
+            matrix[idx, :n] = row
+            matrix[:n, idx] = row
+
+            if key not in state.index:
+                # Publish the key only once its row/column is filled in
+                index = dict(state.index)
+                index[key] = idx
+                self._state = _DistanceState(index, lat_rad, lon_rad, matrix, n)
+
+    def _grow(self, state, capacity):
+        """Copies of state's storage with room for at least `capacity` entities; returns (lat, lon, matrix)"""
+        n = state.size
+        lat = np.zeros(capacity)
+        lon = np.zeros(capacity)
+        lat[:n] = state.lat[:n]
+        lon[:n] = state.lon[:n]
+        matrix = np.zeros((capacity, capacity), dtype=self.dtype)
+        matrix[:n, :n] = state.matrix[:n, :n]
+        return lat, lon, matrix
+
+    def distance(self, key_a, key_b):
+        """Distance in km between two entities; KeyError if either is unknown"""
+        state = self._state
+        return float(state.matrix[state.index[key_a], state.index[key_b]])
+
+    def distances_from(self, key, keys):
+        """Distances in km from one entity to each of `keys`, as a NumPy array"""
+        state = self._state
+        row = state.matrix[state.index[key]]
+        return row[[state.index[k] for k in keys]].astype(np.float64)
+
+    def block(self, keys_a, keys_b):
+        """len(keys_a) x len(keys_b) float64 sub-matrix of distances in km"""
+        state = self._state
+        index = state.index
+        rows = np.fromiter((index[k] for k in keys_a), dtype=np.intp, count=len(keys_a))
+        cols = np.fromiter((index[k] for k in keys_b), dtype=np.intp, count=len(keys_b))
+        return state.matrix[np.ix_(rows, cols)].astype(np.float64)
+
+    def gather(self, keys_a, keys_b, rows_a, rows_b):
+        """Distances in km between keys_a[rows_a[i]] and keys_b[rows_b[i]], as a float64 array"""
+        state = self._state
+        index = state.index
+        a = np.fromiter((index[k] for k in keys_a), dtype=np.intp, count=len(keys_a))
+        b = np.fromiter((index[k] for k in keys_b), dtype=np.intp, count=len(keys_b))
+        return state.matrix[a[rows_a], b[rows_b]].astype(np.float64)
@@ -0,0 +1,423 @@
+"""
+Live Freshness Tracker
+======================
+Per-batch freshness state updated incrementally from temperature
+readings, for batches in transit.
+
+- Decay is integrated piecewise: between two readings the batch decays
+  at the rate of the earlier reading's temperature (zero-order hold),
+  F <- F * exp(-rate(T) * hours)
+- rate(T): the cold-chain rate (decay_rate x cold_chain_factor) from
+  temp_min up to temp_optimal, growing by a factor q10 per 10 degrees
+  above temp_optimal (about the uncooled rate at 20 C), and by
+  chill_per_degree per degree below temp_min (chilling injury). A batch
+  held at temp_optimal decays exactly like calculate_freshness_score
+  with cold chain
+- Storage: parallel NumPy columns indexed by a batch id -> row dict,
+  grown by doubling; a finished batch's row is refilled by the last row,
+  so 100k concurrent batches take a few MB
+- Flags per batch: last reading out of range, any excursion so far,
+  projected below its threshold at arrival, below its threshold now,
+  no reading for `stale_hours`
+
+Readings reach the service through an append-only log of fixed-size
+records (written by chain_ingest.py, tailed by each worker with
+ReadingsTail) or are posted directly.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+# Flag bits reported per batch
+BREACH = 1       # last reading outside [temp_min, temp_max]
+EXCURSION = 2    # at least one reading outside the range so far
+AT_RISK = 4      # projected below the threshold at arrival
+SPOILED = 8      # below the threshold now
+STALE = 16       # no reading for stale_hours
+FLAGS = {'breach': BREACH, 'excursion': EXCURSION, 'at_risk': AT_RISK, 'spoiled': SPOILED, 'stale': STALE}
+
+# Assumed temperature of an uncooled batch before its first reading
+AMBIENT_TEMP = 20.0
+
+# One reading in the log: chain block, batch id, Unix seconds, Celsius
+READING_DTYPE = np.dtype([('block', '<i8'), ('batch_id', '<i8'), ('timestamp', '<f8'), ('temperature_c', '<f8')])
+
+# Readings log header, one record long: magic, random 8-byte generation, padding
+READINGS_LOG_MAGIC = b'FCREADS1'
+READINGS_LOG_HEADER_SIZE = READING_DTYPE.itemsize
+
+
+class FreshnessTracker:
+    """Freshness, exposure and projection per tracked batch, in array-backed storage"""
+
+    _COLUMNS = {
+        'batch_id': np.int64,
+        'freshness': np.float64,        # at last_ts
+        'last_ts': np.float64,
+        'last_temp': np.float64,
+        'assumed_temp': np.float32,     # before the first reading
+        'start_ts': np.float64,
+        'eta_ts': np.float64,           # NaN when the arrival time is unknown
+        'initial': np.float32,
+        'threshold': np.float32,
+        'excursion_hours': np.float32,
+        'readings': np.int32,
+        'breaches': np.int32
+    }
+
+    def __init__(self, decay_rate, cold_chain_factor, temp_min, temp_max, temp_optimal,
+                 q10=2.2, chill_per_degree=0.5, threshold=70.0, stale_hours=2.0, capacity=1024):
+        self.decay_rate = decay_rate
+        self.cold_chain_factor = cold_chain_factor
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.temp_optimal = temp_optimal
+        self.q10 = q10
+        self.chill_per_degree = chill_per_degree
+        self.threshold = threshold
+        self.stale_hours = stale_hours
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._clear()
+
+    def _clear(self):
+        self._columns = {name: np.zeros(self._capacity, dtype=dtype) for name, dtype in self._COLUMNS.items()}
+        self._index = {}
+        self._size = 0
+        self.accepted = 0
+        self.ignored = 0
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        if needed <= self._capacity:
+            return
+        while self._capacity < needed:
+            self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(self._capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    # --------------------------------------------
+    # Decay model
+    # --------------------------------------------
+
+    def decay_rates(self, temperature):
+        """Decay rate per hour (fraction) at each temperature"""
+        temperature = np.asarray(temperature, dtype=np.float64)
+        rate = self.decay_rate * self.cold_chain_factor
+        warm = self.q10 ** (np.maximum(temperature - self.temp_optimal, 0) / 10)
+        chill = 1 + self.chill_per_degree * np.maximum(self.temp_min - temperature, 0)
+        return rate * warm * chill
+
+    def _out_of_range(self, temperature):
+        return (temperature < self.temp_min) | (temperature > self.temp_max)
+
+    # --------------------------------------------
+    # Updates (called with _lock held below)
+    # --------------------------------------------
+
+    def _rows(self, batch_ids, start_ts, initial, threshold, assumed_temp, eta_ts=np.nan):
+        """Rows of batch_ids, adding unknown ones with the given (broadcast) starting state"""
+        index = self._index
+        rows = np.fromiter((index.get(b, -1) for b in batch_ids.tolist()), dtype=np.int64, count=len(batch_ids))
+        new = np.flatnonzero(rows < 0)
+        if len(new):
+            # Repeated new ids within one call get a single row
+            new_ids, first = np.unique(batch_ids[new], return_index=True)
+            new = new[first]
+            start = self._size
+            self._grow(start + len(new_ids))
+            added = np.arange(start, start + len(new_ids))
+            c = self._columns
+            c['batch_id'][added] = new_ids
+            c['start_ts'][added] = np.broadcast_to(start_ts, batch_ids.shape)[new]
+            c['last_ts'][added] = c['start_ts'][added]
+            c['initial'][added] = np.broadcast_to(initial, batch_ids.shape)[new]
+            c['freshness'][added] = c['initial'][added]
+            c['threshold'][added] = np.broadcast_to(threshold, batch_ids.shape)[new]
+            c['assumed_temp'][added] = np.broadcast_to(assumed_temp, batch_ids.shape)[new]
+            c['last_temp'][added] = c['assumed_temp'][added]
+            c['eta_ts'][added] = np.broadcast_to(eta_ts, batch_ids.shape)[new]
+            c['excursion_hours'][added] = 0
+            c['readings'][added] = 0
+            c['breaches'][added] = 0
+            self._size += len(new_ids)
+            index.update(zip(new_ids.tolist(), added.tolist()))
+            rows = np.fromiter((index[b] for b in batch_ids.tolist()), dtype=np.int64, count=len(batch_ids))
+        return rows
+
+    def track(self, batch_ids, start_ts, eta_ts=np.nan, initial=100.0, threshold=None, cold_chain=True):
+        """
+        Start tracking batches (columnar, scalars broadcast); already
+        tracked ones keep their state and only get the new eta and
+        threshold. Returns the number of batches added.
+        """
+        batch_ids = np.asarray(batch_ids, dtype=np.int64)
+        threshold = self.threshold if threshold is None else threshold
+        assumed = np.where(np.asarray(cold_chain, dtype=bool), float(self.temp_optimal), AMBIENT_TEMP)
+        with self._lock:
+            before = self._size
+            rows = self._rows(batch_ids, start_ts, initial, threshold, assumed, eta_ts)
+            c = self._columns
+            c['eta_ts'][rows] = np.broadcast_to(eta_ts, batch_ids.shape)
+            c['threshold'][rows] = np.broadcast_to(threshold, batch_ids.shape)
+            return self._size - before
+
+    def ingest(self, batch_ids, temperatures, timestamps):
+        """
+        Apply temperature readings (any order, any mix of batches); returns
+        (accepted, ignored). Readings older than a batch's last reading are
+        ignored; unknown batches start tracking at their first reading.
+        """
+        batch_ids = np.asarray(batch_ids, dtype=np.int64)
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(batch_ids) == 0:
+            return 0, 0
+        # Group by batch in time order: a new batch then starts at its earliest reading
+        order = np.lexsort((timestamps, batch_ids))
+        batch_ids, temperatures, timestamps = batch_ids[order], temperatures[order], timestamps[order]
+        with self._lock:
+            rows = self._rows(batch_ids, timestamps, 100.0, self.threshold, temperatures)
+            c = self._columns
+            keep = timestamps >= c['last_ts'][rows]
+            ignored = len(rows) - int(keep.sum())
+            rows, temperatures, timestamps = rows[keep], temperatures[keep], timestamps[keep]
+            if len(rows) == 0:
+                self.ignored += ignored
+                return 0, ignored
+
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            ends = np.r_[starts[1:], len(rows)] - 1
+            first = np.zeros(len(rows), dtype=bool)
+            first[starts] = True
+
+            # Each interval runs from the previous reading (or the stored state) to this one
+            previous_ts = np.where(first, c['last_ts'][rows], np.r_[np.nan, timestamps[:-1]])
+            previous_temp = np.where(first, c['last_temp'][rows], np.r_[np.nan, temperatures[:-1]])
+            hours = (timestamps - previous_ts) / 3600
+            exposure = self.decay_rates(previous_temp) * hours
+            excursion = np.where(self._out_of_range(previous_temp), hours, 0.0)
+            breach = self._out_of_range(temperatures)
+
+            touched = rows[starts]
+            c['freshness'][touched] *= np.exp(-np.add.reduceat(exposure, starts))
+            c['excursion_hours'][touched] += np.add.reduceat(excursion, starts)
+            c['readings'][touched] += (ends - starts + 1).astype(np.int32)
+            c['breaches'][touched] += np.add.reduceat(breach.astype(np.int32), starts)
+            c['last_ts'][touched] = timestamps[ends]
+            c['last_temp'][touched] = temperatures[ends]
+            self.accepted += len(rows)
+            self.ignored += ignored
+            return len(rows), ignored
+
+    def finish(self, batch_id):
+        """Stop tracking a batch (delivered); returns False when it was not tracked"""
+        with self._lock:
+            row = self._index.pop(batch_id, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            if row != last:
+                for column in self._columns.values():
+                    column[row] = column[last]
+                self._index[int(self._columns['batch_id'][row])] = row
+            self._size = last
+            return True
+
+    def restart(self):
+        """Forget all readings (the readings log was rewritten); tracked batches restart from their start"""
+        with self._lock:
+            c = self._columns
+            n = self._size
+            c['freshness'][:n] = c['initial'][:n]
+            c['last_ts'][:n] = c['start_ts'][:n]
+            c['last_temp'][:n] = c['assumed_temp'][:n]
+            c['excursion_hours'][:n] = 0
+            c['readings'][:n] = 0
+            c['breaches'][:n] = 0
+            self.accepted = self.ignored = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    # --------------------------------------------
+    # Queries
+    # --------------------------------------------
+
+    def query(self, batch_ids=None, now=None, flags=0, limit=None, offset=0):
+        """
+        Columnar state of tracked batches at time `now` (default: current
+        time), ordered by hours to threshold, soonest first
+
+        batch_ids: only these (unknown ids are reported in 'missing');
+        flags: only batches with any of these flag bits.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            n = self._size
+            c = {name: column[:n] for name, column in self._columns.items()}
+            if batch_ids is not None:
+                rows = [self._index.get(int(b), -1) for b in batch_ids]
+                missing = [int(b) for b, row in zip(batch_ids, rows) if row < 0]
+                rows = np.array([row for row in rows if row >= 0], dtype=np.int64)
+            else:
+                missing = []
+                rows = np.arange(n)
+            c = {name: column[rows] for name, column in c.items()}
+
+        rate = self.decay_rates(c['last_temp'])
+        freshness_now = c['freshness'] * np.exp(-rate * np.maximum(now - c['last_ts'], 0) / 3600)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            projected = c['freshness'] * np.exp(-rate * np.maximum(c['eta_ts'] - c['last_ts'], 0) / 3600)
+            projected = np.where(np.isnan(c['eta_ts']), np.nan, projected)
+            hours_left = np.maximum(np.log(freshness_now / c['threshold']), 0) / rate
+
+        row_flags = np.zeros(len(rows), dtype=np.int64)
+        row_flags |= np.where(self._out_of_range(c['last_temp']) & (c['readings'] > 0), BREACH, 0)
+        row_flags |= np.where(c['breaches'] > 0, EXCURSION, 0)
+        with np.errstate(invalid='ignore'):
+            row_flags |= np.where((projected < c['threshold']) & (freshness_now >= c['threshold']), AT_RISK, 0)
+        row_flags |= np.where(freshness_now < c['threshold'], SPOILED, 0)
+        row_flags |= np.where((c['readings'] > 0) & (now - c['last_ts'] > self.stale_hours * 3600), STALE, 0)
+
+        summary = {name: int(np.count_nonzero(row_flags & bit)) for name, bit in FLAGS.items()}
+        selected = np.flatnonzero(row_flags & flags) if flags else np.arange(len(rows))
+        selected = selected[np.argsort(hours_left[selected], kind='stable')]
+        total = len(selected)
+        selected = selected[offset:None if limit is None else offset + limit]
+
+        return {
+            'total': total,
+            'count': len(selected),
+            'summary': summary,
+            'missing': missing,
+            'batch_id': c['batch_id'][selected],
+            'freshness': np.round(freshness_now[selected], 3),
+            'projected_arrival_freshness': np.round(projected[selected], 3),
+            'hours_to_threshold': np.round(hours_left[selected], 3),
+            'threshold': c['threshold'][selected].astype(np.float64),
+            'eta': c['eta_ts'][selected],
+            'last_temperature_c': c['last_temp'][selected],
+            'last_reading_at': np.where(c['readings'][selected] > 0, c['last_ts'][selected], np.nan),
+            'excursion_hours': np.round(c['excursion_hours'][selected].astype(np.float64), 3),
+            'readings': c['readings'][selected],
+            'breaches': c['breaches'][selected],
+            'flags': row_flags[selected]
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked_batches': self._size,
+                'capacity': self._capacity,
+                'bytes': sum(column.nbytes for column in self._columns.values()),
+                'readings_accepted': self.accepted,
+                'readings_ignored': self.ignored
+            }
+
+
+# --------------------------------------------
+# Readings log
+# --------------------------------------------
+
+def _log_generation(f):
+    """Generation id from an open readings log's header, None without a valid header"""
+    header = f.read(READINGS_LOG_HEADER_SIZE)
+    if len(header) < READINGS_LOG_HEADER_SIZE or not header.startswith(READINGS_LOG_MAGIC):
+        return None
+    return header[len(READINGS_LOG_MAGIC):len(READINGS_LOG_MAGIC) + 8]
+
+
+class ReadingsLog:
+    """
+    Append-only file of READING_DTYPE records in chain order (writer side)
+
+    The records follow a header with a random generation id. Records are
+    only ever dropped by replacing the file with a copy under a new
+    generation, which readers notice however far the new log has grown.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            with open(path, 'rb') as f:
+                generation = _log_generation(f)
+        except FileNotFoundError:
+            generation = None
+        if generation is None:
+            # New file, or a log written before headers: keep its records
+            records = np.fromfile(path, dtype=READING_DTYPE) if os.path.exists(path) else []
+            self._rewrite(records)
+
+    def _rewrite(self, records):
+        """Replace the log with records under a new generation"""
+        temp = f'{self.path}.tmp{os.getpid()}'
+        with open(temp, 'wb') as f:
+            f.write(READINGS_LOG_MAGIC + os.urandom(8))
+            f.write(bytes(READINGS_LOG_HEADER_SIZE - len(READINGS_LOG_MAGIC) - 8))
+            f.write(np.asarray(records, dtype=READING_DTYPE).tobytes())
+        os.replace(temp, self.path)
+
+    def append(self, readings):
+        """readings: [(batch_id, temperature_c, is_breach, timestamp, block), ...]"""
+        records = np.empty(len(readings), dtype=READING_DTYPE)
+        batch_id, temperature, _, timestamp, block = zip(*readings)
+        records['block'] = block
+        records['batch_id'] = batch_id
+        records['timestamp'] = timestamp
+        records['temperature_c'] = temperature
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+
+    def truncate_after(self, block):
+        """Drop records past a block (they were written after the last checkpoint)"""
+        records = np.fromfile(self.path, dtype=READING_DTYPE, offset=READINGS_LOG_HEADER_SIZE)
+        keep = int(np.searchsorted(records['block'], block, side='right'))
+        if keep < len(records):
+            self._rewrite(records[:keep])
+
+
+class ReadingsTail:
+    """Reads records appended to a readings log since the last poll (reader side)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = None
+        self.offset = READINGS_LOG_HEADER_SIZE
+
+    def poll(self):
+        """
+        (records, restarted): restarted is True when the log was replaced
+        (a new generation) and is read from the start again
+        """
+        empty = np.zeros(0, dtype=READING_DTYPE)
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return empty, False
+        with f:
+            # Header and size from one open file: a concurrent replace cannot mix generations
+            generation = _log_generation(f)
+            if generation is None:
+                return empty, False
+            restarted = self.generation is not None and generation != self.generation
+            if generation != self.generation:
+                self.generation = generation
+                self.offset = READINGS_LOG_HEADER_SIZE
+            size = os.fstat(f.fileno()).st_size
+            size -= (size - self.offset) % READING_DTYPE.itemsize  # whole records only
+            if size <= self.offset:
+                return empty, restarted
+            f.seek(self.offset)
+            records = np.frombuffer(f.read(size - self.offset), dtype=READING_DTYPE)
+        self.offset = size
+        return records, restarted
@@ -0,0 +1,247 @@
+"""
+Job Queue
+=========
+In-process asynchronous job queue for long-running optimizations.
+
+Jobs are queued on a bounded FIFO and executed by a small pool of
+daemon worker threads, so an HTTP request can return a job id at once
+and the client polls for the result instead of holding a worker open
+for the whole solve.
+
+- Bounded: submit() raises QueueFullError once `max_queued` jobs wait
+- Cancellable: queued jobs are dropped before they start; running jobs
+  see job.cancelled and may stop at their next checkpoint, and their
+  result is discarded either way
+- Finished jobs are kept for `retention` seconds for polling
+- Queue depth, wait time and run time are tracked for pool sizing
+
+State lives in the process: with several gunicorn workers a job is only
+visible to the worker that accepted it.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function to stop at a cancellation checkpoint"""
+
+
+class Job:
+    """One unit of work and its lifecycle timestamps"""
+
+    def __init__(self, kind, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        """True once cancellation has been requested"""
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Checkpoint for job functions: raise JobCancelled if cancellation was requested"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @property
+    def wait_seconds(self):
+        if self.started_at is None:
+            end = self.finished_at or time.time()
+        else:
+            end = self.started_at
+        return end - self.submitted_at
+
+    @property
+    def run_seconds(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        """Status view of the job (without the result payload)"""
+        run_seconds = self.run_seconds
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'wait_seconds': round(self.wait_seconds, 6),
+            'run_seconds': None if run_seconds is None else round(run_seconds, 6)
+        }
+
+
+def _summary(samples):
+    """mean / p50 / p95 / max of recent durations in seconds"""
+    if not samples:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'max': None}
+    values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+    p50, p95 = np.percentile(values, [50, 95])
+    return {
+        'count': len(values),
+        'mean': round(float(values.mean()), 6),
+        'p50': round(float(p50), 6),
+        'p95': round(float(p95), 6),
+        'max': round(float(values.max()), 6)
+    }
+
+
+class JobQueue:
+    """
+    Bounded FIFO of jobs served by `workers` threads
+
+    Job functions are called as fn(job, *args, **kwargs) and return the
+    job result; they may set job.progress and call job.check_cancelled().
+    Worker threads start lazily on the first submit, so importing the
+    module (or forking a process pool) never spawns threads.
+    """
+
+    def __init__(self, workers=2, max_queued=100, retention=600.0, sample_window=1000):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._threads = []
+        self._queued = 0
+        self._running = 0
+        self._wait_samples = deque(maxlen=sample_window)
+        self._run_samples = deque(maxlen=sample_window)
+        self.counts = {'submitted': 0, 'rejected': 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    def _start_workers(self):
+        """Spawn the worker threads (caller holds the lock)"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _prune(self, now):
+        """Forget finished jobs older than the retention period (caller holds the lock)"""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATES and now - job.finished_at > self.retention
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); returns the Job"""
+        job = Job(kind, fn, args, kwargs)
+        with self._lock:
+            if self._queued >= self.max_queued:
+                self.counts['rejected'] += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._prune(job.submitted_at)
+            self._jobs[job.id] = job
+            self._queued += 1
+            self.counts['submitted'] += 1
+            self._start_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """Job by id, or None if unknown or expired"""
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Request cancellation; returns the Job, or None if unknown
+
+        A queued job is cancelled immediately. A running job is marked and
+        finishes as cancelled; finished jobs are left unchanged.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+                self._queued -= 1
+        return job
+
+    def _finish(self, job, status, result=None, error=None):
+        """Record the outcome of a job (caller holds the lock)"""
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job._fn = job._args = job._kwargs = None
+        self.counts[status] += 1
+        if job.started_at is not None:
+            self._run_samples.append(job.finished_at - job.started_at)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != QUEUED:
+                    # Cancelled while waiting
+                    continue
+                self._queued -= 1
+                self._running += 1
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._wait_samples.append(job.started_at - job.submitted_at)
+
+            status, result, error = SUCCEEDED, None, None
+            try:
+                result = job._fn(job, *job._args, **job._kwargs)
+            except JobCancelled:
+                status = CANCELLED
+            except Exception as e:
+                status, error = FAILED, str(e)
+
+            with self._lock:
+                self._running -= 1
+                if job.cancelled:
+                    status, result, error = CANCELLED, None, None
+                self._finish(job, status, result, error)
+
+    def stats(self):
+        """Queue depth, job counts and recent wait / run time distributions"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queued': self.max_queued,
+                'queued': self._queued,
+                'running': self._running,
+                'retained_jobs': len(self._jobs),
+                'counts': dict(self.counts),
+                'wait_seconds': _summary(self._wait_samples),
+                'run_seconds': _summary(self._run_samples)
+            }
@@ -0,0 +1,297 @@
+"""
+Capacity Ledger
+===============
+Thread-safe record of committed loads on transporters and facilities,
+so concurrent optimizations see each other's bookings.
+
+- A booking holds one or more legs: (resource, quantity, time window)
+  where a resource is an (entity_type, entity_id) pair and windows are
+  half-open [start, end) in Unix seconds
+- Booked load of a resource over a window is the peak of its
+  overlapping legs (sweep over that resource's legs only)
+- Optimistic concurrency: every resource has a version that changes
+  with each booking, release and expiry touching it; reserve() can
+  require the versions a caller planned with and raises
+  CapacityConflictError when any moved on, so the caller re-plans
+- Expiry: bookings leave the ledger once their last window ends, popped
+  from a min-heap on end time (released bookings are skipped lazily)
+- Optional SQLite persistence (write-through, WAL) so bookings survive
+  a restart
+
+State lives in the process: with several gunicorn workers each worker
+keeps its own ledger (a shared SQLite file is only read at start-up).
+"""
+
+import heapq
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class CapacityConflictError(RuntimeError):
+    """Raised when a resource changed since the caller read its version"""
+
+
+class CapacityExceededError(ValueError):
+    """Raised when a leg does not fit in the remaining capacity of its resource"""
+
+
+def peak_load(legs, start, end):
+    """Highest total quantity of (quantity, start, end) legs overlapping at any instant of [start, end)"""
+    events = []
+    for quantity, leg_start, leg_end in legs:
+        if leg_start < end and leg_end > start:
+            events.append((max(leg_start, start), quantity))
+            events.append((min(leg_end, end), -quantity))
+    # At equal times releases sort first: windows are half-open
+    events.sort()
+    peak = load = 0
+    for _, delta in events:
+        load += delta
+        peak = max(peak, load)
+    return peak
+
+
+class CapacityLedger:
+    """Bookings per resource with time windows, versions and heap-indexed expiry"""
+
+    def __init__(self, path=None, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._bookings = {}  # booking id -> booking dict
+        self._by_resource = {}  # resource -> {booking id: (quantity, start, end)}
+        self._versions = {}  # resource -> version
+        self._expiry = []  # heap of (end, booking id)
+        self.version = 0
+        self.booked = 0
+        self.released = 0
+        self.expired = 0
+        self.conflicts = 0
+        self.rejected = 0
+        self._db = None
+        if path:
+            self._open_db(path)
+
+    # --------------------------------------------
+    # Persistence
+    # --------------------------------------------
+
+    def _open_db(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS reservations ('
+            'booking_id TEXT NOT NULL, entity_type TEXT NOT NULL, entity_id NOT NULL, '
+            'quantity REAL NOT NULL, window_start REAL NOT NULL, window_end REAL NOT NULL, '
+            'created_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS reservations_booking ON reservations (booking_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS reservations_end ON reservations (window_end)')
+        now = self.clock()
+        self._db.execute('DELETE FROM reservations WHERE window_end <= ?', (now,))
+        legs = {}
+        for booking_id, entity_type, entity_id, quantity, start, end, created_at in self._db.execute(
+            'SELECT booking_id, entity_type, entity_id, quantity, window_start, window_end, created_at '
+            'FROM reservations ORDER BY rowid'
+        ):
+            legs.setdefault(booking_id, (created_at, []))[1].append({
+                'entity_type': entity_type, 'entity_id': entity_id,
+                'quantity': quantity, 'start': start, 'end': end
+            })
+        for booking_id, (created_at, booking_legs) in legs.items():
+            self._add(booking_id, booking_legs, created_at)
+
+    def _persist(self, booking):
+        if self._db is None:
+            return
+        self._db.executemany(
+            'INSERT INTO reservations VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (booking['booking_id'], leg['entity_type'], leg['entity_id'],
+                 leg['quantity'], leg['start'], leg['end'], booking['created_at'])
+                for leg in booking['legs']
+            ]
+        )
+
+    def _unpersist(self, booking_ids):
+        if self._db is not None and booking_ids:
+            self._db.executemany('DELETE FROM reservations WHERE booking_id = ?', [(b,) for b in booking_ids])
+
+    # --------------------------------------------
+    # Index maintenance (called with _lock held)
+    # --------------------------------------------
+
+    def _touch(self, resource):
+        self._versions[resource] = self._versions.get(resource, 0) + 1
+        self.version += 1
+
+    def _add(self, booking_id, legs, created_at):
+        booking = {
+            'booking_id': booking_id,
+            'legs': legs,
+            'created_at': created_at,
+            'expires_at': max(leg['end'] for leg in legs)
+        }
+        self._bookings[booking_id] = booking
+        for leg in legs:
+            resource = (leg['entity_type'], leg['entity_id'])
+            self._by_resource.setdefault(resource, {})[booking_id] = (leg['quantity'], leg['start'], leg['end'])
+            self._touch(resource)
+        heapq.heappush(self._expiry, (booking['expires_at'], booking_id))
+        return booking
+
+    def _remove(self, booking_id):
+        booking = self._bookings.pop(booking_id)
+        for leg in booking['legs']:
+            resource = (leg['entity_type'], leg['entity_id'])
+            legs = self._by_resource[resource]
+            del legs[booking_id]
+            if not legs:
+                del self._by_resource[resource]
+            self._touch(resource)
+        return booking
+
+    def _expire(self):
+        now = self.clock()
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            _, booking_id = heapq.heappop(self._expiry)
+            if booking_id in self._bookings:
+                self._remove(booking_id)
+                expired.append(booking_id)
+        self.expired += len(expired)
+        self._unpersist(expired)
+
+    def _booked(self, resource, start, end):
+        legs = self._by_resource.get(resource)
+        return peak_load(legs.values(), start, end) if legs else 0
+
+    # --------------------------------------------
+    # Reads
+    # --------------------------------------------
+
+    def current_version(self):
+        """Ledger-wide version, after dropping expired bookings"""
+        with self._lock:
+            self._expire()
+            return self.version
+
+    def __len__(self):
+        with self._lock:
+            self._expire()
+            return len(self._bookings)
+
+    def availability(self, windows):
+        """
+        Booked load and version per resource
+
+        windows: {resource: (start, end)}. Returns {resource: (booked, version)}.
+        """
+        with self._lock:
+            self._expire()
+            return {
+                resource: (self._booked(resource, start, end), self._versions.get(resource, 0))
+                for resource, (start, end) in windows.items()
+            }
+
+    def get(self, booking_id):
+        with self._lock:
+            self._expire()
+            booking = self._bookings.get(booking_id)
+            return None if booking is None else dict(booking, legs=[dict(leg) for leg in booking['legs']])
+
+    def bookings(self, entity_type=None, entity_id=None):
+        """Active bookings, optionally only those with a leg on one entity type or resource"""
+        with self._lock:
+            self._expire()
+            if entity_type is not None and entity_id is not None:
+                ids = list(self._by_resource.get((entity_type, entity_id), ()))
+            else:
+                ids = [
+                    booking_id for booking_id, booking in self._bookings.items()
+                    if entity_type is None or any(leg['entity_type'] == entity_type for leg in booking['legs'])
+                ]
+            return [dict(self._bookings[b], legs=[dict(leg) for leg in self._bookings[b]['legs']]) for b in ids]
+
+    # --------------------------------------------
+    # Writes
+    # --------------------------------------------
+
+    def reserve(self, legs, expected_versions=None):
+        """
+        Book all legs atomically; returns the booking
+
+        legs: [{'entity_type', 'entity_id', 'quantity', 'start', 'end',
+        'capacity'}], at most one leg per resource; capacity None means
+        unlimited. expected_versions: {resource: version} as read from
+        availability(). Raises CapacityConflictError when a version moved
+        on and CapacityExceededError when a leg no longer fits.
+        """
+        resources = [(leg['entity_type'], leg['entity_id']) for leg in legs]
+        if not legs or len(set(resources)) != len(resources):
+            raise ValueError("A booking needs one leg per resource")
+        for leg in legs:
+            if not leg['quantity'] > 0 or not leg['end'] > leg['start']:
+                raise ValueError("Legs need a positive quantity and a non-empty window")
+
+        with self._lock:
+            self._expire()
+            for resource, version in (expected_versions or {}).items():
+                if self._versions.get(resource, 0) != version:
+                    self.conflicts += 1
+                    raise CapacityConflictError(f"{resource[0]} {resource[1]} was booked concurrently")
+            for resource, leg in zip(resources, legs):
+                if leg.get('capacity') is None:
+                    continue
+                booked = self._booked(resource, leg['start'], leg['end'])
+                if booked + leg['quantity'] > leg['capacity']:
+                    self.rejected += 1
+                    raise CapacityExceededError(
+                        f"{resource[0]} {resource[1]} has {max(leg['capacity'] - booked, 0)} "
+                        f"units left in the window, {leg['quantity']} requested"
+                    )
+
+            booking = self._add(uuid.uuid4().hex, [
+                {key: leg[key] for key in ('entity_type', 'entity_id', 'quantity', 'start', 'end')}
+                for leg in legs
+            ], self.clock())
+            self._persist(booking)
+            self.booked += 1
+            return dict(booking, legs=[dict(leg) for leg in booking['legs']])
+
+    def release(self, booking_id):
+        """Cancel a booking; returns it, or None when unknown or already expired"""
+        with self._lock:
+            self._expire()
+            if booking_id not in self._bookings:
+                return None
+            booking = self._remove(booking_id)
+            self._unpersist([booking_id])
+            self.released += 1
+            return booking
+
+    def clear(self):
+        with self._lock:
+            for booking_id in list(self._bookings):
+                self._remove(booking_id)
+            self._expiry.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM reservations')
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            return {
+                'active_bookings': len(self._bookings),
+                'resources': len(self._by_resource),
+                'version': self.version,
+                'booked': self.booked,
+                'released': self.released,
+                'expired': self.expired,
+                'conflicts': self.conflicts,
+                'rejected': self.rejected,
+                'persistent': self._db is not None
+            }
@@ -0,0 +1,262 @@
+"""
+Service Metrics
+===============
+Low-overhead counters, histograms and per-request phase timers,
+rendered in the Prometheus text exposition format.
+
+- Counter / Histogram: labelled series behind one lock each; a
+  histogram observation is a bisect into fixed buckets
+- Collectors: callables sampled at scrape time (cache and queue stats)
+- Phase timers: begin_request() binds a RequestTimings to the current
+  context; `with phase('solve'):` blocks anywhere below it add their
+  elapsed time, and are free no-ops outside a request
+
+Metrics are per process: each gunicorn worker exposes its own series.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(float(bound)))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics plus scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Register collector() -> [(name, type, help, [(labels_dict, value), ...]), ...],
+        called on every scrape
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# ============================================
+# PROCESS-WIDE METRICS
+# ============================================
+
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.histogram(
+    'milp_request_duration_seconds', 'Request latency by endpoint, priority and HTTP status',
+    ('endpoint', 'priority', 'status')
+)
+PHASE_SECONDS = METRICS.histogram(
+    'milp_phase_duration_seconds', 'Time spent per request phase',
+    ('endpoint', 'priority', 'phase')
+)
+SOLVER_SECONDS = METRICS.histogram(
+    'milp_solver_duration_seconds', 'Wall time of MILP solver runs', ('backend',)
+)
+SOLVER_SOLVES = METRICS.counter(
+    'milp_solver_solves_total', 'MILP solver runs by backend and final status', ('backend', 'status')
+)
+ROUTE_OUTCOMES = METRICS.counter(
+    'milp_route_results_total', 'optimize_route outcomes by engine and status', ('engine', 'status')
+)
+
+
+# ============================================
+# PER-REQUEST PHASE TIMERS
+# ============================================
+
+class RequestTimings:
+    """Accumulated phase durations of one request (or background job)"""
+
+    __slots__ = ('endpoint', 'priority', 'start', 'phases')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.priority = ''
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def to_dict(self):
+        return {
+            'total_seconds': round(time.perf_counter() - self.start, 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()}
+        }
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def begin_request(endpoint):
+    """Start timing a request in the current context"""
+    timings = RequestTimings(endpoint)
+    _current.set(timings)
+    return timings
+
+
+def current_timings():
+    """RequestTimings of the current context, or None"""
+    return _current.get()
+
+
+def end_request(status):
+    """Record the current request's latency and phases; returns its RequestTimings"""
+    timings = _current.get()
+    if timings is None:
+        return None
+    _current.set(None)
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - timings.start,
+        endpoint=timings.endpoint, priority=timings.priority, status=str(status)
+    )
+    for name, seconds in timings.phases.items():
+        PHASE_SECONDS.observe(seconds, endpoint=timings.endpoint, priority=timings.priority, phase=name)
+    return timings
+
+
+@contextmanager
+def track(endpoint):
+    """begin_request / end_request around a block, for work outside an HTTP request"""
+    previous = _current.get()
+    timings = begin_request(endpoint)
+    status = 'error'
+    try:
+        yield timings
+        status = 'ok'
+    finally:
+        end_request(status)
+        _current.set(previous)
+
+
+@contextmanager
+def phase(name):
+    """Add the block's elapsed time to phase `name` of the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
@@ -0,0 +1,548 @@
+"""
+Multi-Echelon Network Flow Model
+================================
+Routes product from harvesters through distributors and wholesalers to
+retailers in a single MILP.
+
+Decision variables (one set per arc = source node x destination node x transporter):
+- f[a] >= 0          units shipped on the arc
+- n[a] in Z+         truck trips on the arc (f[a] <= capacity * n[a])
+- y[a] in {0,1}      lane used (only when cumulative freshness limits bind)
+
+Constraints:
+- Harvester supply and distributor/wholesaler throughput capacities
+- Flow conservation at distributors and wholesalers
+- Retailer demand satisfaction
+- Cold-storage continuity (non-refrigerated nodes/vehicles excluded when
+  cold chain is required, and decaying at the full rate otherwise)
+- Cumulative elapsed time and freshness decay along every used path,
+  modelled with node potentials
+
+Arc data is generated and pruned with NumPy; constraints are assembled
+from grouped index arrays into LpAffineExpressions directly, avoiding
+per-term lpSum loops, so networks with thousands of nodes and tens of
+thousands of arcs build in seconds.
+"""
+
+import math
+import time
+
+import numpy as np
+from pulp import (
+    LpAffineExpression, LpConstraint, LpConstraintEQ, LpConstraintGE, LpConstraintLE,
+    LpMinimize, LpProblem, LpVariable
+)
+
+from metrics import phase
+from solvers import solve
+
+ECHELONS = ('harvester', 'distributor', 'wholesaler', 'retailer')
+HARVESTER, DISTRIBUTOR, WHOLESALER, RETAILER = range(4)
+
+DIRECT_LEGS = ((HARVESTER, DISTRIBUTOR), (DISTRIBUTOR, WHOLESALER), (WHOLESALER, RETAILER))
+BYPASS_LEGS = ((HARVESTER, WHOLESALER), (HARVESTER, RETAILER), (DISTRIBUTOR, RETAILER))
+
+FLOW_EPSILON = 1e-6
+
+
+def _group(keys, num_groups):
+    """Split arc indices by key: returns a list with one index array per group"""
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(num_groups + 1))
+    return [order[bounds[g]:bounds[g + 1]] for g in range(num_groups)]
+
+
+def _expression(variables, indices, coefficients):
+    """LpAffineExpression over variables[indices] with matching coefficients"""
+    return LpAffineExpression([(variables[i], c) for i, c in zip(indices.tolist(), coefficients.tolist())])
+
+
+def build_network(
+    nodes,
+    transporters,
+    distance_block,
+    demands,
+    freshness_life_hours,
+    require_cold_chain=False,
+    allow_bypass=False,
+    dwell_hours=6.0,
+    min_arrival_freshness=None,
+    decay_rate=0.015,
+    cold_chain_factor=0.3,
+    max_inbound_arcs=None,
+    nearby_pairs=None
+):
+    """
+    Build node and arc arrays for the network
+
+    nodes:          {echelon name: [entity record, ...]}
+    transporters:   transporter records, each with a 'route_factor'
+    distance_block: fn(source_type, source_ids, dest_type, dest_ids) -> km matrix
+    demands:        {retailer_id: quantity}
+    max_inbound_arcs: optional heuristic cap on arcs into each node per
+                    source echelon and transporter (nearest first)
+    nearby_pairs:   optional fn(source_type, source_ids, dest_type, dest_ids,
+                    radius_km) -> (source rows, dest rows, km), sorted by
+                    source then dest row, listing only pairs within
+                    radius_km; used instead of the dense distance_block
+                    unless it returns None
+
+    Arcs that cannot lie on any path meeting the elapsed-time and
+    freshness budgets are pruned exactly before the model is built. With
+    nearby_pairs, pairs farther apart than any transporter could cover
+    within those budgets are never generated; they would fail the same
+    test, so the model (and its optimum) does not change.
+    """
+    # ---- Nodes (one global index across echelons) ----
+    node_echelon, node_id, node_capacity, node_cost, node_quality, node_cold = [], [], [], [], [], []
+    for echelon, entity_type in enumerate(ECHELONS):
+        for e in nodes.get(entity_type, []):
+            if echelon == RETAILER and e['id'] not in demands:
+                continue
+            node_echelon.append(echelon)
+            node_id.append(e['id'])
+            node_capacity.append(demands[e['id']] if echelon == RETAILER else e.get('capacity', 0))
+            node_cost.append(e.get('cost_per_unit', 0))
+            node_quality.append(e.get('quality', 1.0))
+            # Harvest fields have no cold store; product leaves on the vehicle
+            node_cold.append(bool(e.get('cold_storage', echelon == HARVESTER)))
+
+    node_echelon = np.array(node_echelon, dtype=np.int8)
+    node_capacity = np.array(node_capacity, dtype=np.float64)
+    node_cost = np.array(node_cost, dtype=np.float64)
+    node_quality = np.array(node_quality, dtype=np.float64)
+    node_cold = np.array(node_cold, dtype=bool)
+    num_nodes = len(node_echelon)
+
+    # Handling dwell at intermediate nodes, and its freshness-equivalent decay hours
+    node_dwell = np.where((node_echelon == DISTRIBUTOR) | (node_echelon == WHOLESALER), dwell_hours, 0.0)
+    node_dwell_decay = node_dwell * np.where(node_cold, cold_chain_factor, 1.0)
+
+    # Cold-storage continuity: intermediate nodes must be refrigerated
+    node_allowed = np.ones(num_nodes, dtype=bool)
+    if require_cold_chain:
+        node_allowed &= node_cold | (node_echelon == HARVESTER) | (node_echelon == RETAILER)
+
+    # ---- Transporters ----
+    fleet_index = [i for i, t in enumerate(transporters) if t['cold_chain'] or not require_cold_chain]
+    fleet = [transporters[i] for i in fleet_index]
+    t_index = np.array(fleet_index, dtype=np.int64)
+    t_speed = np.array([t['speed_kmph'] for t in fleet], dtype=np.float64)
+    t_cost = np.array([t['cost_per_km'] for t in fleet], dtype=np.float64)
+    t_capacity = np.array([t['capacity'] for t in fleet], dtype=np.float64)
+    t_quality = np.array([t['quality'] for t in fleet], dtype=np.float64)
+    t_cold = np.array([t['cold_chain'] for t in fleet], dtype=bool)
+    t_factor = np.array([t.get('route_factor', 1.0) for t in fleet], dtype=np.float64)
+
+    time_budget = freshness_life_hours * 0.7  # Leave 30% buffer, as in the single-route model
+    if min_arrival_freshness:
+        decay_budget = -math.log(min_arrival_freshness / 100) / decay_rate
+    else:
+        decay_budget = math.inf
+
+    # ---- Arcs, generated per leg by broadcasting (source x dest x transporter) ----
+    legs = DIRECT_LEGS + (BYPASS_LEGS if allow_bypass else ())
+    arc_parts = []
+    pairs_generated = 0
+    for src_echelon, dst_echelon in legs:
+        src_nodes = np.flatnonzero((node_echelon == src_echelon) & node_allowed)
+        dst_nodes = np.flatnonzero((node_echelon == dst_echelon) & node_allowed)
+        if len(src_nodes) == 0 or len(dst_nodes) == 0 or len(fleet) == 0:
+            continue
+
+        src_type, src_ids = ECHELONS[src_echelon], [node_id[i] for i in src_nodes]
+        dst_type, dst_ids = ECHELONS[dst_echelon], [node_id[i] for i in dst_nodes]
+        num_src, num_dst, num_t = len(src_nodes), len(dst_nodes), len(fleet)
+        nearby = None
+        if nearby_pairs is not None:
+            radius = _leg_radius(
+                src_echelon, dst_echelon, allow_bypass, node_echelon, node_allowed,
+                node_dwell, node_dwell_decay, time_budget, decay_budget,
+                t_speed, t_factor, np.where(t_cold, cold_chain_factor, 1.0)
+            )
+            if radius < 0:
+                continue
+            nearby = nearby_pairs(src_type, src_ids, dst_type, dst_ids, radius)
+
+        if nearby is None:
+            distance = distance_block(src_type, src_ids, dst_type, dst_ids)
+            src = np.broadcast_to(src_nodes[:, None, None], (num_src, num_dst, num_t)).ravel()
+            dst = np.broadcast_to(dst_nodes[None, :, None], (num_src, num_dst, num_t)).ravel()
+            veh = np.broadcast_to(np.arange(num_t)[None, None, :], (num_src, num_dst, num_t)).ravel()
+            dist = (distance[:, :, None] * t_factor[None, None, :]).ravel()
+            pairs_generated += num_src * num_dst
+        else:
+            src_rows, dst_rows, distance = nearby
+            src = np.repeat(src_nodes[src_rows], num_t)
+            dst = np.repeat(dst_nodes[dst_rows], num_t)
+            veh = np.tile(np.arange(num_t), len(distance))
+            dist = (distance[:, None] * t_factor[None, :]).ravel()
+            pairs_generated += len(distance)
+
+        if max_inbound_arcs is not None and num_src > max_inbound_arcs:
+            # Keep the nearest sources per (destination, transporter)
+            group = dst * num_t + veh
+            order = np.lexsort((dist, group))
+            sorted_group = group[order]
+            starts = np.searchsorted(sorted_group, sorted_group, side='left')
+            rank = np.arange(len(order)) - starts
+            keep = order[rank < max_inbound_arcs]
+            src, dst, veh, dist = src[keep], dst[keep], veh[keep], dist[keep]
+
+        arc_parts.append((src, dst, veh, dist))
+
+    if arc_parts:
+        arc_src = np.concatenate([p[0] for p in arc_parts])
+        arc_dst = np.concatenate([p[1] for p in arc_parts])
+        arc_veh = np.concatenate([p[2] for p in arc_parts])
+        arc_distance = np.concatenate([p[3] for p in arc_parts])
+    else:
+        arc_src = arc_dst = arc_veh = np.zeros(0, dtype=np.int64)
+        arc_distance = np.zeros(0)
+
+    arc_transit = arc_distance / t_speed[arc_veh]
+    arc_decay = arc_transit * np.where(t_cold[arc_veh], cold_chain_factor, 1.0)
+
+    # ---- Exact pruning against the elapsed-time / freshness budgets ----
+    arc_time_step = node_dwell[arc_src] + arc_transit
+    arc_decay_step = node_dwell_decay[arc_src] + arc_decay
+    fwd_time = _shortest_forward(arc_src, arc_dst, arc_time_step, node_echelon)
+    bwd_time = _shortest_backward(arc_src, arc_dst, arc_time_step, node_echelon)
+    fwd_decay = _shortest_forward(arc_src, arc_dst, arc_decay_step, node_echelon)
+    bwd_decay = _shortest_backward(arc_src, arc_dst, arc_decay_step, node_echelon)
+
+    keep = (
+        (fwd_time[arc_src] + arc_time_step + bwd_time[arc_dst] <= time_budget)
+        & (fwd_decay[arc_src] + arc_decay_step + bwd_decay[arc_dst] <= decay_budget)
+    )
+
+    return {
+        'node_echelon': node_echelon,
+        'node_id': np.array(node_id, dtype=np.int64),
+        'node_capacity': node_capacity,
+        'node_cost': node_cost,
+        'node_quality': node_quality,
+        'node_cold': node_cold,
+        'node_dwell': node_dwell,
+        'node_dwell_decay': node_dwell_decay,
+        'arc_src': arc_src[keep],
+        'arc_dst': arc_dst[keep],
+        'arc_transporter': t_index[arc_veh[keep]],
+        'arc_distance': arc_distance[keep],
+        'arc_transit': arc_transit[keep],
+        'arc_decay': arc_decay[keep],
+        'arc_trip_cost': (arc_distance * t_cost[arc_veh])[keep],
+        'arc_vehicle_capacity': t_capacity[arc_veh][keep],
+        'arc_vehicle_quality': t_quality[arc_veh][keep],
+        'time_budget': time_budget,
+        'decay_budget': decay_budget,
+        'arcs_generated': len(arc_src),
+        'pairs_generated': pairs_generated,
+        'decay_rate': decay_rate,
+        'transporters': transporters
+    }
+
+
+def _leg_radius(
+    src_echelon, dst_echelon, allow_bypass, node_echelon, node_allowed,
+    node_dwell, node_dwell_decay, time_budget, decay_budget, t_speed, t_factor, t_decay_factor
+):
+    """
+    Largest node-to-node distance (km) an arc on this leg can span and
+    still lie on a path within both budgets, for the best transporter
+
+    Every harvester-to-retailer path through the leg dwells at least at
+    its intermediate endpoints (and at every intermediate echelon when
+    echelons cannot be skipped); that dwell is charged before the arc's
+    own transit. Negative when no path through the leg can fit.
+    """
+    if allow_bypass:
+        visited = {src_echelon, dst_echelon}
+    else:
+        visited = set(range(len(ECHELONS)))
+    min_dwell = 0.0
+    min_dwell_decay = 0.0
+    for echelon in visited:
+        nodes = (node_echelon == echelon) & node_allowed
+        if nodes.any():
+            min_dwell += node_dwell[nodes].min()
+            min_dwell_decay += node_dwell_decay[nodes].min()
+
+    reach = np.minimum(
+        (time_budget - min_dwell) * t_speed / t_factor,
+        (decay_budget - min_dwell_decay) * t_speed / (t_factor * t_decay_factor)
+    )
+    return float(reach.max())
+
+
+def _shortest_forward(arc_src, arc_dst, step, node_echelon):
+    """Shortest cumulative `step` from any harvester to each node (echelon DAG)"""
+    best = np.where(node_echelon == HARVESTER, 0.0, np.inf)
+    for echelon in range(1, len(ECHELONS)):
+        mask = node_echelon[arc_dst] == echelon
+        np.minimum.at(best, arc_dst[mask], best[arc_src[mask]] + step[mask])
+    return best
+
+
+def _shortest_backward(arc_src, arc_dst, step, node_echelon):
+    """Shortest cumulative `step` from each node to any retailer (echelon DAG)"""
+    best = np.where(node_echelon == RETAILER, 0.0, np.inf)
+    for echelon in range(len(ECHELONS) - 2, -1, -1):
+        mask = node_echelon[arc_src] == echelon
+        np.minimum.at(best, arc_src[mask], best[arc_dst[mask]] + step[mask])
+    return best
+
+
+def _longest_forward(arc_src, arc_dst, step, node_echelon):
+    """Longest cumulative `step` from any harvester to each node (echelon DAG)"""
+    worst = np.where(node_echelon == HARVESTER, 0.0, -np.inf)
+    for echelon in range(1, len(ECHELONS)):
+        mask = node_echelon[arc_dst] == echelon
+        np.maximum.at(worst, arc_dst[mask], worst[arc_src[mask]] + step[mask])
+    return worst
+
+
+def build_model(network, weights):
+    """
+    Assemble the MILP from the network arrays
+
+    Returns (prob, variables) where variables holds the f/n/y arc lists.
+    """
+    echelon = network['node_echelon']
+    src = network['arc_src']
+    dst = network['arc_dst']
+    num_arcs = len(src)
+    num_nodes = len(echelon)
+
+    demand = network['node_capacity'][echelon == RETAILER].sum()
+    capacity = network['arc_vehicle_capacity']
+
+    # Per-unit node costs: harvest purchase on leaving a farm, handling on
+    # entering a distributor/wholesaler
+    intermediate_dst = (echelon[dst] == DISTRIBUTOR) | (echelon[dst] == WHOLESALER)
+    unit_cost = np.where(echelon[src] == HARVESTER, network['node_cost'][src], 0.0)
+    unit_cost += np.where(intermediate_dst, network['node_cost'][dst], 0.0)
+    unit_time = network['arc_transit'] + np.where(intermediate_dst, network['node_dwell'][dst], 0.0)
+    unit_quality = (1 - network['arc_vehicle_quality'])
+    unit_quality += np.where(echelon[src] == HARVESTER, 1 - network['node_quality'][src], 0.0)
+    unit_quality += np.where(intermediate_dst, 1 - network['node_quality'][dst], 0.0)
+
+    # Normalize like the single-route model: each term scaled by its maximum
+    legs = 3
+    cost_scale = max(demand * legs * float(np.max(unit_cost + network['arc_trip_cost'] / capacity, initial=0)), 1e-9)
+    time_scale = max(demand * legs * float(np.max(unit_time, initial=0)), 1e-9)
+    quality_scale = max(demand * legs, 1e-9)
+
+    flow_coef = (
+        weights['cost'] * unit_cost / cost_scale
+        + weights['time'] * unit_time / time_scale
+        + weights['quality'] * unit_quality / quality_scale
+    )
+    trip_coef = weights['cost'] * network['arc_trip_cost'] / cost_scale
+
+    prob = LpProblem("FloraChain_Network_Flow", LpMinimize)
+
+    f = [LpVariable(f"flow_{a}", lowBound=0) for a in range(num_arcs)]
+    n = [LpVariable(f"trips_{a}", lowBound=0, cat='Integer') for a in range(num_arcs)]
+
+    prob += LpAffineExpression(list(zip(f, flow_coef.tolist())) + list(zip(n, trip_coef.tolist()))), "Total_Weighted_Objective"
+
+    # Vehicle capacity per trip
+    for a, cap in enumerate(capacity.tolist()):
+        prob += LpConstraint(LpAffineExpression([(f[a], 1), (n[a], -cap)]), LpConstraintLE, f"Trip_Capacity_{a}", 0)
+
+    inbound = _group(dst, num_nodes)
+    outbound = _group(src, num_nodes)
+    ones = np.ones(num_arcs)
+
+    for k in range(num_nodes):
+        node_type = ECHELONS[echelon[k]]
+        node_name = f"{node_type}_{network['node_id'][k]}"
+        node_cap = network['node_capacity'][k]
+        if echelon[k] == HARVESTER:
+            if len(outbound[k]):
+                prob += LpConstraint(_expression(f, outbound[k], ones[outbound[k]]), LpConstraintLE, f"Supply_{node_name}", node_cap)
+        elif echelon[k] == RETAILER:
+            prob += LpConstraint(_expression(f, inbound[k], ones[inbound[k]]), LpConstraintEQ, f"Demand_{node_name}", node_cap)
+        else:
+            if len(inbound[k]) == 0 and len(outbound[k]) == 0:
+                continue
+            balance = LpAffineExpression(
+                [(f[a], 1) for a in inbound[k].tolist()] + [(f[a], -1) for a in outbound[k].tolist()]
+            )
+            prob += LpConstraint(balance, LpConstraintEQ, f"Balance_{node_name}", 0)
+            prob += LpConstraint(_expression(f, inbound[k], ones[inbound[k]]), LpConstraintLE, f"Throughput_{node_name}", node_cap)
+
+    # Cumulative time / decay potentials, only when some path can exceed a budget
+    y = None
+    time_step = network['node_dwell'][src] + network['arc_transit']
+    decay_step = network['node_dwell_decay'][src] + network['arc_decay']
+    worst_time = _longest_forward(src, dst, time_step, echelon)
+    worst_decay = _longest_forward(src, dst, decay_step, echelon)
+    potentials = []
+    if np.max(worst_time, initial=0) > network['time_budget']:
+        potentials.append(('Time', time_step, network['time_budget']))
+    if np.max(worst_decay, initial=0) > network['decay_budget']:
+        potentials.append(('Decay', decay_step, network['decay_budget']))
+
+    if potentials:
+        y = [LpVariable(f"lane_{a}", cat='Binary') for a in range(num_arcs)]
+        max_trips = np.ceil(demand / capacity)
+        for a, trips in enumerate(max_trips.tolist()):
+            prob += LpConstraint(LpAffineExpression([(n[a], 1), (y[a], -trips)]), LpConstraintLE, f"Lane_Used_{a}", 0)
+
+        for label, step, budget in potentials:
+            p = [
+                LpVariable(f"{label.lower()}_{k}", lowBound=0, upBound=0 if echelon[k] == HARVESTER else budget)
+                for k in range(num_nodes)
+            ]
+            big_m = budget + float(np.max(step, initial=0))
+            # p[dst] >= p[src] + step - M * (1 - y)
+            for a, (i, j, s) in enumerate(zip(src.tolist(), dst.tolist(), step.tolist())):
+                prob += LpConstraint(
+                    LpAffineExpression([(p[j], 1), (p[i], -1), (y[a], -big_m)]),
+                    LpConstraintGE, f"{label}_Path_{a}", s - big_m
+                )
+
+    return prob, {'flow': f, 'trips': n, 'lane': y, 'potentials': [label for label, _, _ in potentials]}
+
+
+def extract_solution(network, variables):
+    """Used arcs, node throughput and per-retailer arrival age from a solved model"""
+    flow = np.array([v.varValue or 0 for v in variables['flow']])
+    trips = np.array([v.varValue or 0 for v in variables['trips']])
+    used = np.flatnonzero(flow > FLOW_EPSILON)
+
+    echelon = network['node_echelon']
+    src = network['arc_src'][used]
+    dst = network['arc_dst'][used]
+    time_step = network['node_dwell'][src] + network['arc_transit'][used]
+    decay_step = network['node_dwell_decay'][src] + network['arc_decay'][used]
+    arrival_time = _longest_forward(src, dst, time_step, echelon)
+    arrival_decay = _longest_forward(src, dst, decay_step, echelon)
+
+    return {
+        'used_arcs': used,
+        'flow': flow,
+        'trips': np.round(trips),
+        'arrival_time': arrival_time,
+        'arrival_decay': arrival_decay
+    }
+
+
+def optimize_network(network, weights, solver_options=None):
+    """Build and solve the network model; returns a JSON-ready result dict"""
+    build_start = time.perf_counter()
+    with phase('model_build'):
+        prob, variables = build_model(network, weights)
+    build_seconds = time.perf_counter() - build_start
+
+    solver_stats = solve(prob, **(solver_options or {}))
+    solve_seconds = solver_stats['wall_seconds']
+
+    status = solver_stats['status']
+    model_stats = {
+        'nodes': int(len(network['node_echelon'])),
+        'pairs_generated': int(network['pairs_generated']),
+        'arcs_generated': int(network['arcs_generated']),
+        'arcs_in_model': int(len(network['arc_src'])),
+        'variables': len(prob.variables()),
+        'constraints': len(prob.constraints),
+        'path_potentials': variables['potentials'],
+        'build_seconds': round(build_seconds, 4),
+        'solve_seconds': round(solve_seconds, 4),
+        'solver': solver_stats
+    }
+
+    if status != 'Optimal':
+        return {
+            'success': False,
+            'status': status,
+            'message': 'No feasible solution found',
+            'model': model_stats
+        }
+
+    with phase('result_build'):
+        solution = extract_solution(network, variables)
+        result = format_solution(network, solution)
+    result.update({
+        'success': True,
+        'status': status,
+        'solution_status': solver_stats['solution_status'],
+        'objective': round(solver_stats['objective'], 6),
+        'model': model_stats
+    })
+    return result
+
+
+def format_solution(network, solution):
+    """Flows, cost breakdown and retailer deliveries for the API response"""
+    echelon = network['node_echelon']
+    node_id = network['node_id']
+    transporters = network['transporters']
+
+    def node_ref(k):
+        return {'type': ECHELONS[echelon[k]], 'id': int(node_id[k])}
+
+    flows = []
+    purchase_cost = handling_cost = transport_cost = 0.0
+    throughput = np.zeros(len(echelon))
+    for a in solution['used_arcs'].tolist():
+        i, j = int(network['arc_src'][a]), int(network['arc_dst'][a])
+        quantity = float(solution['flow'][a])
+        trips = int(solution['trips'][a])
+        trip_cost = float(network['arc_trip_cost'][a])
+        transporter = transporters[int(network['arc_transporter'][a])]
+
+        throughput[j] += quantity
+        if echelon[i] == HARVESTER:
+            throughput[i] += quantity
+            purchase_cost += quantity * network['node_cost'][i]
+        if echelon[j] in (DISTRIBUTOR, WHOLESALER):
+            handling_cost += quantity * network['node_cost'][j]
+        transport_cost += trips * trip_cost
+
+        flows.append({
+            'from': node_ref(i),
+            'to': node_ref(j),
+            'transporter_id': transporter['id'],
+            'transporter_name': transporter['name'],
+            'quantity': round(quantity, 2),
+            'trips': trips,
+            'distance_km': round(float(network['arc_distance'][a]), 2),
+            'transit_time_hours': round(float(network['arc_transit'][a]), 2),
+            'transport_cost': round(trips * trip_cost, 2)
+        })
+
+    deliveries = []
+    for k in np.flatnonzero(echelon == RETAILER).tolist():
+        decay_hours = float(solution['arrival_decay'][k])
+        deliveries.append({
+            'retailer_id': int(node_id[k]),
+            'quantity': round(float(network['node_capacity'][k]), 2),
+            'worst_case_elapsed_hours': round(float(solution['arrival_time'][k]), 2),
+            'expected_freshness_on_arrival': round(100 * math.exp(-network['decay_rate'] * decay_hours), 1)
+        })
+
+    node_usage = [
+        {
+            **node_ref(k),
+            'throughput': round(float(throughput[k]), 2),
+            'capacity': float(network['node_capacity'][k]),
+            'cold_storage': bool(network['node_cold'][k])
+        }
+        for k in np.flatnonzero((throughput > FLOW_EPSILON) & (echelon != RETAILER)).tolist()
+    ]
+
+    return {
+        'flows': flows,
+        'deliveries': deliveries,
+        'node_utilization': node_usage,
+        'cost_breakdown': {
+            'purchase_cost': round(purchase_cost, 2),
+            'handling_cost': round(handling_cost, 2),
+            'transport_cost': round(transport_cost, 2),
+            'total_cost': round(purchase_cost + handling_cost + transport_cost, 2),
+            'currency': 'INR'
+        }
+    }
@@ -0,0 +1,739 @@
+"""
+Multi-Period Harvest and Allocation Planning
+============================================
+Plans daily harvest quantities, farm -> retailer shipments and retailer
+stock ageing over a horizon of several days, so that flowers are sold
+before they pass their sell-by age.
+
+Decision variables, per planning window (day t, age a = days since harvest):
+- x[l,t] >= 0      units harvested at the lane's farm and shipped on day t
+- n[l,t] in Z+     truck trips on the lane (x[l,t] <= capacity * n[l,t], with
+                   capacity cut to the demand the load can meet while sellable)
+- s[r,t,a] >= 0    units of age a sold at retailer r on day t
+- k[r,t,a] >= 0    end-of-day stock of age a kept for the next day
+- w[r,t] >= 0      stock reaching the sell-by age unsold (wasted)
+- u[r,t] >= 0      unmet demand (penalized)
+
+Constraints:
+- Ageing balance: stock kept yesterday at age a-1, plus shipments sent
+  a days ago on lanes with a lead time of a days, is sold, kept or (at
+  the sell-by age) wasted
+- Daily retailer demand and storage capacity
+- Daily farm harvest capacity
+
+Decomposition, so that hundreds of farms and thousands of retailers fit
+a fixed time budget:
+- Rolling horizon: each window of window_days is planned from the stock
+  and in-transit shipments left by the days already committed, and only
+  its first commit_days are kept (the last window keeps all its days)
+- Regions: retailers are split into compact regions by recursive
+  coordinate bisection. Farms are the only resource regions share, so a
+  farm x region x day transportation LP first splits each farm's daily
+  capacity into regional quotas (plus a demand-proportional share of
+  the capacity it leaves unused); the regional MILPs are then independent
+- Every subproblem gets a solver time limit in proportion to its size
+  from what is left of the budget. Once the budget is spent no further
+  model is built: quotas split farm capacity in proportion to regional
+  demand and regions are planned greedily (just-in-time shipments on the
+  cheapest lanes, oldest stock sold first), so the overrun stays a few
+  milliseconds per subproblem
+"""
+
+import math
+import time
+
+import numpy as np
+from pulp import (
+    LpAffineExpression, LpConstraint, LpConstraintEQ, LpConstraintGE, LpConstraintLE,
+    LpMinimize, LpProblem, LpSolution, LpSolutionOptimal, LpVariable
+)
+
+from metrics import phase
+from solvers import solve
+
+DAY_HOURS = 24
+FLOW_EPSILON = 1e-6
+MIN_TIME_LIMIT = 1.0  # seconds; below this a subproblem is planned without a solver
+
+
+def _group(keys, num_groups):
+    """Split indices by key: returns a list with one index array per group"""
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(num_groups + 1))
+    return [order[bounds[g]:bounds[g + 1]] for g in range(num_groups)]
+
+
+def partition_regions(lat, lon, max_size):
+    """
+    Region label per point, by recursive median splits along the wider
+    axis until every region holds at most max_size points
+
+    Returns (labels, number of regions).
+    """
+    labels = np.zeros(len(lat), dtype=np.int64)
+    if len(lat) == 0:
+        return labels, 0
+    x = lon * math.cos(math.radians(float(np.mean(lat))))
+    pending = [np.arange(len(lat))]
+    num_regions = 0
+    while pending:
+        members = pending.pop()
+        if len(members) <= max_size:
+            labels[members] = num_regions
+            num_regions += 1
+            continue
+        key = x[members] if np.ptp(x[members]) >= np.ptp(lat[members]) else lat[members]
+        order = np.argsort(key, kind='stable')
+        half = len(members) // 2
+        pending.append(members[order[half:]])
+        pending.append(members[order[:half]])
+    return labels, num_regions
+
+
+def build_instance(
+    farms,
+    retailers,
+    vehicle,
+    distance_block,
+    demand,
+    max_age_days,
+    lanes_per_retailer=3,
+    region_size=100
+):
+    """
+    Build the planning arrays
+
+    farms:          harvester records ('capacity' = daily harvest capacity)
+    retailers:      retailer records ('capacity' = storage capacity)
+    vehicle:        transporter record with a 'route_factor', used for
+                    every planned trip
+    distance_block: fn(source_type, source_ids, dest_type, dest_ids) -> km matrix
+    demand:         retailers x days array of daily demand
+    max_age_days:   per-retailer sell-by age, in whole days since harvest
+
+    Each retailer is served on lanes from its lanes_per_retailer nearest
+    farms, keeping only lanes whose lead time leaves the product sellable.
+    """
+    farm_ids = [f['id'] for f in farms]
+    retailer_ids = [r['id'] for r in retailers]
+    num_farms, num_retailers = len(farms), len(retailers)
+    max_age = np.asarray(max_age_days, dtype=np.int64)
+
+    # ---- Lanes: nearest farms per retailer ----
+    distance = distance_block('harvester', farm_ids, 'retailer', retailer_ids) * vehicle['route_factor']
+    k = min(lanes_per_retailer, num_farms)
+    if k < num_farms:
+        nearest = np.argpartition(distance, k - 1, axis=0)[:k]
+    else:
+        nearest = np.broadcast_to(np.arange(num_farms)[:, None], (num_farms, num_retailers))
+    lane_farm = nearest.T.ravel()
+    lane_retailer = np.repeat(np.arange(num_retailers), k)
+    lane_distance = distance[lane_farm, lane_retailer]
+    lane_lead = np.floor(lane_distance / vehicle['speed_kmph'] / DAY_HOURS).astype(np.int64)
+
+    keep = lane_lead <= max_age[lane_retailer]
+    lane_farm, lane_retailer = lane_farm[keep], lane_retailer[keep]
+    lane_distance, lane_lead = lane_distance[keep], lane_lead[keep]
+
+    # ---- Regions, and the farm x region pairs that regional quotas are set on ----
+    region, num_regions = partition_regions(
+        np.array([r['lat'] for r in retailers], dtype=np.float64),
+        np.array([r['lon'] for r in retailers], dtype=np.float64),
+        region_size
+    )
+    pair_key, lane_pair = np.unique(lane_farm * max(num_regions, 1) + region[lane_retailer], return_inverse=True)
+    pair_farm = pair_key // max(num_regions, 1)
+    pair_region = pair_key % max(num_regions, 1)
+
+    return {
+        'farm_id': np.array(farm_ids, dtype=np.int64),
+        'farm_capacity': np.array([f.get('capacity', 0) for f in farms], dtype=np.float64),
+        'farm_cost': np.array([f.get('cost_per_unit', 0) for f in farms], dtype=np.float64),
+        'retailer_id': np.array(retailer_ids, dtype=np.int64),
+        'retailer_capacity': np.array([r.get('capacity', 0) for r in retailers], dtype=np.float64),
+        'max_age': max_age,
+        'demand': np.asarray(demand, dtype=np.float64),
+        'region': region,
+        'num_regions': num_regions,
+        'region_retailers': _group(region, num_regions),
+        'region_lanes': _group(region[lane_retailer], num_regions),
+        'lane_farm': lane_farm,
+        'lane_retailer': lane_retailer,
+        'lane_distance': lane_distance,
+        'lane_lead': lane_lead,
+        'lane_trip_cost': lane_distance * vehicle['cost_per_km'],
+        'lane_pair': lane_pair.ravel(),
+        'pair_farm': pair_farm,
+        'pair_region': pair_region,
+        'vehicle': vehicle,
+        'vehicle_capacity': float(vehicle['capacity'])
+    }
+
+
+def planning_windows(horizon_days, window_days, commit_days):
+    """(start, end, commit end) day ranges of the rolling horizon"""
+    windows = []
+    start = 0
+    while start < horizon_days:
+        end = min(start + window_days, horizon_days)
+        commit = end if end == horizon_days else start + commit_days
+        windows.append((start, end, commit))
+        start = commit
+    return windows
+
+
+def _regional_quotas(instance, start, end, carry, scheduled, costs, options, time_limit):
+    """
+    Split farm capacity over regions for the days of one window
+
+    Solves the farm x region x day transportation LP (lane costs
+    averaged per pair, stock on hand netted off regional demand) and
+    hands each pair its LP flow plus a demand-proportional share of its
+    farm's unused capacity. Without a time_limit the LP is skipped and all
+    capacity is shared out by demand. Returns (pairs x days quota array,
+    solver stats).
+    """
+    num_days = end - start
+    num_regions = instance['num_regions']
+    pair_farm, pair_region = instance['pair_farm'], instance['pair_region']
+    lane_pair = instance['lane_pair']
+    num_pairs = len(pair_farm)
+    capacity = instance['vehicle_capacity']
+
+    lanes_per_pair = np.bincount(lane_pair, minlength=num_pairs)
+    pair_unit_cost = instance['farm_cost'][pair_farm] + np.bincount(
+        lane_pair, weights=instance['lane_trip_cost'] / capacity, minlength=num_pairs
+    ) / np.maximum(lanes_per_pair, 1)
+    pair_lead = np.full(num_pairs, np.iinfo(np.int64).max)
+    np.minimum.at(pair_lead, lane_pair, instance['lane_lead'])
+
+    # Regional demand net of stock on hand and shipments already on the way
+    region = instance['region']
+    demand = np.zeros((num_regions, num_days))
+    np.add.at(demand, region, instance['demand'][:, start:end])
+    on_hand = np.bincount(region, weights=carry.sum(axis=1) + scheduled[:, start:end].sum(axis=(1, 2)), minlength=num_regions)
+    covered = np.minimum(demand, np.maximum(on_hand[:, None] - np.cumsum(demand, axis=1) + demand, 0))
+    demand -= covered
+
+    quota = np.zeros((num_pairs, num_days))
+    if time_limit is None:
+        stats = {'status': 'Skipped', 'wall_seconds': 0.0}
+    else:
+        stats = _quota_lp(instance, demand, pair_unit_cost, pair_lead, quota, costs, options, time_limit)
+
+    # Unused farm capacity goes to the farm's regions in proportion to their demand
+    share = demand.sum(axis=1)[pair_region] + FLOW_EPSILON
+    share /= np.bincount(pair_farm, weights=share)[pair_farm]
+    used = np.zeros((len(instance['farm_id']), num_days))
+    np.add.at(used, pair_farm, quota)
+    unused = np.maximum(instance['farm_capacity'][:, None] - used, 0)
+    quota += unused[pair_farm] * share[:, None]
+    return quota, stats
+
+
+def _quota_lp(instance, demand, pair_unit_cost, pair_lead, quota, costs, options, time_limit):
+    """Farm x region x day transportation LP; writes its flows into quota, returns solver stats"""
+    num_regions, num_days = demand.shape
+    pair_farm, pair_region = instance['pair_farm'], instance['pair_region']
+    num_pairs = len(pair_farm)
+
+    prob = LpProblem("FloraChain_Plan_Quotas", LpMinimize)
+    flow = {}
+    inbound = [[[] for _ in range(num_days)] for _ in range(num_regions)]
+    outbound = [[[] for _ in range(num_days)] for _ in range(len(instance['farm_id']))]
+    objective = []
+    for p in range(num_pairs):
+        f, g, lead, cost = int(pair_farm[p]), int(pair_region[p]), int(pair_lead[p]), float(pair_unit_cost[p])
+        for t in range(num_days - lead):
+            v = flow[p, t] = LpVariable(f"quota_{p}_{t}", lowBound=0)
+            objective.append((v, cost))
+            outbound[f][t].append((v, 1))
+            inbound[g][t + lead].append((v, 1))
+    for g in range(num_regions):
+        for t in range(num_days):
+            u = LpVariable(f"short_{g}_{t}", lowBound=0)
+            objective.append((u, costs['shortage']))
+            prob += LpConstraint(
+                LpAffineExpression(inbound[g][t] + [(u, 1)]), LpConstraintGE, f"Demand_{g}_{t}", float(demand[g, t])
+            )
+    for f, days in enumerate(outbound):
+        for t, terms in enumerate(days):
+            if terms:
+                prob += LpConstraint(
+                    LpAffineExpression(terms), LpConstraintLE, f"Supply_{f}_{t}", float(instance['farm_capacity'][f])
+                )
+    prob += LpAffineExpression(objective), "Total_Cost"
+
+    stats = solve(prob, **dict(options, time_limit=time_limit))
+    if stats['status'] == 'Optimal':
+        for (p, t), v in flow.items():
+            quota[p, t] = v.varValue or 0
+    return stats
+
+
+def _greedy_region(instance, g, start, end, carry, scheduled, quota):
+    """
+    Plan one region for the days of one window without a solver
+
+    Day by day, each retailer sells its oldest stock first and covers the
+    rest of its demand with shipments timed to arrive that day, from the
+    cheapest lanes with farm quota left. Unsold stock ages, is wasted at
+    the sell-by age or beyond storage capacity. Same result arrays as
+    _solve_region.
+    """
+    num_days = end - start
+    retailers = instance['region_retailers'][g]
+    lanes = instance['region_lanes'][g]
+    max_age = instance['max_age']
+    capacity = instance['vehicle_capacity']
+    width = int(max_age.max(initial=0)) + 1
+    quota_left = quota.copy()
+
+    # Lanes per retailer, cheapest per unit first
+    unit_cost = instance['farm_cost'][instance['lane_farm'][lanes]] + instance['lane_trip_cost'][lanes] / capacity
+    by_retailer = {}
+    for row in np.argsort(unit_cost, kind='stable').tolist():
+        by_retailer.setdefault(int(instance['lane_retailer'][lanes[row]]), []).append(row)
+
+    ship = np.zeros((len(lanes), num_days))
+    sold = np.zeros((len(retailers), num_days))
+    unmet = np.zeros((len(retailers), num_days))
+    wasted = np.zeros((len(retailers), num_days))
+    stock = np.zeros((len(retailers), num_days, width))
+    on_hand = carry[retailers].copy()
+    for t in range(num_days):
+        day = start + t
+        if t:
+            on_hand[:, 1:] = stock[:, t - 1, :width - 1]
+            on_hand[:, 0] = 0
+        on_hand += scheduled[retailers, day]
+        for i, r in enumerate(retailers.tolist()):
+            oldest = int(max_age[r])
+            wanted = float(instance['demand'][r, day])
+            for a in range(oldest, -1, -1):
+                taken = min(on_hand[i, a], wanted)
+                on_hand[i, a] -= taken
+                wanted -= taken
+            sold[i, t] = float(instance['demand'][r, day]) - wanted
+            for row in by_retailer.get(r, ()):
+                if wanted <= FLOW_EPSILON:
+                    break
+                sent = t - int(instance['lane_lead'][lanes[row]])
+                if sent < 0:
+                    continue
+                p = int(instance['lane_pair'][lanes[row]])
+                quantity = min(wanted, quota_left[p, sent])
+                if quantity > FLOW_EPSILON:
+                    ship[row, sent] += quantity
+                    quota_left[p, sent] -= quantity
+                    sold[i, t] += quantity
+                    wanted -= quantity
+            unmet[i, t] = max(wanted, 0.0)
+
+            # Stock at the sell-by age is wasted; storage overflow loses the oldest first
+            waste = on_hand[i, oldest:].sum()
+            room = float(instance['retailer_capacity'][r])
+            for a in range(oldest):
+                kept = min(on_hand[i, a], room)
+                waste += on_hand[i, a] - kept
+                stock[i, t, a] = kept
+                room -= kept
+            wasted[i, t] = waste
+
+    trips = np.ceil(ship / capacity - FLOW_EPSILON)
+    return {'ship': ship, 'trips': np.maximum(trips, 0), 'sold': sold, 'short': unmet, 'waste': wasted, 'stock': stock}
+
+
+def _solve_region(instance, g, start, end, carry, scheduled, quota, costs, options, time_limit, deadline):
+    """
+    Build and solve one region's MILP for the days of one window
+
+    Falls back to the LP relaxation with trips rounded up when the MILP
+    finds no solution in time and the budget (deadline, a perf_counter
+    time) still has MIN_TIME_LIMIT left. Returns arrays over the window:
+    ship / trips per region lane, sold / short / waste per region
+    retailer, and kept stock per retailer and age, with solver stats; the
+    arrays are None when neither found a solution.
+    """
+    num_days = end - start
+    retailers = instance['region_retailers'][g]
+    lanes = instance['region_lanes'][g]
+    max_age = instance['max_age']
+    capacity = instance['vehicle_capacity']
+    local = {int(r): i for i, r in enumerate(retailers.tolist())}
+
+    prob = LpProblem(f"FloraChain_Plan_Region_{g}", LpMinimize)
+    objective = []
+
+    # ---- Shipments ----
+    # A shipment is never worth more than the demand it can meet before its
+    # sell-by age, which tightens the trip constraint well below a truckload
+    demand = instance['demand'][:, start:end]
+    sellable = np.zeros((len(retailers), num_days + 1))
+    sellable[:, 1:] = np.cumsum(demand[retailers], axis=1)
+
+    x, n = {}, {}
+    arrivals = {}  # (retailer, lead) -> lanes
+    by_pair = {}
+    for l in lanes.tolist():
+        r = int(instance['lane_retailer'][l])
+        lead, oldest = int(instance['lane_lead'][l]), int(max_age[r])
+        unit_cost = float(instance['farm_cost'][instance['lane_farm'][l]])
+        trip_cost = float(instance['lane_trip_cost'][l])
+        arrivals.setdefault((r, lead), []).append(l)
+        by_pair.setdefault(int(instance['lane_pair'][l]), []).append(l)
+        for t in range(num_days - lead):
+            row = sellable[local[r]]
+            bound = min(capacity, float(row[min(t + oldest + 1, num_days)] - row[t + lead]))
+            if bound <= FLOW_EPSILON:
+                continue
+            xv = x[l, t] = LpVariable(f"ship_{l}_{t}", lowBound=0)
+            nv = n[l, t] = LpVariable(f"trips_{l}_{t}", lowBound=0, cat='Integer')
+            objective += [(xv, unit_cost), (nv, trip_cost)]
+            prob += LpConstraint(LpAffineExpression([(xv, 1), (nv, -bound)]), LpConstraintLE, f"Trip_Capacity_{l}_{t}", 0)
+
+    # ---- Farm quotas ----
+    for p, pair_lanes in by_pair.items():
+        for t in range(num_days):
+            terms = [(x[l, t], 1) for l in pair_lanes if (l, t) in x]
+            if terms:
+                prob += LpConstraint(LpAffineExpression(terms), LpConstraintLE, f"Quota_{p}_{t}", float(quota[p, t]))
+
+    # ---- Retailer stock ageing, demand and storage ----
+    sell, kept, short, waste = {}, {}, {}, {}
+    for r in retailers.tolist():
+        oldest = int(max_age[r])
+        for t in range(num_days):
+            day = start + t
+            u = short[r, t] = LpVariable(f"short_{r}_{t}", lowBound=0)
+            w = waste[r, t] = LpVariable(f"waste_{r}_{t}", lowBound=0)
+            objective += [(u, costs['shortage']), (w, costs['waste'])]
+            sales = [(u, 1)]
+            for a in range(oldest + 1):
+                s = sell[r, t, a] = LpVariable(f"sell_{r}_{t}_{a}", lowBound=0)
+                sales.append((s, 1))
+                if a < oldest:
+                    out = kept[r, t, a] = LpVariable(f"stock_{r}_{t}_{a}", lowBound=0)
+                    objective.append((out, costs['holding']))
+                else:
+                    out = w
+                terms = [(s, 1), (out, 1)]
+                on_hand = float(scheduled[r, day, a])
+                if t == 0:
+                    on_hand += float(carry[r, a])
+                elif a >= 1:
+                    terms.append((kept[r, t - 1, a - 1], -1))
+                if t >= a:
+                    terms += [(x[l, t - a], -1) for l in arrivals.get((r, a), ()) if (l, t - a) in x]
+                prob += LpConstraint(LpAffineExpression(terms), LpConstraintEQ, f"Age_{r}_{t}_{a}", on_hand)
+            prob += LpConstraint(
+                LpAffineExpression(sales), LpConstraintEQ, f"Demand_{r}_{t}", float(instance['demand'][r, day])
+            )
+            if oldest > 0:
+                prob += LpConstraint(
+                    LpAffineExpression([(kept[r, t, a], 1) for a in range(oldest)]), LpConstraintLE,
+                    f"Storage_{r}_{t}", float(instance['retailer_capacity'][r])
+                )
+
+    prob += LpAffineExpression(objective), "Total_Cost"
+
+    relaxed = False
+    stats = solve(prob, **dict(options, time_limit=time_limit))
+    if stats['status'] != 'Optimal' and deadline - time.perf_counter() >= MIN_TIME_LIMIT:
+        relaxed = True
+        milp_seconds = stats['wall_seconds']
+        for v in n.values():
+            v.cat = 'Continuous'
+        stats = solve(prob, **dict(options, time_limit=MIN_TIME_LIMIT))
+        stats['wall_seconds'] += milp_seconds
+    stats['relaxed'] = relaxed
+    if stats['status'] != 'Optimal':
+        return None, stats
+
+    lane_row = {l: i for i, l in enumerate(lanes.tolist())}
+    ship = np.zeros((len(lanes), num_days))
+    trips = np.zeros((len(lanes), num_days))
+    for (l, t), v in x.items():
+        ship[lane_row[l], t] = v.varValue or 0
+        trips[lane_row[l], t] = n[l, t].varValue or 0
+    ship[ship < FLOW_EPSILON] = 0
+    trips = np.ceil(ship / capacity - FLOW_EPSILON) if relaxed else np.round(trips)
+
+    width = int(max_age.max(initial=0)) + 1
+    sold = np.zeros((len(retailers), num_days))
+    unmet = np.zeros((len(retailers), num_days))
+    wasted = np.zeros((len(retailers), num_days))
+    stock = np.zeros((len(retailers), num_days, width))
+    for (r, t, a), v in sell.items():
+        sold[local[r], t] += v.varValue or 0
+    for (r, t), v in short.items():
+        unmet[local[r], t] = v.varValue or 0
+        wasted[local[r], t] = waste[r, t].varValue or 0
+    for (r, t, a), v in kept.items():
+        stock[local[r], t, a] = v.varValue or 0
+
+    return {'ship': ship, 'trips': trips, 'sold': sold, 'short': unmet, 'waste': wasted, 'stock': stock}, stats
+
+
+def plan_horizon(
+    instance,
+    window_days=7,
+    commit_days=4,
+    time_budget_seconds=60.0,
+    costs=None,
+    initial_stock=None,
+    solver_options=None,
+    progress=None
+):
+    """
+    Plan every day of the horizon by rolling windows and regional MILPs
+
+    costs:         {'holding': per unit-day kept, 'shortage': per unit
+                   unmet, 'waste': per unit past its sell-by age}
+    initial_stock: optional retailers x ages stock on hand at day 0
+    progress:      optional fn(completed, total) called after each subproblem
+
+    Returns the committed plan arrays and per-window decomposition stats.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget_seconds
+    options = dict(solver_options or {})
+    options.pop('time_limit', None)
+
+    horizon_days = instance['demand'].shape[1]
+    num_lanes = len(instance['lane_farm'])
+    num_retailers = len(instance['retailer_id'])
+    width = int(instance['max_age'].max(initial=0)) + 1
+    windows = planning_windows(horizon_days, window_days, max(1, min(commit_days, window_days)))
+
+    carry = np.zeros((num_retailers, width))
+    if initial_stock is not None:
+        carry[:, :] = initial_stock[:, :width]
+    # Committed shipments by arrival day and age on arrival
+    scheduled = np.zeros((num_retailers, horizon_days, width))
+
+    ship = np.zeros((num_lanes, horizon_days))
+    trips = np.zeros((num_lanes, horizon_days))
+    sold = np.zeros((num_retailers, horizon_days))
+    short = np.zeros((num_retailers, horizon_days))
+    waste = np.zeros((num_retailers, horizon_days))
+    stock = np.zeros((num_retailers, horizon_days))
+
+    # Time is shared out in proportion to subproblem size (lanes + retailers) x days
+    region_size = np.array([
+        len(lanes) + len(retailers)
+        for lanes, retailers in zip(instance['region_lanes'], instance['region_retailers'])
+    ], dtype=np.float64)
+    quota_size = 0.05 * region_size.sum()
+    window_work = [(end - start) * (region_size.sum() + quota_size) for start, end, _ in windows]
+    remaining_work = float(sum(window_work))
+    total_subproblems = len(windows) * (instance['num_regions'] + 1)
+    completed = 0
+    # Time outside the solver so far: model build and solution read (plus
+    # time past the limit) per solved subproblem, and per fallback
+    solves, solve_overhead = 0, 0.0
+    fallbacks, fallback_seconds = 0, 0.0
+
+    def time_limit(work):
+        """Solver time limit for the next subproblem, None once the budget is spent"""
+        nonlocal remaining_work
+        left = deadline - time.perf_counter()
+        if fallbacks:
+            left -= fallback_seconds / fallbacks * (total_subproblems - completed)
+        share = left * work / max(remaining_work, FLOW_EPSILON)
+        if solves:
+            share -= solve_overhead / solves
+        remaining_work -= work
+        return share if share >= MIN_TIME_LIMIT else None
+
+    def spent(elapsed, solver_seconds, limit):
+        """Record the time a subproblem took outside its solver"""
+        nonlocal solves, solve_overhead, fallbacks, fallback_seconds
+        if limit is None:
+            fallbacks += 1
+            fallback_seconds += elapsed
+        else:
+            solves += 1
+            solve_overhead += elapsed - solver_seconds
+
+    window_stats = []
+    for (start, end, commit), work in zip(windows, window_work):
+        num_days = end - start
+        window_started = time.perf_counter()
+
+        with phase('plan_quotas'):
+            limit = time_limit(num_days * quota_size)
+            quota, quota_stats = _regional_quotas(
+                instance, start, end, carry, scheduled, costs, options, limit
+            )
+        completed += 1
+        spent(time.perf_counter() - window_started, min(quota_stats['wall_seconds'], limit or 0.0), limit)
+        if progress is not None:
+            progress(completed, total_subproblems)
+        quota_seconds = time.perf_counter() - window_started
+
+        regions = []
+        next_carry = np.zeros_like(carry)
+        for g in range(instance['num_regions']):
+            lanes = instance['region_lanes'][g]
+            retailers = instance['region_retailers'][g]
+            region_started = time.perf_counter()
+            with phase('plan_region'):
+                limit = time_limit(num_days * region_size[g])
+                method = 'milp'
+                result = None
+                solver_seconds = 0.0
+                if limit is not None:
+                    result, stats = _solve_region(
+                        instance, g, start, end, carry, scheduled, quota, costs, options, limit, deadline
+                    )
+                    method = 'lp' if stats['relaxed'] else 'milp'
+                    solver_seconds = min(stats['wall_seconds'], limit)
+                if result is None:
+                    # Out of time, or no solution within it: plan without a solver
+                    method = 'greedy'
+                    greedy_started = time.perf_counter()
+                    result = _greedy_region(instance, g, start, end, carry, scheduled, quota)
+                    stats = {
+                        'status': 'Heuristic',
+                        'solution_status': None,
+                        'wall_seconds': time.perf_counter() - greedy_started,
+                        'gap': None,
+                        'relaxed': False
+                    }
+            completed += 1
+            spent(time.perf_counter() - region_started, solver_seconds, limit)
+            if progress is not None:
+                progress(completed, total_subproblems)
+
+            kept = commit - start
+            ship[lanes, start:commit] = result['ship'][:, :kept]
+            trips[lanes, start:commit] = result['trips'][:, :kept]
+            sold[retailers, start:commit] = result['sold'][:, :kept]
+            short[retailers, start:commit] = result['short'][:, :kept]
+            waste[retailers, start:commit] = result['waste'][:, :kept]
+            stock[retailers, start:commit] = result['stock'][:, :kept].sum(axis=2)
+            # Stock kept at the end of the last committed day is a day older tomorrow
+            next_carry[retailers, 1:] = result['stock'][:, kept - 1, :width - 1]
+
+            regions.append({
+                'region': g,
+                'retailers': int(len(retailers)),
+                'lanes': int(len(lanes)),
+                'seconds': round(time.perf_counter() - region_started, 4),
+                'time_limit_seconds': None if limit is None else round(limit, 3),
+                'method': method,
+                'status': stats['status'],
+                'solution_status': stats['solution_status'],
+                'relaxed': stats['relaxed'],
+                'optimal': stats['solution_status'] == LpSolution[LpSolutionOptimal] and not stats['relaxed'],
+                'gap': stats['gap']
+            })
+
+        # Shipments sent on committed days that land after them
+        lead = instance['lane_lead']
+        for t in range(start, commit):
+            arrival = t + lead
+            late = (arrival >= commit) & (arrival < horizon_days) & (ship[:, t] > 0)
+            np.add.at(scheduled, (instance['lane_retailer'][late], arrival[late], lead[late]), ship[late, t])
+        carry = next_carry
+
+        window_stats.append({
+            'start_day': start,
+            'end_day': end,
+            'committed_days': commit - start,
+            'quota_seconds': round(quota_seconds, 4),
+            'quota_status': quota_stats['status'],
+            'seconds': round(time.perf_counter() - window_started, 4),
+            'regions': regions
+        })
+
+    return {
+        'ship': ship,
+        'trips': trips,
+        'sold': sold,
+        'short': short,
+        'waste': waste,
+        'stock': stock,
+        'windows': window_stats,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def format_plan(instance, plan, costs):
+    """Daily totals, harvest schedule, shipments, retailer service and costs for the API response"""
+    lanes = np.flatnonzero(plan['ship'].sum(axis=1) > 0)
+    farm_id, retailer_id = instance['farm_id'], instance['retailer_id']
+    horizon_days = plan['ship'].shape[1]
+
+    harvest = np.zeros((len(farm_id), horizon_days))
+    np.add.at(harvest, instance['lane_farm'], plan['ship'])
+    demand = instance['demand']
+
+    shipments = []
+    for l in lanes.tolist():
+        for t in np.flatnonzero(plan['ship'][l]).tolist():
+            shipments.append({
+                'day': t,
+                'harvester_id': int(farm_id[instance['lane_farm'][l]]),
+                'retailer_id': int(retailer_id[instance['lane_retailer'][l]]),
+                'quantity': round(float(plan['ship'][l, t]), 2),
+                'trips': int(plan['trips'][l, t]),
+                'arrival_day': t + int(instance['lane_lead'][l]),
+                'distance_km': round(float(instance['lane_distance'][l]), 2)
+            })
+
+    days = [{
+        'day': t,
+        'demand': round(float(demand[:, t].sum()), 2),
+        'harvested': round(float(harvest[:, t].sum()), 2),
+        'trips': int(plan['trips'][:, t].sum()),
+        'sold': round(float(plan['sold'][:, t].sum()), 2),
+        'shortage': round(float(plan['short'][:, t].sum()), 2),
+        'waste': round(float(plan['waste'][:, t].sum()), 2),
+        'end_stock': round(float(plan['stock'][:, t].sum()), 2)
+    } for t in range(horizon_days)]
+
+    harvest_schedule = [{
+        'harvester_id': int(farm_id[f]),
+        'daily': np.round(harvest[f], 2).tolist(),
+        'utilization': round(float(harvest[f].sum() / max(instance['farm_capacity'][f] * horizon_days, FLOW_EPSILON)), 4)
+    } for f in np.flatnonzero(harvest.sum(axis=1) > 0).tolist()]
+
+    total_demand = demand.sum(axis=1)
+    service = [{
+        'retailer_id': int(retailer_id[r]),
+        'demand': round(float(total_demand[r]), 2),
+        'sold': round(float(plan['sold'][r].sum()), 2),
+        'shortage': round(float(plan['short'][r].sum()), 2),
+        'waste': round(float(plan['waste'][r].sum()), 2),
+        'fill_rate': round(float(plan['sold'][r].sum() / total_demand[r]), 4) if total_demand[r] > 0 else 1.0,
+        'sell_by_age_days': int(instance['max_age'][r])
+    } for r in range(len(retailer_id))]
+
+    breakdown = {
+        'purchase': float((plan['ship'].sum(axis=1) * instance['farm_cost'][instance['lane_farm']]).sum()),
+        'transport': float((plan['trips'].sum(axis=1) * instance['lane_trip_cost']).sum()),
+        'holding': costs['holding'] * float(plan['stock'].sum()),
+        'shortage_penalty': costs['shortage'] * float(plan['short'].sum()),
+        'waste_penalty': costs['waste'] * float(plan['waste'].sum())
+    }
+    breakdown['total'] = sum(breakdown.values())
+
+    sold, wanted = float(plan['sold'].sum()), float(demand.sum())
+    return {
+        'summary': {
+            'horizon_days': horizon_days,
+            'demand': round(wanted, 2),
+            'sold': round(sold, 2),
+            'shortage': round(float(plan['short'].sum()), 2),
+            'waste': round(float(plan['waste'].sum()), 2),
+            'fill_rate': round(sold / wanted, 4) if wanted > 0 else 1.0,
+            'trips': int(plan['trips'].sum())
+        },
+        'costs': {name: round(value, 2) for name, value in breakdown.items()},
+        'days': days,
+        'harvest': harvest_schedule,
+        'shipments': shipments,
+        'retailers': service
+    }
@@ -0,0 +1,290 @@
+"""
+Entity Registry
+===============
+Indexed, hot-reloadable store for supply chain entities
+(harvesters, transporters, distributors, wholesalers, retailers).
+
+- O(1) lookup by (entity_type, entity_id) through a per-type id index
+- Column-oriented storage: numeric and boolean fields are NumPy arrays,
+  text fields are plain lists
+- Immutable snapshots swapped atomically, so readers never see a
+  half-loaded registry
+- Hot reload from a JSON or CSV snapshot file when its mtime changes,
+  checked at most every `check_interval` seconds, so every gunicorn
+  worker picks up a new file without a restart
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+ENTITY_TYPES = ('harvester', 'transporter', 'distributor', 'wholesaler', 'retailer')
+
+# Plural keys as used by the /entities response
+PLURALS = {entity_type: entity_type + 's' for entity_type in ENTITY_TYPES}
+
+_MISSING = object()
+
+
+class EntityNotFoundError(KeyError):
+    """Raised when an (entity_type, entity_id) pair is not registered"""
+
+    def __init__(self, entity_type, entity_id):
+        super().__init__(f"Unknown {entity_type} id: {entity_id}")
+        self.entity_type = entity_type
+        self.entity_id = entity_id
+
+    def __str__(self):
+        return self.args[0]
+
+
+class EntityTable:
+    """Column-oriented table of all entities of one type"""
+
+    def __init__(self, entity_type, records):
+        self.entity_type = entity_type
+        self.fields = []
+        for record in records:
+            for field in record:
+                if field not in self.fields:
+                    self.fields.append(field)
+
+        self.index = {}
+        for row, record in enumerate(records):
+            if record['id'] in self.index:
+                raise ValueError(f"Duplicate {entity_type} id: {record['id']}")
+            self.index[record['id']] = row
+
+        self.columns = {field: self._to_column([r.get(field, _MISSING) for r in records]) for field in self.fields}
+        self._records = None
+
+    @staticmethod
+    def _to_column(values):
+        """Store a column as a typed NumPy array when possible, else as a list"""
+        if values and all(isinstance(v, bool) for v in values):
+            return np.array(values, dtype=bool)
+        if values and all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return np.array(values, dtype=np.int64)
+        if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return np.array(values, dtype=np.float64)
+        return values
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.index
+
+    def row(self, entity_id):
+        try:
+            return self.index[entity_id]
+        except KeyError:
+            raise EntityNotFoundError(self.entity_type, entity_id) from None
+
+    def column(self, field):
+        """Raw column (NumPy array or list) in row order"""
+        return self.columns[field]
+
+    def ids(self):
+        return list(self.index)
+
+    def _record_at(self, row):
+        record = {}
+        for field in self.fields:
+            value = self.columns[field][row]
+            if value is _MISSING:
+                continue
+            record[field] = value.item() if isinstance(value, np.generic) else value
+        return record
+
+    def record(self, entity_id):
+        """Entity record as a plain dict"""
+        return self.records()[self.row(entity_id)]
+
+    def records(self):
+        """All records as plain dicts (materialized once per snapshot)"""
+        if self._records is None:
+            self._records = [self._record_at(row) for row in range(len(self.index))]
+        return self._records
+
+
+class RegistrySnapshot:
+    """Immutable set of entity tables with a monotonically increasing version"""
+
+    def __init__(self, tables, version, source):
+        self.tables = tables
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+
+    def table(self, entity_type):
+        try:
+            return self.tables[entity_type]
+        except KeyError:
+            raise ValueError(f"Unknown entity type: {entity_type}") from None
+
+
+def _parse_csv_value(text):
+    """Best-effort typing of a CSV cell"""
+    if text == '':
+        return _MISSING
+    lowered = text.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def read_snapshot_file(path):
+    """
+    Read entity tables from a snapshot file
+
+    JSON: {"harvesters": [...], "transporters": [...], ...}
+          (singular keys are accepted too, the /entities response is a valid snapshot)
+    CSV:  one row per entity with an `entity_type` column plus entity fields
+    """
+    tables = {entity_type: [] for entity_type in ENTITY_TYPES}
+
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                entity_type = row.pop('entity_type')
+                if entity_type not in tables:
+                    raise ValueError(f"Unknown entity type in {path}: {entity_type}")
+                record = {}
+                for field, text in row.items():
+                    value = _parse_csv_value(text)
+                    if value is not _MISSING:
+                        record[field] = value
+                tables[entity_type].append(record)
+        return tables
+
+    with open(path) as f:
+        data = json.load(f)
+    for entity_type in ENTITY_TYPES:
+        tables[entity_type] = data.get(PLURALS[entity_type], data.get(entity_type, []))
+    return tables
+
+
+class EntityRegistry:
+    """
+    Process-wide entity registry
+
+    Listeners registered with add_listener(fn) are called as
+    fn(old_snapshot, new_snapshot) after every swap.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = RegistrySnapshot({t: EntityTable(t, []) for t in ENTITY_TYPES}, 0, None)
+        self._listeners = []
+        self._path = None
+        self._mtime = None
+        self._last_check = 0.0
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def path(self):
+        return self._path
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _swap(self, tables, source):
+        """Build a new snapshot and publish it atomically (caller holds the lock)"""
+        old = self._snapshot
+        new = RegistrySnapshot(tables, old.version + 1, source)
+        self._snapshot = new
+        for listener in self._listeners:
+            listener(old, new)
+        return new
+
+    def load_lists(self, entity_lists, source='memory'):
+        """Replace the registry contents with {entity_type: [record, ...]}"""
+        tables = {t: EntityTable(t, list(entity_lists.get(t, []))) for t in ENTITY_TYPES}
+        with self._lock:
+            return self._swap(tables, source)
+
+    def load_file(self, path):
+        """Load a JSON/CSV snapshot and watch it for changes"""
+        mtime = os.stat(path).st_mtime
+        tables = {t: EntityTable(t, records) for t, records in read_snapshot_file(path).items()}
+        with self._lock:
+            self._path = path
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+            return self._swap(tables, path)
+
+    def maybe_reload(self):
+        """Reload the watched snapshot file if it changed; cheap when it has not"""
+        if self._path is None:
+            return False
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.load_file(self._path)
+        return True
+
+    def upsert(self, entity_type, record):
+        """Add or replace a single entity (copy-on-write of its table)"""
+        with self._lock:
+            snapshot = self._snapshot
+            records = list(snapshot.table(entity_type).records())
+            table = snapshot.tables[entity_type]
+            if record['id'] in table:
+                records[table.row(record['id'])] = record
+            else:
+                records.append(record)
+            tables = dict(snapshot.tables)
+            tables[entity_type] = EntityTable(entity_type, records)
+            return self._swap(tables, snapshot.source)
+
+    def table(self, entity_type):
+        return self._snapshot.table(entity_type)
+
+    def get(self, entity_type, entity_id):
+        """Entity record; raises EntityNotFoundError for unknown ids"""
+        return self._snapshot.table(entity_type).record(entity_id)
+
+    def records(self, entity_type):
+        return self._snapshot.table(entity_type).records()
+
+    def ids(self, entity_type):
+        return self._snapshot.table(entity_type).ids()
+
+    def coords(self, entity_type, entity_id):
+        """(lat, lon) of an entity; raises EntityNotFoundError for unknown ids"""
+        table = self._snapshot.table(entity_type)
+        row = table.row(entity_id)
+        if 'lat' not in table.columns or 'lon' not in table.columns:
+            raise ValueError(f"{entity_type} entities have no location")
+        lat = table.columns['lat'][row]
+        lon = table.columns['lon'][row]
+        if lat is _MISSING or lon is _MISSING:
+            raise ValueError(f"{entity_type} {entity_id} has no location")
+        return float(lat), float(lon)
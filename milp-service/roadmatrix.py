@@ -0,0 +1,458 @@
+"""
+Road Distance / Duration Matrices
+=================================
+Precomputed origin-destination road distances (km) and travel times
+(hours) between located entities, stored as .npy files and memory-mapped
+read-only.
+
+Directory layout (written by `python roadmatrix.py build`):
+    nodes.json       {"nodes": [[entity_type, entity_id], ...], "source": ..., "built_at": ...}
+    distance_km.npy  float32 N x N, NaN where the pair is unknown
+    duration_h.npy   float32 N x N (optional), NaN where unknown
+
+np.load(..., mmap_mode='r') maps the files instead of reading them, so
+opening a 100k-node matrix takes milliseconds, only the rows actually
+looked up are paged in, and every gunicorn worker shares the same
+page-cache copy instead of holding its own. Unknown entities and NaN
+cells are reported as missing, and callers fall back to the great-circle
+estimate.
+
+Rows are origins and columns destinations; matrices may be asymmetric.
+
+Rebuilds never touch files a worker may have mapped (truncating a mapped
+file makes the next lookup fault with SIGBUS). `build --out /data/roads`
+writes a fresh sibling directory (/data/roads.<timestamp>) and then
+atomically repoints the /data/roads symlink at it; workers notice the new
+target on their next maybe_reload() and map it, while older mappings stay
+valid until they are dropped.
+
+CLI:
+    python roadmatrix.py build --entities entities.json --pairs pairs.csv --out /data/roads
+    python roadmatrix.py validate /data/roads --entities entities.json
+
+pairs.csv columns: origin_type, origin_id, destination_type,
+destination_id, distance_km and optionally duration_h (for instance an
+export of a routing engine's table service).
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from distances import EARTH_RADIUS_KM
+from registry import read_snapshot_file
+
+NODES_FILE = 'nodes.json'
+DISTANCE_FILE = 'distance_km.npy'
+DURATION_FILE = 'duration_h.npy'
+
+
+def _map(path):
+    """
+    Memory-map an .npy file read-only; lookups are scattered, so the
+    kernel is told not to read ahead around every touched cell
+    """
+    matrix = np.load(path, mmap_mode='r')
+    if hasattr(mmap, 'MADV_RANDOM') and getattr(matrix, '_mmap', None) is not None:
+        matrix._mmap.madvise(mmap.MADV_RANDOM)
+    return matrix
+
+
+class RoadMatrix:
+    """
+    Read-only, memory-mapped road distance / duration lookup keyed by
+    (entity_type, entity_id)
+
+    Empty until load() is called; lookups on an empty matrix miss.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._state = None  # (directory, index, distance, duration), swapped atomically
+        self._path = None
+        self._target = None
+        self._last_check = 0.0
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    def __len__(self):
+        return 0 if self._state is None else len(self._state[1])
+
+    def __contains__(self, key):
+        return self._state is not None and key in self._state[1]
+
+    def load(self, directory):
+        """
+        Map a matrix directory and watch it for rebuilds; raises
+        ValueError when its files disagree
+        """
+        target = os.path.realpath(directory)
+        directory_path, directory = directory, target
+        with open(os.path.join(directory, NODES_FILE)) as f:
+            nodes = json.load(f)['nodes']
+        index = {}
+        for entity_type, entity_id in nodes:
+            index.setdefault((entity_type, entity_id), len(index))
+        if len(index) != len(nodes):
+            raise ValueError(f"Duplicate nodes in {directory}/{NODES_FILE}")
+
+        distance = _map(os.path.join(directory, DISTANCE_FILE))
+        duration_path = os.path.join(directory, DURATION_FILE)
+        duration = _map(duration_path) if os.path.exists(duration_path) else None
+        for name, matrix in ((DISTANCE_FILE, distance), (DURATION_FILE, duration)):
+            if matrix is not None and matrix.shape != (len(nodes), len(nodes)):
+                raise ValueError(f"{name} has shape {matrix.shape}, expected {(len(nodes), len(nodes))}")
+
+        self._state = (directory, index, distance, duration)
+        self._path = directory_path
+        self._target = target
+        self._last_check = time.monotonic()
+
+    def maybe_reload(self):
+        """
+        Map the matrix again if its directory now resolves to a new build;
+        cheap when it does not. A broken or missing target keeps the
+        current matrix.
+        """
+        if self._path is None:
+            return False
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        if os.path.realpath(self._path) == self._target:
+            return False
+        try:
+            self.load(self._path)
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def lookup(self, key_a, key_b):
+        """(distance_km, duration_h or None) from key_a to key_b, or None if missing"""
+        state = self._state
+        if state is None:
+            return None
+        _, index, distance, duration = state
+        row = index.get(key_a)
+        col = index.get(key_b)
+        if row is None or col is None:
+            return None
+        km = float(distance[row, col])
+        if km != km:  # NaN: pair not routed
+            return None
+        hours = None if duration is None else float(duration[row, col])
+        return km, (None if hours != hours else hours)
+
+    def block(self, keys_a, keys_b):
+        """
+        len(keys_a) x len(keys_b) float64 (distance_km, duration_h) arrays,
+        NaN where missing (duration is all NaN without a duration file)
+        """
+        shape = (len(keys_a), len(keys_b))
+        distance_out = np.full(shape, np.nan)
+        duration_out = np.full(shape, np.nan)
+        state = self._state
+        if state is None:
+            return distance_out, duration_out
+        _, index, distance, duration = state
+        rows = np.array([index.get(k, -1) for k in keys_a], dtype=np.intp)
+        cols = np.array([index.get(k, -1) for k in keys_b], dtype=np.intp)
+        known_rows = np.flatnonzero(rows >= 0)
+        known_cols = np.flatnonzero(cols >= 0)
+        cells = np.ix_(rows[known_rows], cols[known_cols])
+        distance_out[np.ix_(known_rows, known_cols)] = distance[cells]
+        if duration is not None:
+            duration_out[np.ix_(known_rows, known_cols)] = duration[cells]
+        return distance_out, duration_out
+
+    def info(self):
+        """Summary for /health"""
+        state = self._state
+        if state is None:
+            return {'loaded': False}
+        directory, index, distance, duration = state
+        return {
+            'loaded': True,
+            'directory': directory,
+            'nodes': len(index),
+            'has_duration': duration is not None,
+            'mapped_bytes': int(distance.nbytes + (0 if duration is None else duration.nbytes))
+        }
+
+
+# ============================================
+# BUILD / VALIDATE
+# ============================================
+
+def located_nodes(entities_path):
+    """[(entity_type, entity_id, lat, lon), ...] of every entity with a location in a snapshot"""
+    nodes = []
+    for entity_type, records in read_snapshot_file(entities_path).items():
+        for e in records:
+            if 'lat' in e and 'lon' in e:
+                nodes.append((entity_type, e['id'], e['lat'], e['lon']))
+    return nodes
+
+
+def _parse_id(text):
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _read_pairs(path, index, chunk_rows):
+    """Yield (rows, cols, distance_km, duration_h or None, unknown count) per CSV chunk"""
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        has_duration = 'duration_h' in reader.fieldnames
+        while True:
+            rows, cols, km, hours = [], [], [], []
+            unknown = 0
+            for record in reader:
+                row = index.get((record['origin_type'], _parse_id(record['origin_id'])))
+                col = index.get((record['destination_type'], _parse_id(record['destination_id'])))
+                if row is None or col is None:
+                    unknown += 1
+                else:
+                    rows.append(row)
+                    cols.append(col)
+                    km.append(float(record['distance_km']))
+                    if has_duration:
+                        hours.append(float(record['duration_h']) if record['duration_h'] != '' else np.nan)
+                if len(rows) + unknown >= chunk_rows:
+                    break
+            if not rows and not unknown:
+                return
+            yield (
+                np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp),
+                np.array(km), np.array(hours) if has_duration else None, unknown
+            )
+
+
+def _publish(out_dir, build_dir, keep):
+    """
+    Atomically point the out_dir symlink at build_dir, then delete all
+    but the newest `keep` older builds (unlinking is safe for workers
+    that still map them; only truncation is not)
+    """
+    parent, name = os.path.split(os.path.abspath(out_dir))
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # Directory from before versioned builds: move it aside intact, so
+        # existing mappings stay valid, and link to the new build in its place
+        os.rename(out_dir, os.path.join(parent, f"{name}.{time.strftime('%Y%m%dT%H%M%S')}-legacy"))
+    link = os.path.join(parent, f".{name}.{os.getpid()}.link")
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, out_dir)
+
+    previous = sorted(
+        (os.stat(os.path.join(parent, entry, NODES_FILE)).st_mtime, entry) for entry in os.listdir(parent)
+        if entry.startswith(name + '.') and os.path.join(parent, entry) != build_dir
+        and os.path.isfile(os.path.join(parent, entry, NODES_FILE))
+    )
+    for _, entry in previous[:max(len(previous) - keep, 0)]:
+        shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def build(out_dir, nodes, pairs_path, symmetric=False, chunk_rows=1_000_000, block_rows=1024, keep=1):
+    """
+    Write a matrix for `nodes` from a pairs CSV and publish it as out_dir
+
+    The files go to a new sibling directory, out_dir.<timestamp>, and
+    out_dir becomes a symlink to it only once they are complete, so
+    workers mapping the previous build are never disturbed. `keep`
+    earlier builds are kept for rollback (re-point the symlink).
+
+    The .npy files are filled through np.lib.format.open_memmap, so
+    memory use stays bounded by the CSV chunk and row-block sizes no
+    matter how large the matrix is. With symmetric=True every pair is
+    also written in the reverse direction unless that direction is
+    listed itself.
+    """
+    parent, name = os.path.split(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f"{name}.{time.strftime('%Y%m%dT%H%M%S')}-", dir=parent)
+    os.chmod(build_dir, 0o755)
+    try:
+        summary = _write_matrix(build_dir, nodes, pairs_path, symmetric, chunk_rows, block_rows)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    _publish(out_dir, build_dir, keep)
+    summary['directory'] = build_dir
+    return summary
+
+
+def _write_matrix(out_dir, nodes, pairs_path, symmetric, chunk_rows, block_rows):
+    """Fill the .npy files and nodes.json of a new (empty) matrix directory"""
+    keys = [(entity_type, entity_id) for entity_type, entity_id, _, _ in nodes]
+    index = {key: i for i, key in enumerate(keys)}
+    n = len(keys)
+
+    with open(pairs_path, newline='') as f:
+        has_duration = 'duration_h' in (csv.DictReader(f).fieldnames or [])
+
+    matrices = [np.lib.format.open_memmap(os.path.join(out_dir, DISTANCE_FILE), mode='w+', dtype=np.float32, shape=(n, n))]
+    if has_duration:
+        matrices.append(np.lib.format.open_memmap(os.path.join(out_dir, DURATION_FILE), mode='w+', dtype=np.float32, shape=(n, n)))
+    for matrix in matrices:
+        for start in range(0, n, block_rows):
+            matrix[start:start + block_rows] = np.nan
+        matrix[np.arange(n), np.arange(n)] = 0
+
+    listed = unknown = 0
+    passes = (False, True) if symmetric else (False,)
+    for reverse in passes:
+        for rows, cols, km, hours, skipped in _read_pairs(pairs_path, index, chunk_rows):
+            if reverse:
+                # Mirror only into cells the CSV left empty
+                rows, cols = cols, rows
+                empty = np.isnan(matrices[0][rows, cols])
+                rows, cols, km = rows[empty], cols[empty], km[empty]
+                hours = None if hours is None else hours[empty]
+            else:
+                listed += len(rows)
+                unknown += skipped
+            matrices[0][rows, cols] = km
+            if hours is not None:
+                matrices[1][rows, cols] = hours
+    for matrix in matrices:
+        matrix.flush()
+
+    with open(os.path.join(out_dir, NODES_FILE), 'w') as f:
+        json.dump({
+            'nodes': [list(key) for key in keys],
+            'source': os.path.abspath(pairs_path),
+            'built_at': time.time(),
+            'symmetric': symmetric
+        }, f)
+    return {'nodes': n, 'pairs_listed': listed, 'pairs_unknown_entities': unknown, 'has_duration': has_duration}
+
+
+def validate(directory, nodes=None, sample=100_000, seed=0, tolerance=0.01, block_rows=1024):
+    """
+    Check a matrix directory; returns a report with 'errors' and 'warnings'
+
+    Structure (shapes, duplicate nodes), value ranges (negative entries,
+    non-zero diagonal) and coverage are checked in row blocks. With the
+    entity `nodes` (as from located_nodes), a random sample of pairs is
+    compared against the great-circle distance: a road shorter than it
+    (beyond `tolerance`) is an error, and implied speeds outside 5-150
+    km/h are a warning.
+    """
+    report = {'directory': directory, 'errors': [], 'warnings': []}
+    matrix = RoadMatrix()
+    try:
+        matrix.load(directory)
+    except (OSError, ValueError, KeyError) as e:
+        report['errors'].append(f"Cannot load: {e}")
+        return report
+    _, index, distance, duration = matrix._state
+    n = len(index)
+    report['nodes'] = n
+    report['has_duration'] = duration is not None
+
+    missing = negative = 0
+    diagonal = 0
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        for name, values in (('distance', distance), ('duration', duration)):
+            if values is None:
+                continue
+            block = np.asarray(values[start:stop])
+            if name == 'distance':
+                missing += int(np.isnan(block).sum())
+            negative += int((block < 0).sum())
+            diagonal += int(np.count_nonzero(np.nan_to_num(block[np.arange(stop - start), np.arange(start, stop)])))
+    report['coverage'] = round(1 - missing / (n * n), 6) if n else 0.0
+    if negative:
+        report['errors'].append(f"{negative} negative entries")
+    if diagonal:
+        report['errors'].append(f"{diagonal} non-zero diagonal entries")
+    if report['coverage'] < 1:
+        report['warnings'].append(f"{missing} pairs missing; lookups fall back to great-circle distance")
+
+    if nodes is not None:
+        located = {(t, i): (lat, lon) for t, i, lat, lon in nodes}
+        absent = [key for key in located if key not in index]
+        report['entities_missing'] = len(absent)
+        if absent:
+            report['warnings'].append(f"{len(absent)} located entities are not in the matrix, e.g. {list(absent[0])}")
+
+        keys = [key for key in index if key in located]
+        if len(keys) > 1:
+            rng = np.random.default_rng(seed)
+            a = rng.integers(0, len(keys), sample)
+            b = rng.integers(0, len(keys), sample)
+            rows = np.array([index[keys[i]] for i in a.tolist()], dtype=np.intp)
+            cols = np.array([index[keys[i]] for i in b.tolist()], dtype=np.intp)
+            lat_a, lon_a = np.radians(np.array([located[keys[i]] for i in a.tolist()])).T
+            lat_b, lon_b = np.radians(np.array([located[keys[i]] for i in b.tolist()])).T
+            great_circle = _pairwise_haversine(lat_a, lon_a, lat_b, lon_b)
+            road = distance[rows, cols].astype(np.float64)
+            routed = ~np.isnan(road)
+            shorter = int((road[routed] < great_circle[routed] * (1 - tolerance) - 0.5).sum())
+            report['sampled_pairs'] = int(routed.sum())
+            report['shorter_than_great_circle'] = shorter
+            if shorter:
+                report['errors'].append(f"{shorter} sampled pairs are shorter than their great-circle distance")
+            if duration is not None:
+                hours = duration[rows, cols].astype(np.float64)
+                timed = routed & (hours > 0) & (road > 1)
+                speed = road[timed] / hours[timed]
+                implausible = int(((speed < 5) | (speed > 150)).sum())
+                report['implausible_speeds'] = implausible
+                if implausible:
+                    report['warnings'].append(f"{implausible} sampled pairs imply speeds outside 5-150 km/h")
+    return report
+
+
+def _pairwise_haversine(lat_a, lon_a, lat_b, lon_b):
+    """Element-wise Haversine distance (km) between matching points, inputs in radians"""
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='write a matrix directory from a pairs CSV')
+    build_parser.add_argument('--entities', required=True, help='entity snapshot (JSON/CSV) listing the nodes')
+    build_parser.add_argument('--pairs', required=True, help='CSV of routed origin-destination pairs')
+    build_parser.add_argument('--out', required=True, help='output directory')
+    build_parser.add_argument('--symmetric', action='store_true', help='mirror pairs listed in one direction only')
+
+    validate_parser = commands.add_parser('validate', help='check a matrix directory')
+    validate_parser.add_argument('directory')
+    validate_parser.add_argument('--entities', help='entity snapshot to check coverage and great-circle bounds against')
+    validate_parser.add_argument('--sample', type=int, default=100_000)
+    validate_parser.add_argument('--tolerance', type=float, default=0.01)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        start = time.perf_counter()
+        summary = build(args.out, located_nodes(args.entities), args.pairs, symmetric=args.symmetric)
+        summary['seconds'] = round(time.perf_counter() - start, 2)
+        print(json.dumps(summary, indent=2))
+        report = validate(args.out)
+    else:
+        nodes = located_nodes(args.entities) if args.entities else None
+        report = validate(args.directory, nodes, sample=args.sample, tolerance=args.tolerance)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
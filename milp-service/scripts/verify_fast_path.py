@@ -0,0 +1,110 @@
+"""
+Randomized equivalence check: analytic fast path vs CBC
+=======================================================
+Generates random fleets and orders, runs the single-transporter model
+through both the analytic engine and CBC, and verifies that both reach
+the same status and the same optimal objective value (and the same
+transporter whenever the optimum is unique).
+
+Usage:
+    python scripts/verify_fast_path.py --trials 500 --seed 7
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as service  # noqa: E402
+
+
+def random_fleet(rng, size):
+    """Random transporter table in the TRANSPORTERS format"""
+    return [
+        {
+            'id': i,
+            'name': f'Transporter {i}',
+            'vehicle': 'Truck',
+            'cold_chain': rng.random() < 0.5,
+            'capacity': rng.choice([500, 1000, 1500, 2000, 3000]),
+            'cost_per_km': rng.randint(5, 20),
+            'speed_kmph': rng.randint(35, 70),
+            'quality': round(rng.uniform(0.7, 0.99), 2)
+        }
+        for i in range(1, size + 1)
+    ]
+
+
+def run(trials, seed, max_fleet):
+    rng = random.Random(seed)
+    base = {entity_type: service.REGISTRY.records(entity_type) for entity_type in service.SAMPLE_ENTITIES}
+    lanes = [
+        (source_type, source_id, dest_type, dest_id)
+        for source_type in ('harvester', 'distributor')
+        for dest_type in ('wholesaler', 'retailer')
+        for source_id in service.REGISTRY.ids(source_type)
+        for dest_id in service.REGISTRY.ids(dest_type)
+    ]
+    mismatches = 0
+    timings = {'analytic': 0.0, 'milp': 0.0}
+    
+    try:
+        for trial in range(trials):
+            service.REGISTRY.load_lists(dict(base, transporter=random_fleet(rng, rng.randint(1, max_fleet))))
+            source_type, source_id, dest_type, dest_id = rng.choice(lanes)
+            quantity = rng.randint(100, 3000)
+            freshness_life_hours = rng.randint(4, 96)
+            priority = rng.choice(list(service.PRIORITY_WEIGHTS))
+            require_cold_chain = rng.random() < 0.5
+            
+            metrics = service.compute_transporter_metrics(
+                source_type, source_id, dest_type, dest_id, freshness_life_hours
+            )
+            coefficients = service.objective_coefficients(metrics, service.PRIORITY_WEIGHTS[priority])
+            excluded = service.infeasible_transporters(metrics, quantity, freshness_life_hours, require_cold_chain)
+            
+            start = time.perf_counter()
+            fast_id = service.select_transporter_analytic(coefficients, excluded)
+            timings['analytic'] += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            status, milp_id, _ = service.solve_route_milp(coefficients, excluded)
+            timings['milp'] += time.perf_counter() - start
+            
+            fast_status = 'Optimal' if fast_id is not None else 'Infeasible'
+            ok = fast_status == status
+            if ok and fast_id is not None:
+                ok = abs(coefficients[fast_id] - coefficients[milp_id]) <= 1e-9
+                optimum_unique = sum(
+                    1 for t_id, c in coefficients.items()
+                    if t_id not in excluded and abs(c - coefficients[fast_id]) <= 1e-9
+                ) == 1
+                if optimum_unique:
+                    ok = ok and fast_id == milp_id
+            
+            if not ok:
+                mismatches += 1
+                print(f"MISMATCH trial={trial} analytic={fast_status}/{fast_id} milp={status}/{milp_id}")
+    finally:
+        service.REGISTRY.load_lists(base)
+    
+    print(f"trials: {trials}  mismatches: {mismatches}")
+    print(f"analytic: {timings['analytic'] / trials * 1e6:.1f} us/solve")
+    print(f"milp:     {timings['milp'] / trials * 1e3:.1f} ms/solve")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-fleet', type=int, default=12)
+    args = parser.parse_args()
+    sys.exit(1 if run(args.trials, args.seed, args.max_fleet) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Solver Slots
+============
+Host-wide limit on concurrent solver runs, shared by every gunicorn
+worker process and thread, so a traffic spike queues solves instead of
+starting one CBC process per request thread.
+
+- `slots` slot files in a shared directory; a running solve holds an
+  exclusive flock on one of them (the kernel releases it if the
+  process dies)
+- Priority lanes: 'interactive' waiters go before 'bulk' waiters of
+  the same process, and bulk waiters on the whole host stand back while
+  any interactive request is waiting
+- Deadlines: a waiter gives up at its deadline (503), and is rejected
+  at once when the expected wait already runs past it
+- Bounded: at most `max_waiting` waiters per lane and process (429)
+- Re-entrant: a nested acquire in a context that already holds a slot
+  (a simulation chunk running a MILP) does not take a second one
+
+Lane and deadline come from the current context (request_context()),
+so the solver code does not need to know about HTTP. Without fcntl
+(non-POSIX hosts) the slots are per process.
+"""
+
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import phase
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+# Longest sleep between checks for a slot freed by another process
+POLL_MAX_SECONDS = 0.02
+
+# Weight of the latest hold time in the moving average used for wait estimates
+HOLD_SMOOTHING = 0.2
+
+
+class SolverBusyError(RuntimeError):
+    """
+    Raised when no solver slot can be had in time
+
+    status: 429 when the lane's queue is full, 503 when the deadline
+    passes (or would pass) before a slot frees up; retry_after in seconds.
+    """
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+_context = contextvars.ContextVar('solver_slot_context', default=(BULK, None))
+_holding = contextvars.ContextVar('solver_slot_holding', default=False)
+
+
+def set_request_context(lane, deadline=None):
+    """Lane and deadline (a time.monotonic() value) for solves in the current context"""
+    _context.set((lane, deadline))
+
+
+@contextmanager
+def request_context(lane, deadline=None):
+    """set_request_context() for the duration of a block"""
+    token = _context.set((lane, deadline))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class SolverSlots:
+    """A fixed number of solver slots with priority lanes and deadlines"""
+
+    def __init__(self, slots, directory=None, max_waiting=64):
+        self.slots = max(1, int(slots))
+        self.max_waiting = max_waiting
+        self.directory = directory if fcntl is not None else None
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        self._reset()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """Drop the parent's descriptors in a forked child without unlocking them"""
+        for fd in list(self._fds.values()) + [self._marker_fd, self._probe_fd]:
+            if fd is not None:
+                os.close(fd)
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of [lane rank, sequence]
+        self._sequence = itertools.count()
+        self._waiting_by_lane = dict.fromkeys(LANES, 0)
+        self._held = set()
+        self._fds = {}
+        self._marker_fd = None
+        self._probe_fd = None
+        self._hold_seconds = None
+        self.granted = dict.fromkeys(LANES, 0)
+        self.rejected = {(lane, reason): 0 for lane in LANES for reason in ('queue_full', 'deadline')}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self, name):
+        return os.open(self._path(name), os.O_RDWR | os.O_CREAT | getattr(os, 'O_CLOEXEC', 0), 0o666)
+
+    # --------------------------------------------
+    # Slot and marker locks (called with _cond held)
+    # --------------------------------------------
+
+    def _interactive_waiting_elsewhere(self):
+        """True while an interactive waiter of another process holds the shared marker lock"""
+        if self.directory is None:
+            return False
+        if self._probe_fd is None:
+            self._probe_fd = self._open('interactive.lock')
+        try:
+            fcntl.flock(self._probe_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(self._probe_fd, fcntl.LOCK_UN)
+        return False
+
+    def _mark_interactive(self, waiting):
+        if self.directory is None:
+            return
+        if waiting:
+            if self._marker_fd is None:
+                self._marker_fd = self._open('interactive.lock')
+            fcntl.flock(self._marker_fd, fcntl.LOCK_SH)
+        else:
+            fcntl.flock(self._marker_fd, fcntl.LOCK_UN)
+
+    def _try_take(self, lane):
+        if lane == BULK and (self._waiting_by_lane[INTERACTIVE] or self._interactive_waiting_elsewhere()):
+            return None
+        for slot in range(self.slots):
+            if slot in self._held:
+                continue
+            if self.directory is not None:
+                fd = self._fds.get(slot)
+                if fd is None:
+                    fd = self._fds[slot] = self._open(f'slot-{slot}.lock')
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+            self._held.add(slot)
+            return slot
+        return None
+
+    def _give_back(self, slot):
+        self._held.discard(slot)
+        if self.directory is not None:
+            fcntl.flock(self._fds[slot], fcntl.LOCK_UN)
+
+    # --------------------------------------------
+    # Waiting
+    # --------------------------------------------
+
+    def _expected_wait(self, ahead):
+        """Estimated seconds until a slot frees up for a waiter with `ahead` waiters in front"""
+        if self._hold_seconds is None:
+            return 0.0
+        return math.ceil((ahead + 1) / self.slots) * self._hold_seconds
+
+    def _reject(self, lane, reason, message, status, retry_after):
+        self.rejected[(lane, reason)] += 1
+        raise SolverBusyError(message, status, max(1, math.ceil(retry_after)))
+
+    def _enqueue(self, lane, deadline):
+        """Take a free slot at once or join the lane's queue; returns (slot, None) or (None, entry)"""
+        rank = LANES.index(lane)
+        if deadline is not None and time.monotonic() >= deadline:
+            self._reject(lane, 'deadline', "The request deadline has already passed", 503, 0)
+        if not any(entry[0] <= rank for entry in self._waiting):
+            slot = self._try_take(lane)
+            if slot is not None:
+                return slot, None
+        ahead = sum(1 for entry in self._waiting if entry[0] <= rank)
+        expected = self._expected_wait(ahead)
+        if self._waiting_by_lane[lane] >= self.max_waiting:
+            self._reject(lane, 'queue_full', f"Too many {lane} solves waiting", 429, expected)
+        if deadline is not None and time.monotonic() + expected >= deadline:
+            self._reject(lane, 'deadline', "No solver slot can be had before the request deadline", 503, expected)
+
+        entry = [rank, next(self._sequence)]
+        heapq.heappush(self._waiting, entry)
+        self._waiting_by_lane[lane] += 1
+        if lane == INTERACTIVE and self._waiting_by_lane[INTERACTIVE] == 1:
+            self._mark_interactive(True)
+        return None, entry
+
+    def _dequeue(self, lane, entry):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._waiting_by_lane[lane] -= 1
+        if lane == INTERACTIVE and self._waiting_by_lane[INTERACTIVE] == 0:
+            self._mark_interactive(False)
+        self._cond.notify_all()
+
+    def acquire(self, lane=None, deadline=None):
+        """
+        Wait for a slot; returns its index. lane / deadline default to the
+        current context's. Raises SolverBusyError (429 or 503).
+        """
+        context_lane, context_deadline = _context.get()
+        lane = lane or context_lane
+        deadline = context_deadline if deadline is None else deadline
+
+        with self._cond:
+            slot, entry = self._enqueue(lane, deadline)
+            delay = 0.001
+            while slot is None:
+                if self._waiting[0] is entry:
+                    slot = self._try_take(lane)
+                    if slot is not None:
+                        break
+                timeout = delay
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        self._dequeue(lane, entry)
+                        self._reject(
+                            lane, 'deadline', "No solver slot freed up before the request deadline",
+                            503, self._expected_wait(len(self._waiting))
+                        )
+                # Local releases notify; slots freed by other processes are found by polling
+                self._cond.wait(timeout)
+                delay = min(delay * 2, POLL_MAX_SECONDS)
+            if entry is not None:
+                self._dequeue(lane, entry)
+            self.granted[lane] += 1
+        return slot
+
+    def release(self, slot, held_seconds=None):
+        with self._cond:
+            self._give_back(slot)
+            if held_seconds is not None:
+                if self._hold_seconds is None:
+                    self._hold_seconds = held_seconds
+                else:
+                    self._hold_seconds += HOLD_SMOOTHING * (held_seconds - self._hold_seconds)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane=None, deadline=None):
+        """Hold a slot for the block (no-op if the current context already holds one)"""
+        if _holding.get():
+            yield
+            return
+        with phase('slot_wait'):
+            slot = self.acquire(lane, deadline)
+        token = _holding.set(True)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            _holding.reset(token)
+            self.release(slot, time.monotonic() - start)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'shared': self.directory is not None,
+                'busy_in_process': len(self._held),
+                'waiting': dict(self._waiting_by_lane),
+                'granted': dict(self.granted),
+                'rejected': {f'{lane}:{reason}': count for (lane, reason), count in self.rejected.items()},
+                'avg_hold_seconds': None if self._hold_seconds is None else round(self._hold_seconds, 6)
+            }
+
+
+SOLVER_SLOTS = SolverSlots(
+    slots=int(os.environ.get('SOLVER_SLOTS', os.cpu_count() or 1)),
+    directory=os.environ.get('SOLVER_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'milp-solver-slots')),
+    max_waiting=int(os.environ.get('SOLVER_QUEUE_LIMIT', 64))
+)
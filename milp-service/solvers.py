@@ -0,0 +1,336 @@
+"""
+Solver Backends
+===============
+Pluggable MILP backends for PuLP models with per-solve time limits,
+relative MIP gap targets and thread counts.
+
+Backends:
+- 'cbc':   PuLP's bundled CBC binary (model written to temp files,
+           solved in a subprocess)
+- 'highs': HiGHS in-process through the highspy bindings (optional
+           dependency; no temp files or subprocess)
+
+Every solve returns statistics (wall time, branch-and-bound nodes,
+final relative gap) and leaves the solution in the PuLP variables, so
+callers read results exactly as after prob.solve().
+
+HighsSession keeps one model loaded in HiGHS across solves, for callers
+that re-solve the same structure with new costs, bounds or extra rows.
+
+Every run holds one of the host's solver slots (see slots.py) and may
+raise SolverBusyError when none frees up in time.
+"""
+
+import math
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+from pulp import (
+    LpConstraintGE, LpConstraintLE, LpMaximize, LpSolution,
+    LpSolutionInfeasible, LpSolutionIntegerFeasible, LpSolutionNoSolutionFound,
+    LpSolutionOptimal, LpSolutionUnbounded, LpStatus, LpStatusInfeasible,
+    LpStatusNotSolved, LpStatusOptimal, LpStatusUnbounded, PULP_CBC_CMD
+)
+
+from metrics import SOLVER_SECONDS, SOLVER_SOLVES, phase
+from slots import SOLVER_SLOTS
+
+try:
+    import highspy
+except ImportError:  # optional dependency
+    highspy = None
+
+DEFAULT_BACKEND = os.environ.get('SOLVER_BACKEND', 'cbc')
+DEFAULT_TIME_LIMIT = float(os.environ.get('SOLVER_TIME_LIMIT', 30))
+
+
+class SolverUnavailableError(RuntimeError):
+    """Raised when a requested backend is unknown or not installed"""
+
+
+def available_backends():
+    """Names of the backends usable in this environment"""
+    backends = ['cbc']
+    if highspy is not None:
+        backends.append('highs')
+    return backends
+
+
+def solver_options_from_request(data):
+    """Normalize the optional "solver" block of a request body"""
+    options = data or {}
+    return {
+        'backend': options.get('backend'),
+        'time_limit': options.get('time_limit_seconds'),
+        'gap_rel': options.get('gap_rel'),
+        'threads': options.get('threads')
+    }
+
+
+def solve(prob, backend=None, time_limit=None, gap_rel=None, threads=None, warm_start=False):
+    """
+    Solve a PuLP problem with the chosen backend
+
+    warm_start passes the variables' initial values (setInitialValue) to
+    CBC as a starting incumbent.
+
+    Returns a stats dict: backend, status, solution_status, wall_seconds,
+    nodes, gap, objective and the limits that were applied.
+    """
+    backend = backend or DEFAULT_BACKEND
+    time_limit = DEFAULT_TIME_LIMIT if time_limit is None else time_limit
+
+    with SOLVER_SLOTS.slot(), phase('solve'):
+        if backend == 'cbc':
+            stats = _solve_cbc(prob, time_limit, gap_rel, threads, warm_start)
+        elif backend == 'highs':
+            if highspy is None:
+                raise SolverUnavailableError("The 'highs' backend requires the highspy package")
+            stats = _solve_highs(prob, time_limit, gap_rel, threads)
+        else:
+            raise SolverUnavailableError(f"Unknown solver backend: {backend}")
+
+    return _finish_stats(prob, stats, backend, time_limit, gap_rel, threads)
+
+
+def _finish_stats(prob, stats, backend, time_limit, gap_rel, threads):
+    """Add status, objective and limits to backend stats and record solver metrics"""
+    objective = prob.objective.value() if prob.objective is not None else None
+    stats.update({
+        'backend': backend,
+        'status': LpStatus[prob.status],
+        'solution_status': LpSolution[prob.sol_status],
+        'objective': objective,
+        'time_limit_seconds': time_limit,
+        'gap_rel': gap_rel,
+        'threads': threads
+    })
+    SOLVER_SECONDS.observe(stats['wall_seconds'], backend=backend)
+    SOLVER_SOLVES.inc(backend=backend, status=stats['status'])
+    return stats
+
+
+# ============================================
+# CBC (subprocess)
+# ============================================
+
+_CBC_NODES = re.compile(r'^Enumerated nodes:\s+(\d+)', re.MULTILINE)
+_CBC_GAP = re.compile(r'^Gap:\s+([-\d.eE+]+)', re.MULTILINE)
+
+
+def _solve_cbc(prob, time_limit, gap_rel, threads, warm_start=False):
+    fd, log_path = tempfile.mkstemp(suffix='.log', prefix='cbc_')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        prob.solve(PULP_CBC_CMD(
+            msg=0, timeLimit=time_limit, gapRel=gap_rel, threads=threads,
+            logPath=log_path, warmStart=warm_start
+        ))
+        wall_seconds = time.perf_counter() - start
+        with open(log_path) as f:
+            log = f.read()
+    finally:
+        os.remove(log_path)
+
+    nodes = _CBC_NODES.search(log)
+    gap = _CBC_GAP.search(log)
+    if gap is not None:
+        gap = float(gap.group(1))
+    elif prob.sol_status == LpSolutionOptimal:
+        gap = 0.0
+
+    return {
+        'wall_seconds': round(wall_seconds, 6),
+        'nodes': int(nodes.group(1)) if nodes else 0,
+        'gap': gap
+    }
+
+
+# ============================================
+# HiGHS (in-process)
+# ============================================
+
+def _to_highs_lp(prob):
+    """Translate a PuLP problem into a row-wise HighsLp; returns (lp, variables)"""
+    inf = highspy.kHighsInf
+    variables = prob.variables()
+    column = {v.name: j for j, v in enumerate(variables)}
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = len(variables)
+    lp.num_row_ = len(prob.constraints)
+
+    cost = [0.0] * len(variables)
+    offset = 0.0
+    if prob.objective is not None:
+        for v, coef in prob.objective.items():
+            cost[column[v.name]] = coef
+        offset = prob.objective.constant
+    lp.col_cost_ = cost
+    lp.offset_ = offset
+    lp.sense_ = highspy.ObjSense.kMaximize if prob.sense == LpMaximize else highspy.ObjSense.kMinimize
+    lp.col_lower_ = [-inf if v.lowBound is None else v.lowBound for v in variables]
+    lp.col_upper_ = [inf if v.upBound is None else v.upBound for v in variables]
+    lp.integrality_ = [
+        highspy.HighsVarType.kInteger if v.cat == 'Integer' else highspy.HighsVarType.kContinuous
+        for v in variables
+    ]
+
+    row_lower, row_upper, starts, index, values = [], [], [0], [], []
+    for constraint in prob.constraints.values():
+        rhs = -constraint.constant
+        if constraint.sense == LpConstraintLE:
+            row_lower.append(-inf)
+            row_upper.append(rhs)
+        elif constraint.sense == LpConstraintGE:
+            row_lower.append(rhs)
+            row_upper.append(inf)
+        else:
+            row_lower.append(rhs)
+            row_upper.append(rhs)
+        for v, coef in constraint.items():
+            index.append(column[v.name])
+            values.append(coef)
+        starts.append(len(index))
+
+    lp.row_lower_ = row_lower
+    lp.row_upper_ = row_upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = starts
+    lp.a_matrix_.index_ = index
+    lp.a_matrix_.value_ = values
+    return lp, variables
+
+
+def _solve_highs(prob, time_limit, gap_rel, threads):
+    start = time.perf_counter()
+    lp, variables = _to_highs_lp(prob)
+
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    if time_limit is not None:
+        h.setOptionValue('time_limit', float(time_limit))
+    if gap_rel is not None:
+        h.setOptionValue('mip_rel_gap', float(gap_rel))
+    if threads is not None:
+        h.setOptionValue('threads', int(threads))
+    h.passModel(lp)
+    h.run()
+    wall_seconds = time.perf_counter() - start
+    return _read_highs_solution(h, prob, variables, wall_seconds)
+
+
+def _read_highs_solution(h, prob, variables, wall_seconds):
+    """Copy a HiGHS run's status and solution into the PuLP problem; returns backend stats"""
+    model_status = h.getModelStatus()
+    info = h.getInfo()
+    has_solution = info.primal_solution_status == highspy.kSolutionStatusFeasible
+
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        prob.status, prob.sol_status = LpStatusOptimal, LpSolutionOptimal
+    elif model_status == highspy.HighsModelStatus.kInfeasible:
+        prob.status, prob.sol_status = LpStatusInfeasible, LpSolutionInfeasible
+    elif model_status in (highspy.HighsModelStatus.kUnbounded, highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        prob.status, prob.sol_status = LpStatusUnbounded, LpSolutionUnbounded
+    elif has_solution:
+        # Stopped on a limit with an incumbent, as CBC reports it
+        prob.status, prob.sol_status = LpStatusOptimal, LpSolutionIntegerFeasible
+    else:
+        prob.status, prob.sol_status = LpStatusNotSolved, LpSolutionNoSolutionFound
+
+    if has_solution:
+        col_value = h.getSolution().col_value
+        prob.assignVarsVals({v.name: col_value[j] for j, v in enumerate(variables)})
+
+    gap = info.mip_gap if any(v.cat == 'Integer' for v in variables) else 0.0
+    return {
+        'wall_seconds': round(wall_seconds, 6),
+        'nodes': int(max(info.mip_node_count, 0)),
+        'gap': None if gap is None or math.isinf(gap) else gap
+    }
+
+
+class HighsSession:
+    """
+    A PuLP problem loaded once into an in-process HiGHS instance
+
+    Costs, bounds and extra rows are changed in place between solves
+    (mirror the same changes on the PuLP objects so objective values and
+    names stay meaningful); run() re-solves, optionally starting from the
+    previous solution, and writes the result back into the PuLP
+    variables like solve() does. Not thread-safe: use one per thread.
+    """
+
+    def __init__(self, prob):
+        if highspy is None:
+            raise SolverUnavailableError("The 'highs' backend requires the highspy package")
+        self.prob = prob
+        lp, self.variables = _to_highs_lp(prob)
+        self.column = {v.name: j for j, v in enumerate(self.variables)}
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.passModel(lp)
+        self._default_gap = self.highs.getOptionValue('mip_rel_gap')[1]
+        self._threads = None
+        self._last_solution = None
+
+    def _columns(self, variables):
+        return np.array([self.column[v.name] for v in variables], dtype=np.int32)
+
+    def set_costs(self, costs):
+        """costs: {variable: objective coefficient}"""
+        columns = self._columns(costs)
+        self.highs.changeColsCost(len(columns), columns, np.array(list(costs.values()), dtype=np.float64))
+
+    def set_bounds(self, bounds):
+        """bounds: {variable: (lower, upper)}"""
+        columns = self._columns(bounds)
+        lower = np.array([b[0] for b in bounds.values()], dtype=np.float64)
+        upper = np.array([b[1] for b in bounds.values()], dtype=np.float64)
+        self.highs.changeColsBounds(len(columns), columns, lower, upper)
+
+    def add_rows(self, constraints):
+        """Append PuLP constraints as rows; returns their row indices for delete_rows()"""
+        inf = highspy.kHighsInf
+        first = self.highs.getNumRow()
+        for constraint in constraints:
+            rhs = -constraint.constant
+            lower = -inf if constraint.sense == LpConstraintLE else rhs
+            upper = inf if constraint.sense == LpConstraintGE else rhs
+            columns = self._columns(list(constraint.keys()))
+            values = np.array(list(constraint.values()), dtype=np.float64)
+            self.highs.addRow(lower, upper, len(columns), columns, values)
+        return np.arange(first, self.highs.getNumRow(), dtype=np.int32)
+
+    def delete_rows(self, rows):
+        if len(rows):
+            self.highs.deleteRows(len(rows), rows)
+
+    def run(self, time_limit=None, gap_rel=None, threads=None, warm_start=False):
+        """Re-solve; returns the same stats dict as solve()"""
+        time_limit = DEFAULT_TIME_LIMIT if time_limit is None else time_limit
+        h = self.highs
+        h.setOptionValue('time_limit', float(time_limit))
+        h.setOptionValue('mip_rel_gap', self._default_gap if gap_rel is None else float(gap_rel))
+        if threads is not None and threads != self._threads:
+            h.setOptionValue('threads', int(threads))
+            self._threads = threads
+        if warm_start and self._last_solution is not None:
+            start_solution = highspy.HighsSolution()
+            start_solution.col_value = self._last_solution
+            start_solution.value_valid = True
+            h.setSolution(start_solution)
+
+        with SOLVER_SLOTS.slot(), phase('solve'):
+            start = time.perf_counter()
+            h.run()
+            stats = _read_highs_solution(h, self.prob, self.variables, time.perf_counter() - start)
+
+        if self.prob.sol_status in (LpSolutionOptimal, LpSolutionIntegerFeasible):
+            self._last_solution = list(h.getSolution().col_value)
+        stats['warm_start'] = bool(warm_start and self._last_solution is not None)
+        return _finish_stats(self.prob, stats, 'highs', time_limit, gap_rel, threads)
@@ -0,0 +1,189 @@
+"""
+Spatial Grid Index
+==================
+Uniform latitude/longitude grid over located entities for radius and
+nearest-neighbour queries, so models only generate candidates that can
+possibly be reached instead of every pair in a national registry.
+
+- Points are bucketed into square cells of `cell_km` (in degrees of
+  latitude); cell members are stored contiguously (CSR layout)
+- A radius query selects the occupied cells intersecting the exact
+  great-circle bounding box of the search circle, then filters the
+  candidates by their Haversine distance: no point within the radius is
+  ever missed, including across the antimeridian and near the poles
+- Nearest-K grows the search radius until K points lie inside it
+- pairs_within() answers many radius queries at once, one distance
+  block per occupied query cell
+"""
+
+import math
+
+import numpy as np
+
+from distances import EARTH_RADIUS_KM, haversine_block
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# Widen every search radius by this much so float rounding between the
+# bounding box and the distance formula never drops a boundary point
+RADIUS_SLACK = 1e-9
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    (lat_lo, lat_hi, lon_lo, lon_hi) in degrees enclosing every point
+    within radius_km of (lat, lon); the longitude span is 360 degrees
+    when the circle contains a pole
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_rad = math.radians(lat)
+    lat_lo = lat_rad - angle
+    lat_hi = lat_rad + angle
+    if lat_lo <= -math.pi / 2 or lat_hi >= math.pi / 2 or angle >= math.pi / 2:
+        return max(-90.0, math.degrees(lat_lo)), min(90.0, math.degrees(lat_hi)), -180.0, 180.0
+    delta_lon = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(lat_rad))))
+    return math.degrees(lat_lo), math.degrees(lat_hi), lon - delta_lon, lon + delta_lon
+
+
+def fraction_within(lat_a, lon_a, lat_b, lon_b, radius_km, sample=64, seed=0):
+    """
+    Estimated share of (a, b) pairs within radius_km of each other, from
+    a fixed-seed sample block of at most sample x sample pairs
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.choice(len(lat_a), min(sample, len(lat_a)), replace=False)
+    b = rng.choice(len(lat_b), min(sample, len(lat_b)), replace=False)
+    distances = haversine_block(
+        np.radians(np.asarray(lat_a)[a]), np.radians(np.asarray(lon_a)[a]),
+        np.radians(np.asarray(lat_b)[b]), np.radians(np.asarray(lon_b)[b])
+    )
+    return float(np.mean(distances <= radius_km))
+
+
+class GridIndex:
+    """
+    Radius and nearest-K queries over a fixed set of points
+
+    ids: entity ids in point order; lat / lon in degrees. Query results
+    are point positions (rows), so callers can map them to ids or to
+    any parallel array.
+    """
+
+    def __init__(self, ids, lat, lon, cell_km=50.0):
+        self.ids = np.asarray(ids)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        # Columns divide 360 degrees evenly so wrapping across the antimeridian is exact
+        self.num_cols = max(1, math.ceil(360 / self.cell_deg))
+        self.col_deg = 360 / self.num_cols
+        self._lat_rad = np.radians(self.lat)
+        self._lon_rad = np.radians(self.lon)
+
+        rows, cols = self._cells(self.lat, self.lon)
+        cell = rows * self.num_cols + cols
+        self._order = np.argsort(cell, kind='stable')
+        cell_ids, starts = np.unique(cell[self._order], return_index=True)
+        self._cell_row = cell_ids // self.num_cols
+        self._cell_col = cell_ids % self.num_cols
+        self._cell_start = starts
+        self._cell_stop = np.append(starts[1:], len(cell)).astype(np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cells(self, lat, lon):
+        rows = np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lon) + 180) / self.col_deg).astype(np.int64) % self.num_cols
+        return rows, cols
+
+    def _candidates(self, lat_lo, lat_hi, lon_lo, lon_hi):
+        """Point positions in the occupied cells overlapping a bounding box"""
+        row_lo = math.floor((lat_lo + 90) / self.cell_deg)
+        row_hi = math.floor((lat_hi + 90) / self.cell_deg)
+        mask = (self._cell_row >= row_lo) & (self._cell_row <= row_hi)
+        col_lo = math.floor((lon_lo + 180) / self.col_deg)
+        col_span = math.floor((lon_hi + 180) / self.col_deg) - col_lo
+        if col_span < self.num_cols - 1:
+            mask &= (self._cell_col - col_lo) % self.num_cols <= col_span
+        starts = self._cell_start[mask]
+        lengths = self._cell_stop[mask] - starts
+        # Concatenated ranges start:stop of the selected cells, without a Python loop
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self._order[offsets + np.arange(len(offsets))]
+
+    def within(self, lat, lon, radius_km):
+        """(positions, distances_km) of all points within radius_km, nearest first"""
+        if len(self.ids) == 0 or radius_km < 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        radius_km = radius_km * (1 + RADIUS_SLACK)
+        candidates = self._candidates(*bounding_box(lat, lon, radius_km))
+        distances = haversine_block(
+            np.radians([lat]), np.radians([lon]), self._lat_rad[candidates], self._lon_rad[candidates]
+        )[0]
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.lexsort((candidates, distances))
+        return candidates[order], distances[order]
+
+    def nearest(self, lat, lon, k, max_radius_km=None):
+        """
+        (positions, distances_km) of the k nearest points, nearest first,
+        optionally limited to max_radius_km; ties break by point position
+        """
+        limit = math.pi * EARTH_RADIUS_KM if max_radius_km is None else max_radius_km
+        radius = min(self.cell_km, limit)
+        while True:
+            positions, distances = self.within(lat, lon, radius)
+            if len(positions) >= k or radius >= limit:
+                return positions[:k], distances[:k]
+            radius = min(radius * 2, limit)
+
+    def pairs_within(self, lat, lon, radius_km):
+        """
+        All (query position, point position, distance_km) with the point
+        within radius_km of the query point (lat / lon arrays in degrees),
+        sorted by query then point position
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        if len(lat) == 0 or len(self.ids) == 0 or radius_km < 0:
+            return empty
+        radius_km = radius_km * (1 + RADIUS_SLACK)
+
+        rows, cols = self._cells(lat, lon)
+        query_cell = rows * self.num_cols + cols
+        order = np.argsort(query_cell, kind='stable')
+        _, starts = np.unique(query_cell[order], return_index=True)
+        stops = np.append(starts[1:], len(order))
+
+        parts = []
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            members = order[start:stop]
+            # One box around the whole query cell: the union of its members' boxes
+            boxes = [bounding_box(a, b, radius_km) for a, b in zip(lat[members].tolist(), lon[members].tolist())]
+            lat_lo = min(box[0] for box in boxes)
+            lat_hi = max(box[1] for box in boxes)
+            lon_lo = min(box[2] for box in boxes)
+            lon_hi = max(box[3] for box in boxes)
+            if lon_hi - lon_lo >= 360:
+                lon_lo, lon_hi = -180.0, 180.0
+            candidates = self._candidates(lat_lo, lat_hi, lon_lo, lon_hi)
+            if len(candidates) == 0:
+                continue
+            distances = haversine_block(
+                np.radians(lat[members]), np.radians(lon[members]),
+                self._lat_rad[candidates], self._lon_rad[candidates]
+            )
+            q, p = np.nonzero(distances <= radius_km)
+            parts.append((members[q], candidates[p], distances[q, p]))
+
+        if not parts:
+            return empty
+        query = np.concatenate([part[0] for part in parts])
+        point = np.concatenate([part[1] for part in parts])
+        distance = np.concatenate([part[2] for part in parts])
+        order = np.lexsort((point, query))
+        return query[order], point[order], distance[order]
@@ -0,0 +1,195 @@
+"""
+Hardhat-like JSON-RPC stand-in
+==============================
+In-process node serving the FloraChain calls chain_ingest makes
+(eth_chainId, eth_blockNumber, eth_getBlockByNumber, eth_getLogs and
+the struct getters through eth_call) over HTTP, batches included.
+
+- Events are appended with register / reputation / reading, each in its
+  own block unless one is given
+- restart() changes every block hash, like a restarted Hardhat node
+- fail(method, times) answers the next calls of a method with a
+  JSON-RPC error; max_logs rejects oversized eth_getLogs ranges
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chain_ingest as ci
+
+CONTRACT = '0x5fbdb2315678afecb367f032d93f642f64180aa3'
+
+ROLES = {entity_type: role for role, entity_type in ci.ROLE_ENTITY_TYPES.items()}
+GETTERS = {selector: entity_type for entity_type, selector in ci.GETTER_SELECTORS.items()}
+
+
+def _word(value):
+    return format(value & ci._WORD_MASK, '064x')
+
+
+def encode_tuple(values, kinds):
+    """ABI-encode return values of the given kinds (inverse of chain_ingest.decode_tuple)"""
+    head, tail = [], b''
+    for value, kind in zip(values, kinds):
+        if kind == 'string':
+            head.append((32 * len(kinds) + len(tail)).to_bytes(32, 'big'))
+            data = value.encode()
+            tail += len(data).to_bytes(32, 'big') + data + bytes(-len(data) % 32)
+        elif kind == 'address':
+            head.append(bytes(12) + bytes.fromhex(value[2:]))
+        else:
+            head.append(int(value).to_bytes(32, 'big', signed=kind == 'int'))
+    return '0x' + (b''.join(head) + tail).hex()
+
+
+class ChainNode:
+    """FloraChain contract state and logs, served on 127.0.0.1 at an ephemeral port"""
+
+    def __init__(self, chain_id=31337, max_logs=None):
+        self.chain_id = chain_id
+        self.max_logs = max_logs
+        self.head = 0
+        self.logs = []  # in chain order
+        self.structs = {}  # (entity_type, entity_id) -> struct fields
+        self.addresses = {}  # (entity_type, entity_id) -> address
+        self.calls = {}  # method -> number of calls
+        self._failures = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --------------------------------------------
+    # Chain
+    # --------------------------------------------
+
+    def _block(self, block):
+        if block is None:
+            self.head += 1
+            return self.head
+        self.head = max(self.head, block)
+        return block
+
+    def _log(self, block, topics, words):
+        self.logs.append({
+            'address': CONTRACT,
+            'blockNumber': hex(block),
+            'topics': topics,
+            'data': '0x' + ''.join(_word(w) for w in words),
+            'logIndex': hex(len(self.logs)),
+            'removed': False
+        })
+
+    def register(self, entity_type, lat=19.07, lon=72.88, block=None, **fields):
+        """Register an entity; returns its id"""
+        with self._lock:
+            block = self._block(block)
+            entity_id = sum(1 for t, _ in self.structs if t == entity_type) + 1
+            address = '0x' + format(len(self.structs) + 1, '040x')
+            struct = dict(
+                addr=address, id=entity_id, farmerName=f'Farmer {entity_id}', farmName=f'Farm {entity_id}',
+                geoLocation=f'{lat},{lon}', flowerTypes='Rose', dailyCapacity=1000, seasonalFlowers='',
+                contact='', reputationScore=80, isActive=True, registeredAt=block, vehicleType='Truck',
+                coldChainSupport=True, capacity=1000, serviceRegion='MH', availability='',
+                shopName=f'Shop {entity_id}', shopAddress='Market Road', storageType='cold',
+                hasColdStorage=True, shopPhotos='', inventory='', seasonalAvailable=''
+            )
+            struct.update(fields)
+            self.structs[(entity_type, entity_id)] = struct
+            self.addresses[(entity_type, entity_id)] = address
+            self._log(block, [ci.ROLE_REGISTERED, '0x' + _word(int(address, 16))],
+                      [ROLES[entity_type], entity_id, block])
+            return entity_id
+
+    def reputation(self, entity_type, entity_id, score, block=None):
+        with self._lock:
+            block = self._block(block)
+            self.structs[(entity_type, entity_id)]['reputationScore'] = score
+            address = self.addresses[(entity_type, entity_id)]
+            self._log(block, [ci.REPUTATION_UPDATED, '0x' + _word(int(address, 16))],
+                      [ROLES[entity_type], score, block])
+
+    def reading(self, batch_id, temperature_c, breach=False, timestamp=1767225600, block=None):
+        with self._lock:
+            block = self._block(block)
+            self._log(block, [ci.TEMPERATURE_RECORDED, '0x' + _word(batch_id)],
+                      [round(temperature_c * 100), int(breach), timestamp])
+
+    def restart(self):
+        """New block hashes at every height, as after restarting the node"""
+        with self._lock:
+            self._generation += 1
+
+    def fail(self, method, times=1):
+        """Answer the next `times` calls of method with an error"""
+        with self._lock:
+            self._failures[method] = self._failures.get(method, 0) + times
+
+    # --------------------------------------------
+    # JSON-RPC
+    # --------------------------------------------
+
+    def handle(self, method, params):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if self._failures.get(method):
+                self._failures[method] -= 1
+                raise ValueError(f'{method} failed')
+            if method == 'eth_chainId':
+                return hex(self.chain_id)
+            if method == 'eth_blockNumber':
+                return hex(self.head)
+            if method == 'eth_getBlockByNumber':
+                number = int(params[0], 16)
+                if number > self.head:
+                    return None
+                return {'number': params[0], 'hash': '0x' + _word(number * 1_000_003 + self._generation)}
+            if method == 'eth_getLogs':
+                first, last = int(params[0]['fromBlock'], 16), int(params[0]['toBlock'], 16)
+                logs = [dict(log) for log in self.logs if first <= int(log['blockNumber'], 16) <= last]
+                if self.max_logs is not None and len(logs) > self.max_logs:
+                    raise ValueError(f'query returned more than {self.max_logs} results')
+                return logs
+            if method == 'eth_call':
+                data = params[0]['data']
+                entity_type = GETTERS[data[:10]]
+                spec = ci.STRUCT_FIELDS[entity_type]
+                struct = self.structs[(entity_type, int(data[10:], 16))]
+                return encode_tuple([struct[name] for name, _ in spec], [kind for _, kind in spec])
+            raise ValueError(f'unknown method {method}')
+
+    def _reply(self, request):
+        try:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'result': self.handle(request['method'], request['params'])}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': -32000, 'message': str(e)}}
+
+    def start(self):
+        """Serve in a background thread; returns the node URL"""
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                replies = [node._reply(r) for r in body] if isinstance(body, list) else node._reply(body)
+                out = json.dumps(replies).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
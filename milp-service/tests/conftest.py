@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The service modules live next to this directory and are imported as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+import chain_ingest as ci
+from chain_node import CONTRACT, ChainNode
+from freshness import ReadingsTail
+
+
+@pytest.fixture
+def node():
+    node = ChainNode()
+    node.url = node.start()
+    yield node
+    node.stop()
+
+
+def ingestor(node, tmp_path, **kwargs):
+    return ci.ChainIngestor(
+        ci.JsonRpcClient(node.url), CONTRACT,
+        str(tmp_path / 'entities.json'), str(tmp_path / 'entities.chain.json'),
+        readings_log=str(tmp_path / 'readings.bin'), **kwargs
+    )
+
+
+def populate(node):
+    node.register('harvester', lat=18.52, lon=73.86)
+    node.register('transporter', capacity=1500)
+    node.register('retailer', lat=19.07, lon=72.88)
+    node.reading(7, 4.5)
+    node.reputation('transporter', 1, 95)
+    node.reading(7, 11.0, breach=True)
+    node.reading(8, -1.25)
+
+
+def test_sync_mirrors_entities_and_readings(node, tmp_path):
+    populate(node)
+    ing = ingestor(node, tmp_path)
+    assert ing.sync() == node.head + 1  # blocks 0..head
+    ing.save()
+
+    snapshot = json.loads((tmp_path / 'entities.json').read_text())
+    assert [r['id'] for r in snapshot['transporters']] == [1]
+    assert snapshot['transporters'][0]['capacity'] == 1500
+    assert snapshot['transporters'][0]['reputation'] == 95
+    assert snapshot['harvesters'][0]['lat'] == 18.52
+    assert ing.batches[7]['readings'] == 2 and ing.batches[7]['breaches'] == 1
+    assert ing.batches[7]['max_temperature_c'] == 11.0
+    assert ing.batches[8]['last_temperature_c'] == -1.25
+    assert ing.events == {'role_registered': 3, 'reputation_updated': 1, 'temperature_recorded': 3}
+
+    records, _ = ReadingsTail(str(tmp_path / 'readings.bin')).poll()
+    assert records['batch_id'].tolist() == [7, 7, 8]
+
+
+def test_resume_from_checkpoint(node, tmp_path):
+    populate(node)
+    ing = ingestor(node, tmp_path)
+    ing.sync()
+    ing.save()
+    snapshot_mtime = (tmp_path / 'entities.json').stat().st_mtime_ns
+
+    node.reading(7, 6.0)
+    resumed = ingestor(node, tmp_path)
+    assert resumed.last_block == ing.last_block
+    assert resumed.events == ing.events
+    assert resumed.sync() == 1
+    assert resumed.batches[7]['readings'] == 3
+    assert resumed.events['temperature_recorded'] == 4
+    # Readings alone leave the entity snapshot untouched
+    assert (tmp_path / 'entities.json').stat().st_mtime_ns == snapshot_mtime
+
+    records, _ = ReadingsTail(str(tmp_path / 'readings.bin')).poll()
+    assert records['batch_id'].tolist() == [7, 7, 8, 7]
+
+
+def test_resync_after_node_restart(node, tmp_path):
+    populate(node)
+    ing = ingestor(node, tmp_path)
+    ing.sync()
+    ing.save()
+    tail = ReadingsTail(str(tmp_path / 'readings.bin'))
+    assert len(tail.poll()[0]) == 3
+
+    node.restart()
+    ing.sync()
+    assert ing.resyncs == 1
+    assert ing.events == {'role_registered': 3, 'reputation_updated': 1, 'temperature_recorded': 3}
+    assert ing.batches[7]['readings'] == 2
+    assert ing.sync() == 0
+
+    # A restarted ingestor sees a checkpoint from another chain history too
+    node.restart()
+    resumed = ingestor(node, tmp_path)
+    resumed.sync()
+    assert resumed.resyncs == 1 and resumed.batches[7]['readings'] == 2
+
+
+def test_rpc_failure_leaves_range_unapplied(node, tmp_path):
+    populate(node)
+    ing = ingestor(node, tmp_path)
+    node.fail('eth_call')
+    with pytest.raises(ci.RpcError):
+        ing.sync()
+    assert ing.last_block == -1
+    assert ing.batches == {} and ing.addresses == {}
+    assert ing.events == {'role_registered': 0, 'reputation_updated': 0, 'temperature_recorded': 0}
+    tail = ReadingsTail(str(tmp_path / 'readings.bin'))
+    assert len(tail.poll()[0]) == 0
+
+    ing.sync()
+    assert ing.batches[7]['readings'] == 2
+    assert ing.events['temperature_recorded'] == 3
+    assert tail.poll()[0]['batch_id'].tolist() == [7, 7, 8]
+
+
+def test_oversized_log_queries_shrink_the_range(node, tmp_path):
+    node.max_logs = 2
+    populate(node)
+    ing = ingestor(node, tmp_path, initial_span=64)
+    ing.sync()
+    assert ing.last_block == node.head
+    assert ing.events['temperature_recorded'] == 3
+    assert ing.span < 64
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from distances import DistanceMatrix
+
+
+def points(n, seed):
+    rng = np.random.default_rng(seed)
+    return [(('retailer', i), lat, lon) for i, (lat, lon) in enumerate(rng.uniform([8, 68], [30, 90], (n, 2)))]
+
+
+def test_upserts_match_a_full_build():
+    grown = DistanceMatrix()
+    for key, lat, lon in points(40, 0):
+        grown.upsert(key, lat, lon)
+    moved = points(40, 1)[7]
+    grown.upsert(*moved)
+
+    expected = points(40, 0)
+    expected[7] = moved
+    built = DistanceMatrix()
+    built.build(expected)
+
+    keys = [key for key, _, _ in expected]
+    assert len(grown) == len(built) == 40
+    assert np.array_equal(grown.block(keys, keys), built.block(keys, keys))
+    assert grown.distance(keys[3], keys[7]) == built.distance(keys[3], keys[7])
+
+
+def test_reload_during_a_read_keeps_one_version():
+    small, large = points(20, 2), points(300, 3)
+    shared = DistanceMatrix()
+    shared.build(small)
+    expected = shared.distance(('retailer', 3), ('retailer', 7))
+
+    class ReloadingIndex(dict):
+        """Index whose first lookup reloads the table, as another request thread could"""
+
+        def __getitem__(self, key):
+            if not reloaded:
+                reloaded.append(True)
+                shared.build(large)
+            return dict.__getitem__(self, key)
+
+    reloaded = []
+    for read in (
+        lambda: shared.distance(('retailer', 3), ('retailer', 7)),
+        lambda: shared.block([('retailer', 3)], [('retailer', 7)])[0, 0],
+        lambda: shared.gather([('retailer', 3)], [('retailer', 7)], [0], [0])[0],
+    ):
+        reloaded.clear()
+        shared.build(small)
+        shared._state.index = ReloadingIndex(shared._state.index)
+        assert read() == pytest.approx(expected)
+        assert reloaded and len(shared) == 300
@@ -0,0 +1,15 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import app as service  # noqa: E402
+import verify_fast_path  # noqa: E402
+
+
+def test_analytic_and_milp_picks_agree():
+    version = service.REGISTRY.version
+    assert verify_fast_path.run(trials=25, seed=7, max_fleet=8) == 0
+    # The sample fleet is restored afterwards
+    assert service.REGISTRY.version > version
+    assert len(service.REGISTRY.records('transporter')) == len(service.TRANSPORTERS)
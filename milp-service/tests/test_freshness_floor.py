@@ -0,0 +1,39 @@
+import pytest
+
+import app as service
+
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
+
+
+@pytest.mark.parametrize('floor', [0, -5, 100.5])
+def test_vrp_rejects_freshness_floor_out_of_range(client, floor):
+    response = client.post('/optimize/vrp', json={
+        'depot_type': 'distributor', 'depot_id': 1,
+        'stops': [{'retailer_id': 1, 'quantity': 100}],
+        'min_arrival_freshness': floor
+    })
+    assert response.status_code == 400
+    assert 'min_arrival_freshness' in response.get_json()['message']
+
+
+def test_vrp_accepts_full_freshness_floor(client):
+    response = client.post('/optimize/vrp', json={
+        'depot_type': 'distributor', 'depot_id': 1,
+        'stops': [{'retailer_id': 1, 'quantity': 100}],
+        'min_arrival_freshness': 100, 'time_budget_seconds': 0.2
+    })
+    assert response.status_code == 200
+
+
+def test_network_and_plan_reject_zero_floor(client):
+    response = client.post('/optimize/network', json={
+        'demands': [{'retailer_id': 1, 'quantity': 100}], 'min_arrival_freshness': 0
+    })
+    assert response.status_code == 400
+    response = client.post('/optimize/plan', json={
+        'demands': [{'retailer_id': 1, 'quantity': 100}], 'min_sell_freshness': 0
+    })
+    assert response.status_code == 400
@@ -0,0 +1,28 @@
+import pytest
+
+import app as service
+
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'engine': 'simplex'}, 'Unknown engine'),
+    ({'engine': 'milp', 'extra_constraints': [{'coefficients': {'1': 1}, 'sense': '<>', 'rhs': 0}]},
+     'Unsupported constraint sense'),
+    ({'engine': 'milp', 'extra_constraints': [
+        {'coefficients': {'1': 1}, 'rhs': 0, 'name': 'ban'},
+        {'coefficients': {'2': 1}, 'rhs': 0, 'name': 'ban'}
+    ]}, 'Duplicate constraint name'),
+])
+def test_invalid_optimize_request_is_rejected(client, body, message):
+    response = client.post('/optimize', json=dict({'source_id': 1, 'destination_type': 'retailer'}, **body))
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
+
+
+def test_unknown_entity_is_still_not_found(client):
+    response = client.post('/optimize', json={'source_id': 999999})
+    assert response.status_code == 404
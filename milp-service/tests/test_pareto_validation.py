@@ -0,0 +1,36 @@
+import pytest
+
+import app as service
+
+LANE = {'source_type': 'harvester', 'source_id': 1, 'destination_type': 'retailer', 'destination_id': 1}
+
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'weights': [{'cost': 1, 'quality': 0}]}, "missing 'time'"),
+    ({'weights': [{'cost': -1, 'time': 1, 'quality': 0}]}, 'non-negative'),
+    ({'weights': [{'cost': '1', 'time': 1, 'quality': 0}]}, 'non-negative'),
+    ({'weights': {'cost': 1, 'time': 0, 'quality': 0}}, 'list'),
+    ({'grid_steps': -3}, 'grid_steps'),
+    ({'grid_steps': 2.5}, 'grid_steps'),
+    ({'grid_steps': service.PARETO_MAX_GRID_STEPS + 1}, 'grid_steps'),
+])
+def test_invalid_pareto_input_is_rejected(client, body, message):
+    response = client.post('/optimize/pareto', json=dict(LANE, **body))
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
+
+
+def test_grid_at_the_cap_is_accepted(client):
+    response = client.post('/optimize/pareto', json=dict(
+        LANE, grid_steps=service.PARETO_MAX_GRID_STEPS, weights=[{'name': 'ops', 'cost': 1, 'time': 1, 'quality': 0}]
+    ))
+    assert response.status_code == 200
+    steps = service.PARETO_MAX_GRID_STEPS
+    sweep = response.get_json()['sweep']
+    assert sweep['points'] == (steps + 1) * (steps + 2) // 2
+    assert sum(sweep['pick_counts'].values()) == sweep['points']
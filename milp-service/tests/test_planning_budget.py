@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import app as service  # noqa: E402
+from synthetic import synthetic_entities  # noqa: E402
+
+
+@pytest.fixture
+def registry():
+    sample = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+    service.REGISTRY.load_lists(synthetic_entities(num_transporters=5, num_harvesters=20, num_retailers=120, seed=3))
+    yield service.REGISTRY
+    service.REGISTRY.load_lists(sample)
+
+
+def test_spent_budget_plans_regions_greedily(registry):
+    demands = {r['id']: [80] * 10 for r in registry.records('retailer')}
+    started = time.perf_counter()
+    result = service.optimize_multiperiod_plan(
+        demands=demands, horizon_days=10, window_days=5, commit_days=3, region_size=20, time_budget_seconds=0.5
+    )
+    assert time.perf_counter() - started < 2
+    regions = [region for window in result['decomposition']['windows'] for region in window['regions']]
+    assert all(region['method'] == 'greedy' for region in regions)
+    assert result['decomposition']['subproblems_greedy'] == len(regions)
+
+    summary = result['summary']
+    assert summary['sold'] + summary['shortage'] == pytest.approx(summary['demand'])
+    assert summary['fill_rate'] > 0.5
+    harvested = sum(day['harvested'] for day in result['days'])
+    assert harvested == pytest.approx(sum(s['quantity'] for s in result['shipments']))
+    for day in result['days']:
+        assert day['harvested'] <= sum(f['capacity'] for f in registry.records('harvester')) + 1e-6
@@ -0,0 +1,58 @@
+import numpy as np
+
+from freshness import READING_DTYPE, ReadingsLog, ReadingsTail
+
+
+def readings(first_block, count, batch_id=1):
+    return [(batch_id, 4.0, False, 1767225600 + 60 * k, first_block + k) for k in range(count)]
+
+
+def test_tail_reads_appended_records(tmp_path):
+    log = ReadingsLog(str(tmp_path / 'readings.bin'))
+    tail = ReadingsTail(log.path)
+    log.append(readings(1, 3))
+    records, restarted = tail.poll()
+    assert records['block'].tolist() == [1, 2, 3] and not restarted
+    log.append(readings(4, 2))
+    records, restarted = tail.poll()
+    assert records['block'].tolist() == [4, 5] and not restarted
+    assert len(tail.poll()[0]) == 0
+
+
+def test_rewrite_is_detected_after_the_log_regrew(tmp_path):
+    log = ReadingsLog(str(tmp_path / 'readings.bin'))
+    tail = ReadingsTail(log.path)
+    log.append(readings(1, 3))
+    tail.poll()
+
+    # Resync from scratch; the new history outgrows the old one before the next poll
+    log.truncate_after(-1)
+    log.append(readings(1, 5, batch_id=2))
+    records, restarted = tail.poll()
+    assert restarted
+    assert records['batch_id'].tolist() == [2] * 5
+
+
+def test_truncate_after_keeps_the_generation_when_nothing_is_dropped(tmp_path):
+    log = ReadingsLog(str(tmp_path / 'readings.bin'))
+    tail = ReadingsTail(log.path)
+    log.append(readings(1, 3))
+    tail.poll()
+    log.truncate_after(3)
+    log.append(readings(4, 1))
+    records, restarted = tail.poll()
+    assert not restarted and records['block'].tolist() == [4]
+
+    log.truncate_after(2)
+    records, restarted = tail.poll()
+    assert restarted and records['block'].tolist() == [1, 2]
+
+
+def test_log_without_header_is_upgraded(tmp_path):
+    path = tmp_path / 'readings.bin'
+    legacy = np.zeros(2, dtype=READING_DTYPE)
+    legacy['block'] = [1, 2]
+    path.write_bytes(legacy.tobytes())
+    ReadingsLog(str(path))
+    records, _ = ReadingsTail(str(path)).poll()
+    assert records['block'].tolist() == [1, 2]
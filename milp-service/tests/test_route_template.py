@@ -0,0 +1,45 @@
+import pytest
+
+import app as service
+
+FLEET = [1, 2, 3]
+
+
+def test_backends_alternating_on_one_template_see_every_update():
+    pytest.importorskip('highspy')
+    template = service.RouteModelTemplate(FLEET)
+    picks = [
+        template.solve(coefficients, {}, solver_options={'backend': backend})[1]
+        for coefficients, backend in [
+            ({1: 1.0, 2: 5.0, 3: 9.0}, 'highs'),
+            ({1: 5.0, 2: 1.0, 3: 9.0}, 'cbc'),
+            ({1: 5.0, 2: 1.0, 3: 9.0}, 'highs'),
+            ({1: 5.0, 2: 1.0, 3: 9.0}, 'cbc'),
+        ]
+    ]
+    assert picks == [1, 2, 2, 2]
+    # Bounds changed by a CBC solve reach HiGHS too
+    assert template.solve({1: 5.0, 2: 1.0, 3: 9.0}, {2: 'excluded'}, solver_options={'backend': 'cbc'})[1] == 1
+    assert template.solve({1: 5.0, 2: 1.0, 3: 9.0}, {}, solver_options={'backend': 'highs'})[1] == 2
+
+
+@pytest.mark.parametrize('names', [['ban', 'ban'], ['Select_One_Transporter']])
+def test_colliding_constraint_names_leave_the_template_unchanged(names):
+    template = service.RouteModelTemplate(FLEET)
+    coefficients = {1: 5.0, 2: 1.0, 3: 9.0}
+    extra = [{'coefficients': {str(t_id): 1}, 'rhs': 0, 'name': name} for t_id, name in zip([2, 1], names)]
+    with pytest.raises(ValueError, match='Duplicate constraint name'):
+        template.solve(coefficients, {}, extra, {'backend': 'cbc'})
+    assert set(template.prob.constraints) == {'Select_One_Transporter'}
+    assert template.solve(coefficients, {}, solver_options={'backend': 'cbc'})[1] == 2
+
+
+def test_failed_solve_drops_the_template():
+    service.ROUTE_TEMPLATES.clear()
+    coefficients = {t['id']: 1.0 for t in service.REGISTRY.records('transporter')}
+    extra = [{'coefficients': {'1': 1}, 'sense': '<>', 'rhs': 0}]
+    with pytest.raises(ValueError):
+        service.solve_route_milp(coefficients, {}, extra, {'backend': 'cbc'})
+    assert service.ROUTE_TEMPLATES.stats()['idle_templates'] == 0
+    service.solve_route_milp(coefficients, {}, None, {'backend': 'cbc'})
+    assert service.ROUTE_TEMPLATES.stats()['idle_templates'] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+import app as service
+
+REQUEST = {
+    'depot_type': 'distributor', 'depot_id': 1,
+    'stops': [{'retailer_id': 1, 'quantity': 100}],
+    'time_budget_seconds': 0.2
+}
+
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
+
+
+@pytest.mark.parametrize('fleet, message', [
+    ([{'transporter_id': 1, 'count': 0}], 'count'),
+    ([{'transporter_id': 1, 'count': 1.5}], 'count'),
+    ([{'count': 2}], 'transporter_id'),
+    ([2], 'transporter_id'),
+    ({'transporter_ids': []}, 'fleet must be a list'),
+])
+def test_invalid_fleet_is_rejected(client, fleet, message):
+    response = client.post('/optimize/vrp', json=dict(REQUEST, fleet=fleet))
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
+
+
+def test_empty_registry_has_no_vehicles():
+    sample = {t: service.REGISTRY.records(t) for t in service.SAMPLE_ENTITIES}
+    service.REGISTRY.load_lists(dict(sample, transporter=[]))
+    try:
+        with pytest.raises(ValueError, match='no vehicles'):
+            service.build_vrp_fleet(None, 72, None)
+    finally:
+        service.REGISTRY.load_lists(sample)
+
+
+def test_fleet_counts_expand_into_units():
+    vehicles = service.build_vrp_fleet([{'transporter_id': 2, 'count': 3}], 72, None)
+    assert [(v['id'], v['unit']) for v in vehicles] == [(2, 1), (2, 2), (2, 3)]
@@ -0,0 +1,364 @@
+"""
+Vehicle Routing with Time Windows
+=================================
+Multi-stop delivery routes from one depot to many retailer stops with a
+heterogeneous fleet.
+
+Constraints:
+- Vehicle capacity (total quantity delivered per route)
+- Cold chain: stops requiring it are only served by refrigerated vehicles
+- Time windows: service starts inside [window_start, window_end]; early
+  vehicles wait
+- Freshness: every handover happens within the vehicle's elapsed-time
+  limit (derived by the caller from the freshness decay model)
+
+Objective: total travel cost (km x route factor x cost per km, depot
+return included), serving as many stops as the fleet allows.
+
+Search:
+1. Parallel cheapest insertion. Each route keeps its service start times
+   and, computed backwards, the latest start at every position that
+   keeps the rest of the route feasible, so inserting a stop anywhere is
+   checked in O(1); all (stop, position) pairs of a route are evaluated
+   in one NumPy expression and cached per route.
+2. Relocate local search (within and between routes, plus retrying
+   unserved stops) until no move improves or the time budget runs out.
+"""
+
+import random
+import time
+
+import numpy as np
+
+EPSILON = 1e-9
+
+
+class Route:
+    """One vehicle's tour: depot -> stops -> depot, with its schedule"""
+
+    __slots__ = ('vehicle', 'nodes', 'start', 'latest', 'load')
+
+    def __init__(self, vehicle, nodes, load=0.0):
+        self.vehicle = vehicle
+        self.nodes = nodes  # node indices, depot (0) at both ends
+        self.load = load
+        self.start = None
+        self.latest = None
+
+
+class VRPInstance:
+    """
+    Arrays describing one depot, n stops and the fleet
+
+    Node 0 is the depot; stop i (0-based) is node i + 1.
+    """
+
+    def __init__(self, distance, demand, window_start, window_end, service_hours, require_cold, vehicles):
+        n = len(demand)
+        self.n = n
+        self.distance = np.asarray(distance, dtype=np.float64)
+        # Per-node arrays with the depot prepended
+        self.demand = np.concatenate(([0.0], np.asarray(demand, dtype=np.float64)))
+        self.window_start = np.concatenate(([0.0], np.asarray(window_start, dtype=np.float64)))
+        self.window_end = np.concatenate(([np.inf], np.asarray(window_end, dtype=np.float64)))
+        self.service = np.concatenate(([0.0], np.asarray(service_hours, dtype=np.float64)))
+        self.require_cold = np.concatenate(([False], np.asarray(require_cold, dtype=bool)))
+
+        self.vehicles = vehicles
+        self.hours_per_km = np.array([v['route_factor'] / v['speed_kmph'] for v in vehicles])
+        self.cost_per_km = np.array([v['route_factor'] * v['cost_per_km'] for v in vehicles])
+        self.capacity = np.array([v['capacity'] for v in vehicles], dtype=np.float64)
+        self.cold = np.array([v['cold_chain'] for v in vehicles], dtype=bool)
+
+        # Latest allowed service start per (vehicle, node): time window and freshness limit
+        max_elapsed = np.array([v['max_elapsed_hours'] for v in vehicles])
+        self.deadline = np.minimum(self.window_end[None, :], max_elapsed[:, None])
+        self.deadline[:, 0] = np.inf
+        # Stops a vehicle may serve at all (cold chain)
+        self.compatible = ~(self.require_cold[None, :] & ~self.cold[:, None])
+
+    # ---- schedules ----
+
+    def schedule(self, route):
+        """Recompute service start times and latest feasible start times of a route"""
+        v = route.vehicle
+        nodes = np.asarray(route.nodes)
+        travel = self.distance[nodes[:-1], nodes[1:]] * self.hours_per_km[v]
+
+        start = np.empty(len(nodes))
+        start[0] = 0.0
+        t = 0.0
+        for k in range(1, len(nodes)):
+            t = max(t + self.service[nodes[k - 1]] + travel[k - 1], self.window_start[nodes[k]])
+            start[k] = t
+
+        latest = np.empty(len(nodes))
+        latest[-1] = np.inf
+        deadline = self.deadline[v]
+        for k in range(len(nodes) - 2, -1, -1):
+            latest[k] = min(deadline[nodes[k]], latest[k + 1] - self.service[nodes[k]] - travel[k])
+
+        route.start = start
+        route.latest = latest
+
+    def route_distance(self, route):
+        nodes = np.asarray(route.nodes)
+        return float(self.distance[nodes[:-1], nodes[1:]].sum())
+
+    def route_cost(self, route):
+        return self.route_distance(route) * self.cost_per_km[route.vehicle]
+
+    # ---- insertion ----
+
+    def insertion_costs(self, route, candidates):
+        """
+        Cheapest feasible insertion of each candidate node into a route
+
+        Returns (cost delta, position) arrays; cost is inf where no
+        position is feasible. Position p inserts between nodes[p] and nodes[p + 1].
+        """
+        v = route.vehicle
+        nodes = np.asarray(route.nodes)
+        prev = nodes[:-1]
+        nxt = nodes[1:]
+        hours_per_km = self.hours_per_km[v]
+        u = candidates[:, None]
+
+        d_prev_u = self.distance[prev[None, :], u]
+        d_u_next = self.distance[u, nxt[None, :]]
+
+        arrival_u = route.start[:-1][None, :] + self.service[prev][None, :] + d_prev_u * hours_per_km
+        start_u = np.maximum(arrival_u, self.window_start[u])
+        arrival_next = start_u + self.service[u] + d_u_next * hours_per_km
+        start_next = np.maximum(arrival_next, self.window_start[nxt][None, :])
+
+        ok = (start_u <= self.deadline[v][u] + EPSILON) & (start_next <= route.latest[1:][None, :] + EPSILON)
+        ok &= (self.compatible[v][candidates] & (route.load + self.demand[candidates] <= self.capacity[v] + EPSILON))[:, None]
+
+        delta = (d_prev_u + d_u_next - self.distance[prev, nxt][None, :]) * self.cost_per_km[v]
+        delta = np.where(ok, delta, np.inf)
+        position = delta.argmin(axis=1)
+        return delta[np.arange(len(candidates)), position], position
+
+    def slot_table(self, routes):
+        """Every insertion slot of every route as flat arrays, for one-shot evaluation"""
+        columns = {'route': [], 'position': [], 'prev': [], 'next': [], 'start_prev': [], 'latest_next': []}
+        for r, route in enumerate(routes):
+            nodes = np.asarray(route.nodes)
+            slots = len(nodes) - 1
+            columns['route'].append(np.full(slots, r))
+            columns['position'].append(np.arange(slots))
+            columns['prev'].append(nodes[:-1])
+            columns['next'].append(nodes[1:])
+            columns['start_prev'].append(route.start[:-1])
+            columns['latest_next'].append(route.latest[1:])
+        table = {name: np.concatenate(arrays) for name, arrays in columns.items()}
+
+        vehicle = np.array([route.vehicle for route in routes])
+        load = np.array([route.load for route in routes])
+        table['vehicle'] = vehicle[table['route']]
+        table['free_capacity'] = (self.capacity[vehicle] - load)[table['route']]
+        return table
+
+    def best_insertion(self, table, node, skip_route=None):
+        """(cost delta, route index, position) of the cheapest feasible slot; cost is inf if none"""
+        v = table['vehicle']
+        prev = table['prev']
+        nxt = table['next']
+        hours_per_km = self.hours_per_km[v]
+
+        d_prev_u = self.distance[prev, node]
+        d_u_next = self.distance[node, nxt]
+        start_u = np.maximum(
+            table['start_prev'] + self.service[prev] + d_prev_u * hours_per_km, self.window_start[node]
+        )
+        start_next = np.maximum(
+            start_u + self.service[node] + d_u_next * hours_per_km, self.window_start[nxt]
+        )
+
+        ok = (start_u <= self.deadline[v, node] + EPSILON) & (start_next <= table['latest_next'] + EPSILON)
+        ok &= self.compatible[v, node] & (self.demand[node] <= table['free_capacity'] + EPSILON)
+        if skip_route is not None:
+            ok &= table['route'] != skip_route
+
+        delta = np.where(ok, (d_prev_u + d_u_next - self.distance[prev, nxt]) * self.cost_per_km[v], np.inf)
+        best = int(delta.argmin())
+        return delta[best], int(table['route'][best]), int(table['position'][best])
+
+    def insert(self, route, node, position):
+        route.nodes.insert(position + 1, node)
+        route.load += self.demand[node]
+        self.schedule(route)
+
+    def remove(self, route, node):
+        route.nodes.remove(node)
+        route.load -= self.demand[node]
+        self.schedule(route)
+
+    def unserved_reason(self, node):
+        """Why a stop cannot be served even on a dedicated vehicle, if it cannot"""
+        compatible = self.compatible[:, node]
+        if not compatible.any():
+            return 'no_cold_chain_vehicle'
+        compatible &= self.capacity >= self.demand[node]
+        if not compatible.any():
+            return 'capacity'
+        for v in np.flatnonzero(compatible):
+            arrival = self.distance[0, node] * self.hours_per_km[v]
+            if max(arrival, self.window_start[node]) <= self.deadline[v, node] + EPSILON:
+                return 'fleet_exhausted'
+        return 'time_window_or_freshness'
+
+
+def construct(instance):
+    """Parallel cheapest insertion; returns (routes, unrouted node indices)"""
+    routes = [Route(v, [0, 0]) for v in range(len(instance.vehicles))]
+    for route in routes:
+        instance.schedule(route)
+
+    nodes = np.arange(1, instance.n + 1)
+    best = np.empty((instance.n, len(routes)))
+    position = np.empty((instance.n, len(routes)), dtype=np.int64)
+    for r, route in enumerate(routes):
+        best[:, r], position[:, r] = instance.insertion_costs(route, nodes)
+
+    routed = np.zeros(instance.n, dtype=bool)
+    while not routed.all():
+        flat = best.argmin()
+        i, r = divmod(int(flat), len(routes))
+        if not np.isfinite(best[i, r]):
+            break
+        instance.insert(routes[r], int(nodes[i]), int(position[i, r]))
+        routed[i] = True
+        best[i, :] = np.inf
+
+        # Only the modified route's insertion costs change
+        pending = np.flatnonzero(~routed)
+        if len(pending):
+            best[pending, r], position[pending, r] = instance.insertion_costs(routes[r], nodes[pending])
+
+    return routes, [int(node) for node in nodes[~routed]]
+
+
+def improve(instance, routes, unrouted, deadline, rng):
+    """
+    Relocate local search until no improving move remains or time is up
+
+    Returns (unrouted, moves, passes).
+    """
+    moves = 0
+    passes = 0
+    route_of = {node: r for r, route in enumerate(routes) for node in route.nodes[1:-1]}
+
+    while time.perf_counter() < deadline:
+        passes += 1
+        improved = False
+        slots = instance.slot_table(routes)
+
+        # Retry unserved stops first: serving a stop beats any cost saving
+        for node in list(unrouted):
+            if time.perf_counter() >= deadline:
+                break
+            cost, r, position = instance.best_insertion(slots, node)
+            if np.isfinite(cost):
+                instance.insert(routes[r], node, position)
+                route_of[node] = r
+                unrouted.remove(node)
+                slots = instance.slot_table(routes)
+                moves += 1
+                improved = True
+
+        order = list(route_of)
+        rng.shuffle(order)
+        for node in order:
+            if time.perf_counter() >= deadline:
+                break
+            r = route_of[node]
+            route = routes[r]
+            k = route.nodes.index(node)
+            a, b = route.nodes[k - 1], route.nodes[k + 1]
+            distance = instance.distance
+            gain = (distance[a, node] + distance[node, b] - distance[a, b]) * instance.cost_per_km[route.vehicle]
+            if gain <= EPSILON:
+                continue
+
+            # Other routes from the slot table, the shortened route itself directly
+            instance.remove(route, node)
+            best_cost, best_route, best_position = instance.best_insertion(slots, node, skip_route=r)
+            cost, position = instance.insertion_costs(route, np.array([node]))
+            if cost[0] < best_cost:
+                best_cost, best_route, best_position = cost[0], r, int(position[0])
+
+            if best_cost < gain - 1e-7:
+                instance.insert(routes[best_route], node, best_position)
+                route_of[node] = best_route
+                slots = instance.slot_table(routes)
+                moves += 1
+                improved = True
+            else:
+                # Removing a stop never breaks feasibility, so the old slot is still valid
+                instance.insert(route, node, k - 1)
+
+        if not improved:
+            break
+
+    return unrouted, moves, passes
+
+
+def solve_vrptw(instance, time_budget=2.0, seed=0):
+    """
+    Construct and improve routes within `time_budget` seconds
+
+    Returns routes (non-empty only), unserved stops with reasons, costs
+    and search statistics. Stop references are 0-based stop indices.
+    """
+    start = time.perf_counter()
+    routes, unrouted = construct(instance)
+    construction_seconds = time.perf_counter() - start
+    construction_cost = sum(instance.route_cost(route) for route in routes)
+
+    unrouted, moves, passes = improve(
+        instance, routes, unrouted, start + time_budget, random.Random(seed)
+    )
+    total_seconds = time.perf_counter() - start
+
+    result_routes = []
+    for route in routes:
+        if len(route.nodes) <= 2:
+            continue
+        v = route.vehicle
+        nodes = np.asarray(route.nodes)
+        travel = instance.distance[nodes[:-1], nodes[1:]] * instance.hours_per_km[v]
+        arrival = np.concatenate(([0.0], route.start[:-1] + instance.service[nodes[:-1]] + travel))
+        result_routes.append({
+            'vehicle': v,
+            'stops': [int(node) - 1 for node in route.nodes[1:-1]],
+            'arrival_hours': arrival[1:-1].tolist(),
+            'start_hours': route.start[1:-1].tolist(),
+            'return_hours': float(arrival[-1]),
+            'load': float(route.load),
+            'distance_km': instance.route_distance(route),
+            'cost': instance.route_cost(route)
+        })
+
+    total_cost = sum(r['cost'] for r in result_routes)
+    return {
+        'routes': result_routes,
+        'unserved': [
+            {'stop': node - 1, 'reason': instance.unserved_reason(node)}
+            for node in sorted(unrouted)
+        ],
+        'total_cost': total_cost,
+        'total_distance_km': sum(r['distance_km'] for r in result_routes),
+        'stats': {
+            'stops': instance.n,
+            'vehicles_available': len(instance.vehicles),
+            'vehicles_used': len(result_routes),
+            'construction_cost': construction_cost,
+            'construction_seconds': round(construction_seconds, 4),
+            'improvement_seconds': round(total_seconds - construction_seconds, 4),
+            'improvement_moves': moves,
+            'improvement_passes': passes,
+            'time_budget_seconds': time_budget
+        }
+    }